@@ -1,11 +1,44 @@
-from flask import Flask, request, jsonify, send_from_directory, render_template, redirect, url_for, session, flash, send_file
+from flask import Flask, request, jsonify, send_from_directory, render_template, redirect, url_for, session, flash, send_file, Response, abort, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import os
-import pandas as pd
+import logging
 from datetime import datetime, timedelta
+from urllib.parse import quote
+import base64
+import csv
+import functools
+import hashlib
 import io
+import itertools
+import json
+import multiprocessing
+import secrets
+import subprocess
+import sys
+import threading
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import click
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+from metrics import Metrics
+from log_config import StructuredLogging
+from query_budget import QueryBudget, query_budget
+from versioning import TableVersions
+from review_events import ReviewEventBus
+from archive import ARCHIVE_SCHEMA, HOT_SCHEMA, ScoreArchive
+from compression import ResponseCompression
+from static_assets import StaticAssets
+import rosters
+import score_cube
+import scoring
+import search_index
+import student_versions
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'moral_score_secret_key_2024'
@@ -17,12 +50,61 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'in
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
-
-# 确保上传目录存在
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# 初始化扩展
-db = SQLAlchemy(app)
+# 分班打包导出时并行生成 Excel 的进程数；每个 gunicorn worker 各有一个进程池，
+# 总进程数为 worker 数乘以该值，因此默认取较小的固定值
+app.config['EXPORT_BUNDLE_WORKERS'] = int(os.environ.get('DYF_EXPORT_BUNDLE_WORKERS', 2))
+
+# 扩展对象，在 create_app() 中绑定到应用
+db = SQLAlchemy()
+# 请求耗时、SQL 次数等运行指标，通过 /metrics 以 Prometheus 格式导出
+metrics = Metrics()
+# 路由 SQL 语句预算，测试模式下超出预算即失败
+query_budget_guard = QueryBudget()
+# 结构化日志：请求线程只入队，由后台线程输出 JSON
+structured_logging = StructuredLogging()
+# 表版本戳，用于很少变化的公共接口的 ETag / 304
+table_versions = TableVersions()
+# 需要版本戳的表
+VERSIONED_TABLES = ('announcement', 'academic_year', 'user', 'score_category', 'ranking_snapshot', 'scoring_rule')
+# 审核队列事件推送
+review_events = ReviewEventBus()
+# 冷学年归档库
+score_archive = ScoreArchive()
+# 文本响应按 Accept-Encoding 压缩
+response_compression = ResponseCompression()
+# 静态资源内容指纹、长期缓存与预压缩副本
+static_assets = StaticAssets()
+
+
+def create_app(config=None):
+    """应用工厂：应用配置覆盖项并初始化扩展
+
+    路由在模块导入时已注册到 app 上，这里只负责绑定扩展，每个进程调用一次即可；
+    生产环境由 wsgi.py 在 gunicorn 主进程中预加载后再 fork 出 worker。
+    """
+    if 'sqlalchemy' in app.extensions:
+        return app
+    if config:
+        app.config.update(config)
+
+    # 确保上传目录存在
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    db.init_app(app)
+    # 归档库需在第一个连接建立前注册 ATTACH
+    score_archive.init_app(app, db, [model.__table__ for model in ARCHIVED_MODELS])
+    metrics.init_app(app, db)
+    query_budget_guard.init_app(app, db)
+    structured_logging.init_app(app, metrics)
+    table_versions.init_app(app, db, VERSIONED_TABLES)
+    review_events.init_app(app, db)
+    response_compression.init_app(app)
+    static_assets.init_app(app)
+    return app
+
+logger = logging.getLogger('dyf.app')
+application_logger = logging.getLogger('dyf.applications')
+review_logger = logging.getLogger('dyf.review')
 
 # ==================== 类别相关常量定义 ====================
 # 教师端可管理的主类别
@@ -63,6 +145,8 @@ TEACHER_SUBCATEGORIES = {
 # 所有主类别列表
 ALL_MAIN_CATEGORIES = ['思想政治理论分', '社会服务分', '集体活动分', '学术科研分', '文体竞赛分', '奖励分', '任职分', '扣分']
 
+# 以下上限为各学年计分规则（ScoringRule）的初始值，init_db 时为尚无规则的学年写入；
+# 之后的调整通过规则接口按学年保存，不再修改这里
 # 主类别分数上限
 CATEGORY_MAX_LIMITS = {
     '思想政治理论分': 3,
@@ -93,61 +177,6 @@ def is_teacher_category(main_category_name, sub_category_name=None):
         return sub_category_name in TEACHER_SUBCATEGORIES[main_category_name]
     return False
 
-def calculate_category_score(main_category, scores):
-    """计算主类别最终分数（应用上限和特殊规则）
-    注意：这个函数接收的是简单分数列表，不包含子类别信息
-    如果需要应用子类别限制，请使用 calculate_category_score_with_subcategory
-    """
-    max_limit = CATEGORY_MAX_LIMITS.get(main_category, 100)
-    
-    if main_category == SPECIAL_CATEGORY_ZHIREN:
-        # 任职分：只能取最高1项
-        max_score = max(scores) if scores else 0
-        return min(max_score, max_limit)
-    else:
-        # 其他类别：累加但不超过主类别最高分
-        total_score = sum(scores)
-        return min(total_score, max_limit)
-
-def calculate_category_score_with_subcategory(main_category, records):
-    """计算主类别最终分数（应用子类别和主类别上限）
-    
-    Args:
-        main_category: 主类别名称
-        records: 记录列表，每条记录需包含 'score' 和 'category_name' 字段
-    
-    Returns:
-        最终分数
-    """
-    # 按子类别分组
-    subcategory_scores = {}
-    for record in records:
-        sub_name = record.get('category_name', '')
-        if sub_name not in subcategory_scores:
-            subcategory_scores[sub_name] = []
-        subcategory_scores[sub_name].append(record['score'])
-    
-    # 计算每个子类别的分数（应用子类别上限）
-    total_score = 0
-    for sub_name, scores in subcategory_scores.items():
-        sub_total = sum(scores)
-        # 应用子类别上限（如工时最多1分）
-        if sub_name in SUBCATEGORY_MAX_LIMITS:
-            sub_total = min(sub_total, SUBCATEGORY_MAX_LIMITS[sub_name])
-        total_score += sub_total
-    
-    # 应用主类别上限和特殊规则
-    max_limit = CATEGORY_MAX_LIMITS.get(main_category, 100)
-    
-    if main_category == SPECIAL_CATEGORY_ZHIREN:
-        # 任职分：只能取最高1项
-        all_scores = [r['score'] for r in records]
-        max_score = max(all_scores) if all_scores else 0
-        return min(max_score, max_limit)
-    else:
-        # 其他类别：累加但不超过主类别最高分
-        return min(total_score, max_limit)
-
 # ==================== 数据库模型 ====================
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -194,6 +223,10 @@ class ScoreCategory(db.Model):
     # 关系
     parent = db.relationship('ScoreCategory', remote_side=[id], backref='children')
 
+# 按学年移到归档库的表（见 ARCHIVED_MODELS）使用 AUTOINCREMENT，已归档行的 id 不会分配给主库的新行，
+# 恢复时不会冲突，主库和归档库的同名表合并查询时 id 也不重复
+ARCHIVED_TABLE_OPTIONS = {'sqlite_autoincrement': True}
+
 class ScoreApplication(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -209,6 +242,9 @@ class ScoreApplication(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     reviewed_at = db.Column(db.DateTime)
 
+    # 审核队列按状态筛选、按时间分页
+    __table_args__ = (db.Index('ix_score_application_status_created', 'status', 'created_at', 'id'), ARCHIVED_TABLE_OPTIONS)
+
     # 关系
     user = db.relationship('User', foreign_keys=[user_id])
     category = db.relationship('ScoreCategory')
@@ -236,6 +272,10 @@ class ScoreRecord(db.Model):
     application_id = db.Column(db.Integer, nullable=True)
     group_application_id = db.Column(db.Integer, nullable=True)
 
+    # 同一学生、类别、学年只能有一条记录；审核通过时用 INSERT ... ON CONFLICT 依赖此索引去重
+    __table_args__ = (db.Index('unique_score_record', 'user_id', 'category_id', 'academic_year', unique=True),
+                      ARCHIVED_TABLE_OPTIONS)
+
     # 关系
     user = db.relationship('User')
     category = db.relationship('ScoreCategory')
@@ -266,6 +306,8 @@ class GroupApplication(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     reviewed_at = db.Column(db.DateTime)
 
+    __table_args__ = (db.Index('ix_group_application_status_created', 'status', 'created_at', 'id'), ARCHIVED_TABLE_OPTIONS)
+
     teacher = db.relationship('User', foreign_keys=[teacher_user_id])
     category = db.relationship('ScoreCategory')
     reviewer = db.relationship('User', foreign_keys=[reviewer_id])
@@ -277,149 +319,1122 @@ class GroupApplicationMember(db.Model):
     score = db.Column(db.Integer, nullable=False)
     
     # 添加唯一性约束，防止同一申请中重复添加同一学生
-    __table_args__ = (db.UniqueConstraint('group_application_id', 'student_user_id', name='unique_group_student'),)
+    __table_args__ = (db.UniqueConstraint('group_application_id', 'student_user_id', name='unique_group_student'),
+                      ARCHIVED_TABLE_OPTIONS)
 
     group_application = db.relationship('GroupApplication', backref='members')
     student = db.relationship('User')
 
+class ScoreTotal(db.Model):
+    """按规则集重算后的学年总分（由 flask rescore 写入）"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    academic_year = db.Column(db.String(20), nullable=False)
+    rule_set = db.Column(db.String(50), nullable=False)
+    total_score = db.Column(db.Float, nullable=False)
+    category_scores = db.Column(db.Text, nullable=False)  # JSON：主类别 -> 最终分数
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-# 路由定义
+    __table_args__ = (db.UniqueConstraint('user_id', 'academic_year', 'rule_set', name='unique_score_total'),)
 
+class RankingSnapshot(db.Model):
+    """学年最终排名快照，冻结后不再修改"""
+    id = db.Column(db.Integer, primary_key=True)
+    academic_year = db.Column(db.String(20), unique=True, nullable=False)
+    student_count = db.Column(db.Integer, nullable=False)
+    created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-@app.route('/api/categories', methods=['GET'])
-def api_get_categories():
-    # 获取用户角色
-    user_role = session.get('user', {}).get('role', 'student')
+class RankingSnapshotRow(db.Model):
+    """排名快照中的一个学生；学生信息按冻结时保存，之后改名、转班不影响快照"""
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_id = db.Column(db.Integer, db.ForeignKey('ranking_snapshot.id'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(100))
+    student_id = db.Column(db.String(20))
+    class_name = db.Column(db.String(50))
+    college = db.Column(db.String(100))
+    grade = db.Column(db.String(20))
+    category_scores = db.Column(db.Text, nullable=False)  # JSON：主类别 -> 最终分数
+    total_score = db.Column(db.Integer, nullable=False)
+    record_count = db.Column(db.Integer, nullable=False)
+    # 同分同名次（1, 1, 3），书院、年级内排名及 (书院, 年级, 班级) 内排名
+    overall_rank = db.Column(db.Integer, nullable=False)
+    college_rank = db.Column(db.Integer, nullable=False)
+    grade_rank = db.Column(db.Integer, nullable=False)
+    class_rank = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('snapshot_id', 'user_id', name='unique_snapshot_student'),
+        db.Index('ix_ranking_snapshot_row_rank', 'snapshot_id', 'overall_rank'),
+    )
+
+class StudentYearScore(db.Model):
+    """学生一个学年按默认规则的最终分数，统计立方体的明细（由 refresh_score_cube 维护）"""
+    user_id = db.Column(db.Integer, primary_key=True)
+    academic_year = db.Column(db.String(20), primary_key=True)
+    # 书院、年级、班级为空时存空字符串，便于按单元格分组
+    college = db.Column(db.String(100), nullable=False, default='')
+    grade = db.Column(db.String(20), nullable=False, default='')
+    class_name = db.Column(db.String(50), nullable=False, default='')
+    total_score = db.Column(db.Integer, nullable=False)
+    category_scores = db.Column(db.Text, nullable=False)  # JSON：主类别 -> 最终分数
+
+    __table_args__ = (
+        db.Index('ix_student_year_score_cell', 'academic_year', 'college', 'grade', 'class_name', 'total_score'),
+    )
+
+class ScoreCube(db.Model):
+    """统计立方体的一个单元格：全校、书院、书院内年级或班级的汇总"""
+    id = db.Column(db.Integer, primary_key=True)
+    academic_year = db.Column(db.String(20), nullable=False)
+    level = db.Column(db.String(10), nullable=False)  # year / college / grade / class
+    # 汇总层级以上的维度为空字符串
+    college = db.Column(db.String(100), nullable=False, default='')
+    grade = db.Column(db.String(20), nullable=False, default='')
+    class_name = db.Column(db.String(50), nullable=False, default='')
+    student_count = db.Column(db.Integer, nullable=False)
+    mean_total = db.Column(db.Float, nullable=False)
+    median_total = db.Column(db.Float, nullable=False)
+    category_means = db.Column(db.Text, nullable=False)  # JSON：主类别 -> 平均最终分
+    cap_shares = db.Column(db.Text, nullable=False)  # JSON：主类别 -> 达到上限的学生比例
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('academic_year', 'level', 'college', 'grade', 'class_name', name='unique_score_cube_cell'),
+    )
 
-    # 角色下的主类别与允许的子类别
-    if user_role == 'teacher':
-        main_names = TEACHER_MAIN_CATEGORIES
-        allowed_children = TEACHER_ALLOWED_CHILDREN
+class ReviewEvent(db.Model):
+    """审核队列变更事件（提交、修改、撤回、审核），自增 id 即推送序号"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # application / group_application
+    action = db.Column(db.String(20), nullable=False)  # created / updated / withdrawn / reviewed
+    object_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ScoringRule(db.Model):
+    """学年计分规则：每个主类别一行，记录上限、聚合方式和子类别上限
+
+    规则按学年保存，调整当前学年的规则不会影响往年的成绩。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    academic_year = db.Column(db.String(20), nullable=False)
+    rule_set = db.Column(db.String(50), nullable=False, default='default')
+    category_id = db.Column(db.Integer, db.ForeignKey('score_category.id'), nullable=False)  # 主类别
+    max_score = db.Column(db.Integer, nullable=False)
+    mode = db.Column(db.String(10), nullable=False, default='sum')  # sum：累加；max：只取最高 1 项
+    subcategory_caps = db.Column(db.Text, nullable=False, default='{}')  # JSON：子类别 id -> 上限
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('academic_year', 'rule_set', 'category_id', name='unique_scoring_rule'),)
+
+    category = db.relationship('ScoreCategory')
+
+class RosterUpload(db.Model):
+    """暂存的成员名单：教师先上传名单得到校验报告和 token，提交集体申请时凭 token 写入成员"""
+    token = db.Column(db.String(32), primary_key=True)
+    teacher_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class RosterStagingRow(db.Model):
+    """暂存名单中的一行，error 为空表示校验通过"""
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(32), nullable=False)
+    row_number = db.Column(db.Integer, nullable=False)  # 文件中的行号（表头为第 1 行）
+    student_id = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(100))
+    score = db.Column(db.Integer)  # 分值无法解析时为空
+    student_user_id = db.Column(db.Integer)
+    error = db.Column(db.String(20))  # 见 ROSTER_ERRORS
+
+    __table_args__ = (db.Index('ix_roster_staging_token_student', 'token', 'student_id', 'row_number'),)
+
+class IdempotencyKey(db.Model):
+    """提交接口的幂等键：同一用户用同一个键重试时直接返回第一次的响应"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(64), nullable=False)
+    endpoint = db.Column(db.String(50), nullable=False)
+    response_status = db.Column(db.Integer)  # 为空表示第一次请求仍在处理
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='unique_idempotency_key'),)
+
+# 按学年归档到归档库的表
+ARCHIVED_MODELS = (ScoreRecord, ScoreApplication, GroupApplication, GroupApplicationMember)
+
+
+# ==================== 计分规则 ====================
+DEFAULT_RULE_SET = 'default'
+# 进程内规则缓存：{'versions': (规则表版本戳, 类别表版本戳), 'rules': {(学年, 规则集): CompiledRules}, 'fallback': CompiledRules}
+_scoring_rules_cache = {}
+
+def category_rows():
+    """全部类别的 (id, parent_id, name)"""
+    return db.session.query(ScoreCategory.id, ScoreCategory.parent_id, ScoreCategory.name).order_by(ScoreCategory.id).all()
+
+def default_rules(categories):
+    """由代码常量生成的初始规则行"""
+    return scoring.rules_from_names(categories, CATEGORY_MAX_LIMITS, SUBCATEGORY_MAX_LIMITS, [SPECIAL_CATEGORY_ZHIREN])
+
+def _rule_tuple(rule):
+    return rule.category_id, rule.max_score, rule.mode, {int(k): v for k, v in json.loads(rule.subcategory_caps).items()}
+
+def _load_scoring_rules(versions):
+    """两条查询取出类别树和所有学年的规则，编译后按两张表的版本戳缓存"""
+    categories = category_rows()
+    rules_by_key = {}
+    for rule in ScoringRule.query.order_by(ScoringRule.id).all():
+        rules_by_key.setdefault((rule.academic_year, rule.rule_set), []).append(_rule_tuple(rule))
+    _scoring_rules_cache.update({
+        'versions': versions,
+        'rules': {key: scoring.compile_rules(categories, rules) for key, rules in rules_by_key.items()},
+        'fallback': scoring.compile_rules(categories, default_rules(categories))
+    })
+
+def get_scoring_rules(academic_year, rule_set=DEFAULT_RULE_SET):
+    """取得学年的编译后规则；学年没有默认规则时使用代码常量，其他规则集不存在时返回 None
+
+    任一进程提交规则或类别的修改后版本戳变化，各进程在下一次调用时重新加载。
+    """
+    # 先读版本戳再加载：加载期间有新的修改时，缓存记下的是旧版本，下一次调用会再次加载
+    versions = (table_versions.version('scoring_rule'), table_versions.version('score_category'))
+    if _scoring_rules_cache.get('versions') != versions:
+        _load_scoring_rules(versions)
+    compiled = _scoring_rules_cache['rules'].get((academic_year, rule_set))
+    if compiled is None and rule_set == DEFAULT_RULE_SET:
+        compiled = _scoring_rules_cache['fallback']
+    return compiled
+
+def invalidate_scoring_rules():
+    """丢弃本进程的缓存；提交前在同一事务中读取刚写入的规则时使用（提交后版本戳变化，各进程自动重新加载）"""
+    _scoring_rules_cache.clear()
+
+def save_scoring_rules(academic_year, rule_set, rules):
+    """整体替换某学年某规则集的规则行，调用方负责提交"""
+    ScoringRule.query.filter_by(academic_year=academic_year, rule_set=rule_set).delete()
+    now = datetime.utcnow()
+    for category_id, max_score, mode, subcategory_caps in rules:
+        db.session.add(ScoringRule(
+            academic_year=academic_year,
+            rule_set=rule_set,
+            category_id=category_id,
+            max_score=max_score,
+            mode=mode,
+            subcategory_caps=json.dumps({str(k): v for k, v in subcategory_caps.items()}),
+            updated_at=now
+        ))
+    invalidate_scoring_rules()
+
+def ensure_year_rules(academic_year):
+    """为还没有默认规则的学年写入规则：沿用最近一个已有规则的学年，没有则使用代码常量"""
+    if ScoringRule.query.filter_by(academic_year=academic_year, rule_set=DEFAULT_RULE_SET).first():
+        return False
+    source_year = db.session.query(db.func.max(ScoringRule.academic_year)).filter(
+        ScoringRule.rule_set == DEFAULT_RULE_SET
+    ).scalar()
+    if source_year:
+        rules = [_rule_tuple(r) for r in ScoringRule.query.filter_by(academic_year=source_year, rule_set=DEFAULT_RULE_SET)]
     else:
-        main_names = STUDENT_MAIN_CATEGORIES
-        allowed_children = STUDENT_ALLOWED_CHILDREN
+        rules = default_rules(category_rows())
+    save_scoring_rules(academic_year, DEFAULT_RULE_SET, rules)
+    return True
+
+# ==================== 冷学年归档 ====================
+_archived_years_cache = (None, frozenset())
+_archive_entities = {}
+
+def archived_years():
+    """已归档的学年，按 archived_year 的版本戳在进程内缓存"""
+    global _archived_years_cache
+    version = table_versions.version('archived_year')
+    if _archived_years_cache[0] != version:
+        years = frozenset(db.session.execute(db.select(score_archive.years_table.c.year_name)).scalars())
+        _archived_years_cache = (version, years)
+    return _archived_years_cache[1]
+
+def archive_model(model):
+    """映射到归档库同名表的实体，查询中的用法与原模型相同"""
+    entity = _archive_entities.get(model)
+    if entity is None:
+        entity = _archive_entities[model] = db.aliased(
+            model, score_archive.tables[model.__tablename__], adapt_on_names=True)
+    return entity
+
+def score_model(model, academic_year):
+    """按学年选择读主库的表还是归档库的表"""
+    if academic_year and academic_year in archived_years():
+        return archive_model(model)
+    return model
+
+def query_score_records(build, academic_year=None):
+    """执行德育分记录查询，build(记录实体) 返回查询
+
+    指定学年时只查该学年所在的库；未指定时合并主库和归档库的结果（归档的学年较早，排在后面）。
+    """
+    if academic_year:
+        return build(score_model(ScoreRecord, academic_year)).all()
+    rows = build(ScoreRecord).all()
+    if archived_years():
+        rows += build(archive_model(ScoreRecord)).all()
+    return rows
 
-    # 获取主类别
-    main_categories = ScoreCategory.query.filter(
-        ScoreCategory.name.in_(main_names),
-        ScoreCategory.parent_id == None
-    ).all()
+def score_entity(model, academic_year=None):
+    """按学年归档的表（ARCHIVED_MODELS）的查询实体：指定学年时为该学年所在库的表；未指定时为主库和归档库的
+    UNION ALL，在同一条 SQL 中合并，可以直接筛选、排序和分组（如按学生聚合全部学年的排行榜、申请列表和详情）
 
-    result = []
-    for main_cat in main_categories:
-        category_data = {
-            'id': main_cat.id,
-            'name': main_cat.name,
-            'description': main_cat.description,
-            'max_score': main_cat.max_score,
-            'parent_id': main_cat.parent_id,
-            'children': []
-        }
+    合并得到的对象只用于读取，修改仍需按 id 从主库加载（已归档学年的数据不再修改）。
+    """
+    if academic_year or not archived_years():
+        return score_model(model, academic_year)
+    both = db.union_all(
+        db.select(model.__table__), db.select(score_archive.tables[model.__tablename__])
+    ).subquery(f'{model.__tablename__}_all')
+    return db.aliased(model, both, adapt_on_names=True)
+
+def score_schemas(academic_year=None):
+    """查询需要覆盖的库：指定学年时为该学年所在的库；未指定时为主库，有归档学年时再加上归档库
 
-        # 获取并按角色过滤子类别
-        subcategories = ScoreCategory.query.filter_by(parent_id=main_cat.id).all()
-        for sub_cat in subcategories:
-            if main_cat.name in allowed_children:
-                if sub_cat.name not in allowed_children[main_cat.name]:
-                    continue
-            category_data['children'].append({
-                'id': sub_cat.id,
-                'name': sub_cat.name,
-                'description': sub_cat.description,
-                'max_score': sub_cat.max_score,
-                'parent_id': sub_cat.parent_id
+    用于分别在各库的索引上执行、再在 SQL 中合并的查询（审核队列、全文搜索）。
+    """
+    if academic_year:
+        return [ARCHIVE_SCHEMA if academic_year in archived_years() else HOT_SCHEMA]
+    return [HOT_SCHEMA, ARCHIVE_SCHEMA] if archived_years() else [HOT_SCHEMA]
+
+def schema_model(model, schema):
+    """模型在指定库中的表"""
+    return archive_model(model) if schema == ARCHIVE_SCHEMA else model
+
+# ==================== 德育分记录写入 ====================
+def score_record_insert():
+    """写入德育分记录的 INSERT，(学生, 类别, 学年) 已有记录时跳过该行；配合 RETURNING 可知哪些行被写入"""
+    return sqlite_insert(ScoreRecord).on_conflict_do_nothing(
+        index_elements=['user_id', 'category_id', 'academic_year'])
+
+
+# ==================== 审核事件 ====================
+# 每次推送读取的事件数上限
+REVIEW_EVENT_BATCH = 100
+# 事件表保留天数，init_db 时清理更早的事件
+REVIEW_EVENT_RETENTION_DAYS = 7
+
+def add_review_event(kind, action, object_id):
+    """在当前事务中记录审核队列事件，提交后推送给在线的审核人"""
+    db.session.add(ReviewEvent(kind=kind, action=action, object_id=object_id))
+    review_events.mark(db.session)
+
+def fetch_review_events(last_id):
+    """读取序号大于 last_id 的事件，并附上申请的最新数据（已不存在的申请为 None）"""
+    events = ReviewEvent.query.filter(ReviewEvent.id > last_id).order_by(ReviewEvent.id).limit(REVIEW_EVENT_BATCH).all()
+    application_ids = {e.object_id for e in events if e.kind == 'application'}
+    group_ids = {e.object_id for e in events if e.kind == 'group_application'}
+    items = {}
+    if application_ids:
+        items.update((('application', row['id']), row) for row in iter_applications(application_ids))
+    if group_ids:
+        items.update((('group_application', row['id']), row) for row in serialize_group_applications(group_ids))
+    result = [
+        (e.id, e.kind, {'action': e.action, 'id': e.object_id, 'item': items.get((e.kind, e.object_id))})
+        for e in events
+    ]
+    # 结束读事务并归还连接，推送流在两次查询之间不占用连接
+    db.session.close()
+    return result
+
+# ==================== 幂等提交 ====================
+# 幂等键保留的小时数，过期后同一个键视为新请求
+IDEMPOTENCY_TTL_HOURS = 24
+# 第一次请求超过这么多秒仍未记录响应（如进程崩溃），同一个键可以重新处理
+IDEMPOTENCY_PENDING_SECONDS = 300
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+def prune_idempotency_keys():
+    """删除过期的幂等键"""
+    IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    ).delete(synchronize_session=False)
+
+def claim_idempotency_key(user_id, endpoint, key):
+    """登记幂等键并立即提交；首次使用返回 (键 id, None)，已使用过返回 (None, 已有记录)"""
+    prune_idempotency_keys()
+    now = datetime.utcnow()
+    IdempotencyKey.query.filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.key == key,
+        IdempotencyKey.response_status.is_(None),
+        IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_PENDING_SECONDS)
+    ).delete(synchronize_session=False)
+    claimed = db.session.execute(
+        sqlite_insert(IdempotencyKey).values(user_id=user_id, key=key, endpoint=endpoint, created_at=now)
+        .on_conflict_do_nothing(index_elements=['user_id', 'key'])
+        .returning(IdempotencyKey.id)
+    ).scalar()
+    existing = None if claimed else IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    db.session.commit()
+    return claimed, existing
+
+def idempotent(endpoint):
+    """为提交接口启用 Idempotency-Key 请求头，需放在 @app.route 之下
+
+    首次请求照常处理，成功（2xx）的响应记录到幂等键上；同一用户带同一个键重试时，
+    在读取表单和上传文件之前直接返回记录的响应，并带 Idempotent-Replayed 头。
+    第一次请求仍在处理时返回 409，同一个键已用于其他接口时返回 422。
+    失败的响应不记录并释放键：客户端修正校验错误（4xx）后可以用同一个键重新提交。
+    不带请求头的请求不受影响。
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key or 'user' not in session:
+                return view(*args, **kwargs)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return jsonify({'message': 'Idempotency-Key 过长'}), 400
+
+            claimed, existing = claim_idempotency_key(session['user']['id'], endpoint, key)
+            if existing is not None:
+                if existing.endpoint != endpoint:
+                    return jsonify({'message': 'Idempotency-Key 已用于其他请求'}), 422
+                if existing.response_status is None:
+                    return jsonify({'message': '相同的请求正在处理中，请稍后再试'}), 409
+                response = app.response_class(existing.response_body, status=existing.response_status,
+                                              mimetype='application/json')
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                db.session.rollback()
+                IdempotencyKey.query.filter_by(id=claimed).delete()
+                db.session.commit()
+                raise
+            if 200 <= response.status_code < 300:
+                IdempotencyKey.query.filter_by(id=claimed).update({
+                    'response_status': response.status_code,
+                    'response_body': response.get_data(as_text=True)
+                })
+            else:
+                # 请求没有生效，允许用同一个键重试
+                IdempotencyKey.query.filter_by(id=claimed).delete()
+            db.session.commit()
+            return response
+        return wrapper
+    return decorator
+
+# ==================== 成员名单暂存 ====================
+# 每批写入暂存表的行数
+ROSTER_STAGING_BATCH = 1000
+# 暂存名单的有效期，过期的在下次上传或 init_db 时清理
+ROSTER_STAGING_TTL_HOURS = 24
+# 校验报告最多列出的问题行数
+ROSTER_REPORT_ERRORS = 200
+ROSTER_ERRORS = {
+    'missing_student_id': '学号为空',
+    'invalid_score': '分值无效',
+    'duplicate': '名单中重复',
+    'unknown_student': '学号不存在',
+}
+
+def prune_roster_uploads():
+    """删除过期的暂存名单"""
+    expired = db.select(RosterUpload.token).where(
+        RosterUpload.created_at < datetime.utcnow() - timedelta(hours=ROSTER_STAGING_TTL_HOURS))
+    RosterStagingRow.query.filter(RosterStagingRow.token.in_(expired)).delete(synchronize_session=False)
+    RosterUpload.query.filter(RosterUpload.token.in_(expired)).delete(synchronize_session=False)
+
+def stage_roster(file, file_extension, teacher_user_id):
+    """流式解析名单并分批写入暂存表，然后整体校验；返回 token，由调用方提交事务
+
+    Raises:
+        rosters.RosterError: 格式不支持或缺少必需列
+    """
+    prune_roster_uploads()
+    token = secrets.token_hex(16)
+    db.session.add(RosterUpload(token=token, teacher_user_id=teacher_user_id, filename=file.filename))
+    batch = []
+    for row_number, student_id, name, raw_score in rosters.iter_roster(file, file_extension):
+        score = rosters.parse_score(raw_score)
+        if not student_id:
+            error = 'missing_student_id'
+        elif score is None:
+            error = 'invalid_score'
+        else:
+            error = None
+        batch.append({'token': token, 'row_number': row_number, 'student_id': student_id,
+                      'name': name, 'score': score, 'error': error})
+        if len(batch) >= ROSTER_STAGING_BATCH:
+            db.session.execute(db.insert(RosterStagingRow), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(RosterStagingRow), batch)
+    validate_roster(token)
+    return token
+
+def validate_roster(token):
+    """按集合校验暂存名单：标记重复学号、关联学生账号、标记不存在的学号"""
+    rows = RosterStagingRow.query.filter(RosterStagingRow.token == token)
+    # 同一学号只保留第一个通过行内校验的行；前面分值无效的行不会让后面的有效行变成重复
+    first = db.aliased(RosterStagingRow)
+    first_row = db.select(db.func.min(first.row_number)).where(
+        first.token == RosterStagingRow.token, first.student_id == RosterStagingRow.student_id,
+        first.error.is_(None)
+    ).scalar_subquery()
+    rows.filter(RosterStagingRow.error.is_(None), RosterStagingRow.row_number > first_row).update(
+        {'error': 'duplicate'}, synchronize_session=False)
+    rows.update({'student_user_id': db.select(User.id).where(
+        User.student_id == RosterStagingRow.student_id, User.role == 'student'
+    ).scalar_subquery()}, synchronize_session=False)
+    rows.filter(RosterStagingRow.error.is_(None), RosterStagingRow.student_user_id.is_(None)).update(
+        {'error': 'unknown_student'}, synchronize_session=False)
+
+def find_roster_upload(token, teacher_user_id):
+    """教师本人上传且未过期的暂存名单"""
+    return RosterUpload.query.filter(
+        RosterUpload.token == token,
+        RosterUpload.teacher_user_id == teacher_user_id,
+        RosterUpload.created_at >= datetime.utcnow() - timedelta(hours=ROSTER_STAGING_TTL_HOURS)
+    ).first()
+
+def roster_errors(token, error=None, limit=ROSTER_REPORT_ERRORS):
+    """校验未通过的行，按行号排序"""
+    query = RosterStagingRow.query.filter(RosterStagingRow.token == token)
+    if error:
+        query = query.filter(RosterStagingRow.error == error)
+    else:
+        query = query.filter(RosterStagingRow.error.isnot(None))
+    return query.order_by(RosterStagingRow.row_number).limit(limit).all()
+
+def roster_report(upload):
+    """暂存名单的校验报告"""
+    total, valid = db.session.query(
+        db.func.count(RosterStagingRow.id),
+        db.func.count(db.case((RosterStagingRow.error.is_(None), 1)))
+    ).filter(RosterStagingRow.token == upload.token).one()
+    return {
+        'token': upload.token,
+        'filename': upload.filename,
+        'total': total,
+        'valid': valid,
+        'invalid': total - valid,
+        'errors': [{
+            'row': row.row_number,
+            'student_id': row.student_id,
+            'name': row.name,
+            'error': row.error,
+            'message': ROSTER_ERRORS[row.error]
+        } for row in roster_errors(upload.token)]
+    }
+
+def _valid_roster_rows(token):
+    """暂存名单中校验通过的行"""
+    return db.select(RosterStagingRow.student_user_id, RosterStagingRow.score).where(
+        RosterStagingRow.token == token, RosterStagingRow.error.is_(None))
+
+def _discard_roster(token):
+    RosterStagingRow.query.filter(RosterStagingRow.token == token).delete(synchronize_session=False)
+    RosterUpload.query.filter(RosterUpload.token == token).delete(synchronize_session=False)
+
+def commit_roster(token, group_application_id):
+    """把校验通过的暂存行一次性写入集体申请成员，并删除暂存名单；返回写入的成员数"""
+    valid = _valid_roster_rows(token).subquery()
+    added = db.session.execute(db.insert(GroupApplicationMember).from_select(
+        ['group_application_id', 'student_user_id', 'score'],
+        db.select(db.literal(group_application_id), valid.c.student_user_id, valid.c.score)
+        .join(User, User.id == valid.c.student_user_id)
+    )).rowcount
+    _discard_roster(token)
+    return added
+
+def apply_roster_diff(token, group_application_id):
+    """用暂存名单替换集体申请的成员：只删除名单中已没有的学生、更新分值有变化的学生、插入新增的学生
+
+    Returns:
+        {'added': 新增人数, 'removed': 删除人数, 'updated': 改分人数}
+    """
+    valid = _valid_roster_rows(token).subquery()
+    members = GroupApplicationMember.query.filter(
+        GroupApplicationMember.group_application_id == group_application_id)
+    removed = members.filter(
+        GroupApplicationMember.student_user_id.notin_(db.select(valid.c.student_user_id))
+    ).delete(synchronize_session=False)
+    new_score = db.select(valid.c.score).where(
+        valid.c.student_user_id == GroupApplicationMember.student_user_id).scalar_subquery()
+    updated = members.filter(
+        db.exists().where(valid.c.student_user_id == GroupApplicationMember.student_user_id,
+                          valid.c.score != GroupApplicationMember.score)
+    ).update({'score': new_score}, synchronize_session=False)
+    existing = db.select(GroupApplicationMember.student_user_id).where(
+        GroupApplicationMember.group_application_id == group_application_id)
+    added = db.session.execute(db.insert(GroupApplicationMember).from_select(
+        ['group_application_id', 'student_user_id', 'score'],
+        db.select(db.literal(group_application_id), valid.c.student_user_id, valid.c.score)
+        .join(User, User.id == valid.c.student_user_id)
+        .where(valid.c.student_user_id.notin_(existing))
+    )).rowcount
+    _discard_roster(token)
+    return {'added': added, 'removed': removed, 'updated': updated}
+
+# ==================== 排行榜与导出 ====================
+# 排行榜导出的列（排名之后依次为学生信息、基准分、各主类别分数、总分）
+EXPORT_COLUMNS = ['排名', '姓名', '学号', '班级', '书院', '年级', '基准分'] + ALL_MAIN_CATEGORIES + ['总分']
+EXPORT_FORMATS = ('xlsx', 'csv', 'jsonl')
+# 流式读取记录时每批的行数
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_student_scores(academic_year=None, college=None, grade=None, class_name=None):
+    """逐个学生产出 (学生信息, 各主类别最终分, 总分, 记录数)
+
+    记录按学生排序后分批读取，任一时刻只持有一个学生的记录；按学年的编译规则以类别 id 计分。
+    """
+    rules = get_scoring_rules(academic_year)
+    # 不指定学年时包括已归档学年的记录
+    Record = score_entity(ScoreRecord, academic_year)
+    query = db.session.query(
+        User.id,
+        User.name,
+        User.student_id,
+        User.class_name,
+        User.college,
+        User.grade,
+        Record.category_id,
+        Record.score
+    ).outerjoin(Record, User.id == Record.user_id).filter(
+        User.role == 'student'
+    )
+
+    # 按学年、书院、年级、班级筛选
+    if academic_year:
+        query = query.filter(Record.academic_year == academic_year)
+    if college:
+        query = query.filter(User.college == college)
+    if grade:
+        query = query.filter(User.grade == grade)
+    if class_name:
+        query = query.filter(User.class_name == class_name)
+
+    query = query.order_by(User.id).yield_per(EXPORT_CHUNK_SIZE)
+    for _, rows in itertools.groupby(query, key=lambda r: r.id):
+        student = None
+        records = []
+        for row in rows:
+            student = row
+            if row.score is not None:
+                records.append((row.category_id, row.score))
+
+        category_scores, total_score = scoring.score_records(rules, records)
+        yield student, category_scores, total_score, len(records)
+
+def iter_ranked_export_rows(academic_year=None, college=None, grade=None, class_name=None):
+    """按总分排名逐行产出导出数据（字典，键为 EXPORT_COLUMNS）
+
+    排名需要全部总分，排序前每个学生只保留一个紧凑元组，而不是全部记录。
+    """
+    ranked = []
+    for student, category_scores, total_score, _ in iter_student_scores(
+            academic_year, college, grade, class_name):
+        ranked.append((
+            total_score,
+            student.name,
+            student.student_id,
+            student.class_name,
+            student.college or '',
+            student.grade or '',
+            70,
+            *(category_scores.get(category, 0) for category in ALL_MAIN_CATEGORIES),
+            total_score
+        ))
+    # 按总分排序（稳定排序，同分保持学生顺序）
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    for rank, item in enumerate(ranked, 1):
+        yield dict(zip(EXPORT_COLUMNS, (rank,) + item[1:]))
+
+# ==================== 排名快照 ====================
+_ranking_snapshots_cache = (None, {})
+
+def ranking_snapshots():
+    """已冻结排名的学年 -> 快照 id，按 ranking_snapshot 的版本戳在进程内缓存"""
+    global _ranking_snapshots_cache
+    version = table_versions.version('ranking_snapshot')
+    if _ranking_snapshots_cache[0] != version:
+        snapshots = dict(db.session.query(RankingSnapshot.academic_year, RankingSnapshot.id).all())
+        _ranking_snapshots_cache = (version, snapshots)
+    return _ranking_snapshots_cache[1]
+
+def assign_ranks(entries, field, partition):
+    """按 partition(entry) 分组，组内按总分降序写入同分同名次的排名（1, 1, 3）"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(partition(entry), []).append(entry)
+    for members in groups.values():
+        members.sort(key=lambda entry: entry['total_score'], reverse=True)
+        rank, previous = 0, None
+        for position, entry in enumerate(members, 1):
+            if entry['total_score'] != previous:
+                rank, previous = position, entry['total_score']
+            entry[field] = rank
+
+def freeze_ranking(academic_year, created_by_id):
+    """按学年规则计算最终排名并写入快照（调用方提交）"""
+    entries = []
+    for student, category_scores, total_score, record_count in iter_student_scores(academic_year):
+        entries.append({
+            'user_id': student.id,
+            'name': student.name,
+            'student_id': student.student_id,
+            'class_name': student.class_name,
+            'college': student.college,
+            'grade': student.grade,
+            'category_scores': category_scores,
+            'total_score': total_score,
+            'record_count': record_count
+        })
+    assign_ranks(entries, 'overall_rank', lambda entry: None)
+    assign_ranks(entries, 'college_rank', lambda entry: entry['college'])
+    assign_ranks(entries, 'grade_rank', lambda entry: entry['grade'])
+    assign_ranks(entries, 'class_rank', lambda entry: (entry['college'], entry['grade'], entry['class_name']))
+
+    snapshot = RankingSnapshot(academic_year=academic_year, student_count=len(entries), created_by_id=created_by_id)
+    db.session.add(snapshot)
+    db.session.flush()
+    for entry in entries:
+        entry['snapshot_id'] = snapshot.id
+        entry['category_scores'] = json.dumps(entry['category_scores'], ensure_ascii=False)
+    # 分批执行，避免超出 SQLite 单条语句的参数个数上限
+    for i in range(0, len(entries), 1000):
+        db.session.execute(db.insert(RankingSnapshotRow), entries[i:i + 1000])
+    return snapshot
+
+def snapshot_rows(snapshot_id, college=None, grade=None, class_name=None):
+    """快照中的学生，按总分降序（同分按学号），逐批读取"""
+    query = RankingSnapshotRow.query.filter(RankingSnapshotRow.snapshot_id == snapshot_id)
+    if college:
+        query = query.filter(RankingSnapshotRow.college == college)
+    if grade:
+        query = query.filter(RankingSnapshotRow.grade == grade)
+    if class_name:
+        query = query.filter(RankingSnapshotRow.class_name == class_name)
+    return query.order_by(
+        RankingSnapshotRow.overall_rank, RankingSnapshotRow.student_id
+    ).yield_per(EXPORT_CHUNK_SIZE)
+
+def iter_snapshot_export_rows(snapshot_id, college=None, grade=None, class_name=None):
+    """从快照逐行产出导出数据；排名为筛选范围内的同分同名次排名"""
+    rank, previous = 0, None
+    for position, row in enumerate(snapshot_rows(snapshot_id, college, grade, class_name), 1):
+        if row.total_score != previous:
+            rank, previous = position, row.total_score
+        category_scores = json.loads(row.category_scores)
+        yield dict(zip(EXPORT_COLUMNS, (
+            rank,
+            row.name,
+            row.student_id,
+            row.class_name,
+            row.college or '',
+            row.grade or '',
+            70,
+            *(category_scores.get(category, 0) for category in ALL_MAIN_CATEGORIES),
+            row.total_score
+        )))
+
+def _export_chunks(rows, export_format):
+    if export_format == 'csv':
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        # 带 BOM，Excel 打开中文不乱码；表头先发出，客户端立即开始接收
+        writer.writerow(EXPORT_COLUMNS)
+        yield '\ufeff' + buf.getvalue()
+        for row in rows:
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow([row[col] for col in EXPORT_COLUMNS])
+            yield buf.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+def stream_export(rows, export_format, basename):
+    """把导出行以 CSV 或 JSON Lines 流式返回"""
+    def generate():
+        with metrics.timer('dyf_export_duration_seconds', kind=f'all_scores_{export_format}'):
+            yield from _export_chunks(rows, export_format)
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f'{basename}.{export_format}'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"}
+    )
+
+
+# 流式 JSON 每次编码发送的条数
+STREAM_JSON_BATCH = 200
+
+def stream_json(items):
+    """把可迭代的字典逐批编码为 JSON 数组流式返回，内容与 jsonify(list(items)) 相同
+
+    items 可以是分批读取查询结果的生成器：任一时刻只持有一批数据，不会先拼出完整列表再整体序列化；
+    数组开头立即发出，首字节不必等待查询完成。
+    """
+    def generate():
+        items_iter = iter(items)
+        yield '['
+        separator = ''
+        while True:
+            batch = list(itertools.islice(items_iter, STREAM_JSON_BATCH))
+            if not batch:
+                break
+            yield separator + ','.join(app.json.dumps(item) for item in batch)
+            separator = ','
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+# ==================== 统计立方体 ====================
+# 立方体层级，依次下钻
+CUBE_LEVELS = ('year', 'college', 'grade', 'class')
+# 每批重算的学生数
+CUBE_REFRESH_BATCH = 500
+
+def _cube_cells(college, grade, class_name):
+    """一个班级单元格及其上级汇总单元格：(层级, 书院, 年级, 班级)"""
+    return (
+        ('class', college, grade, class_name),
+        ('grade', college, grade, ''),
+        ('college', college, '', ''),
+        ('year', '', '', ''),
+    )
+
+def _cube_cell_stats(academic_year, rules, college, grade, class_name, level):
+    """按学生明细用 SQL 聚合一个单元格，没有学生时返回 None"""
+    S = StudentYearScore
+    filters = [S.academic_year == academic_year]
+    for depth, (column, value) in enumerate(((S.college, college), (S.grade, grade), (S.class_name, class_name)), 1):
+        if CUBE_LEVELS.index(level) >= depth:
+            filters.append(column == value)
+
+    columns = [db.func.count(), db.func.avg(S.total_score)]
+    for name, cap in zip(rules.main_names, rules.caps):
+        value = db.func.coalesce(db.func.json_extract(S.category_scores, f'$."{name}"'), 0)
+        columns.append(db.func.avg(value))
+        # 上限为 0 的类别（扣分）不统计达到上限的比例
+        columns.append(db.func.avg(db.case((value >= cap, 1), else_=0)) if cap > 0 else db.literal(None))
+    row = db.session.query(*columns).filter(*filters).one()
+    count = row[0]
+    if not count:
+        return None
+
+    # 中位数：按总分排序后取中间的一个或两个值，由 ix_student_year_score_cell 索引提供顺序
+    middle = db.session.query(S.total_score).filter(*filters).order_by(
+        S.total_score).offset((count - 1) // 2).limit(2 - count % 2).all()
+    category_means = {}
+    cap_shares = {}
+    for i, name in enumerate(rules.main_names):
+        category_means[name] = round(row[2 + 2 * i], 2)
+        if row[3 + 2 * i] is not None:
+            cap_shares[name] = round(row[3 + 2 * i], 4)
+    return {
+        'student_count': count,
+        'mean_total': round(row[1], 2),
+        'median_total': sum(value for value, in middle) / len(middle),
+        'category_means': json.dumps(category_means, ensure_ascii=False),
+        'cap_shares': json.dumps(cap_shares, ensure_ascii=False)
+    }
+
+def refresh_score_cube(academic_year):
+    """重算被标记的学生的最终分数，再重算他们新旧所在的单元格；由调用方提交
+
+    Returns:
+        重算的学生数
+    """
+    dirty = db.session.execute(db.text(
+        f'SELECT user_id, version FROM {score_cube.DIRTY_TABLE} WHERE academic_year = :year'
+    ), {'year': academic_year}).all()
+    if not dirty:
+        return 0
+
+    rules = get_scoring_rules(academic_year)
+    Record = score_model(ScoreRecord, academic_year)
+    S = StudentYearScore
+    cells = set()
+    for i in range(0, len(dirty), CUBE_REFRESH_BATCH):
+        user_ids = [user_id for user_id, _ in dirty[i:i + CUBE_REFRESH_BATCH]]
+        # 学生原来所在的单元格（可能已转班或已没有记录）
+        for row in db.session.query(S.college, S.grade, S.class_name).filter(
+                S.academic_year == academic_year, S.user_id.in_(user_ids)).distinct():
+            cells.update(_cube_cells(*row))
+        S.query.filter(S.academic_year == academic_year, S.user_id.in_(user_ids)).delete(synchronize_session=False)
+
+        rows = db.session.query(
+            User.id, User.college, User.grade, User.class_name, Record.category_id, Record.score
+        ).join(Record, Record.user_id == User.id).filter(
+            User.role == 'student',
+            User.id.in_(user_ids),
+            Record.academic_year == academic_year
+        ).order_by(User.id)
+        students = []
+        for _, group in itertools.groupby(rows, key=lambda r: r.id):
+            group = list(group)
+            student = group[0]
+            category_scores, total_score = scoring.score_records(
+                rules, [(row.category_id, row.score) for row in group])
+            cell = (student.college or '', student.grade or '', student.class_name or '')
+            cells.update(_cube_cells(*cell))
+            students.append({
+                'user_id': student.id,
+                'academic_year': academic_year,
+                'college': cell[0],
+                'grade': cell[1],
+                'class_name': cell[2],
+                'total_score': total_score,
+                'category_scores': json.dumps(category_scores, ensure_ascii=False)
             })
+        if students:
+            db.session.execute(db.insert(S), students)
+
+    now = datetime.utcnow()
+    for level, college, grade, class_name in cells:
+        stats = _cube_cell_stats(academic_year, rules, college, grade, class_name, level)
+        key = {'academic_year': academic_year, 'level': level, 'college': college, 'grade': grade, 'class_name': class_name}
+        if stats is None:
+            ScoreCube.query.filter_by(**key).delete(synchronize_session=False)
+            continue
+        statement = sqlite_insert(ScoreCube).values(updated_at=now, **key, **stats)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['academic_year', 'level', 'college', 'grade', 'class_name'],
+            set_={name: statement.excluded[name] for name in ('updated_at', *stats)}
+        ))
+
+    # 只清除读取时版本未变的标记，刷新期间的新写入留到下一次
+    db.session.execute(db.text(
+        f'DELETE FROM {score_cube.DIRTY_TABLE} WHERE user_id = :user_id AND academic_year = :year AND version = :version'
+    ), [{'user_id': user_id, 'year': academic_year, 'version': version} for user_id, version in dirty])
+    return len(dirty)
+
+def _cube_cell_dict(cell):
+    return {
+        'level': cell.level,
+        'college': cell.college,
+        'grade': cell.grade,
+        'class_name': cell.class_name,
+        'student_count': cell.student_count,
+        'mean_total': cell.mean_total,
+        'median_total': cell.median_total,
+        'category_means': json.loads(cell.category_means),
+        'cap_shares': json.loads(cell.cap_shares)
+    }
 
-        result.append(category_data)
+@app.route('/api/statistics/cube', methods=['GET'])
+def api_get_score_cube():
+    """分组统计下钻：返回当前层级的汇总及下一层级的各单元格（全校 -> 书院 -> 年级 -> 班级）"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
 
-    return jsonify(result)
+    current_year = AcademicYear.query.filter_by(is_current=True).first()
+    academic_year = request.args.get('academic_year', current_year.year_name if current_year else None)
+    if not academic_year:
+        return jsonify({'message': '缺少学年'}), 400
+    college = request.args.get('college', '')
+    grade = request.args.get('grade', '')
+    if grade and not college:
+        return jsonify({'message': '按年级下钻时需要指定书院'}), 400
+    level = 'grade' if grade else 'college' if college else 'year'
+
+    # 读取前先重算触发器标记过的学生
+    if refresh_score_cube(academic_year):
+        db.session.commit()
+
+    summary = ScoreCube.query.filter_by(
+        academic_year=academic_year, level=level, college=college, grade=grade, class_name=''
+    ).first()
+    children = ScoreCube.query.filter_by(academic_year=academic_year, level=CUBE_LEVELS[CUBE_LEVELS.index(level) + 1])
+    if college:
+        children = children.filter_by(college=college)
+    if grade:
+        children = children.filter_by(grade=grade)
+    children = children.order_by(ScoreCube.college, ScoreCube.grade, ScoreCube.class_name).all()
+
+    return jsonify({
+        'academic_year': academic_year,
+        'level': level,
+        'summary': _cube_cell_dict(summary) if summary else None,
+        'children': [_cube_cell_dict(cell) for cell in children]
+    })
+
+# ==================== 多学年成绩单 ====================
+# 管理员单次批量查询成绩单的学生数上限
+TRANSCRIPT_BATCH_LIMIT = 500
+
+def build_transcripts(user_ids):
+    """一次查询取出学生所有学年的记录，分组计算每学年的主类别分数、总分和同比变化
+
+    类别为空的记录同样计入（与排行榜一致），因此不连接类别表。
+
+    Returns:
+        user_id -> [{'academic_year', 'category_scores', 'total_score', 'record_count', 'delta'}, ...]（按学年升序）
+    """
+    rows = query_score_records(lambda Record: db.session.query(
+        Record.user_id,
+        Record.academic_year,
+        Record.category_id,
+        Record.score
+    ).filter(
+        Record.user_id.in_(user_ids)
+    ).order_by(Record.user_id, Record.academic_year))
+    # 主库和归档库的结果合并后重新按学生、学年排序
+    rows.sort(key=lambda r: (r.user_id, r.academic_year))
+
+    transcripts = {user_id: [] for user_id in user_ids}
+    for (user_id, academic_year), year_rows in itertools.groupby(
+            rows, key=lambda r: (r.user_id, r.academic_year)):
+        # 每个学年按该学年自己的规则计分
+        records = [(row.category_id, row.score) for row in year_rows]
+        record_count = len(records)
+        category_scores, total_score = scoring.score_records(get_scoring_rules(academic_year), records)
+
+        years = transcripts[user_id]
+        delta = None
+        if years:
+            previous = years[-1]
+            delta = {
+                'total_score': total_score - previous['total_score'],
+                'category_scores': {
+                    category: category_scores.get(category, 0) - previous['category_scores'].get(category, 0)
+                    for category in ALL_MAIN_CATEGORIES
+                    if category in category_scores or category in previous['category_scores']
+                }
+            }
+        years.append({
+            'academic_year': academic_year,
+            'category_scores': category_scores,
+            'total_score': total_score,
+            'record_count': record_count,
+            'delta': delta
+        })
+    return transcripts
+
+def _transcript_payload(user, years):
+    return {
+        'student': {
+            'name': user.name,
+            'student_id': user.student_id,
+            'class_name': user.class_name,
+            'college': user.college,
+            'grade': user.grade
+        },
+        'years': years
+    }
+
+# 路由定义
+
+
+# 按类别表版本缓存的类别树：{'version': 版本戳, 'trees': {树名: 列表}}
+_category_trees_cache = {}
+
+def _category_node(category, **extra):
+    node = {
+        'id': category.id,
+        'name': category.name,
+        'description': category.description,
+        'max_score': category.max_score,
+        'parent_id': category.parent_id
+    }
+    node.update(extra)
+    return node
+
+def build_category_trees():
+    """一次查询取出全部类别，构造各角色的类别树
+
+    Returns:
+        {'student': 学生申请表单, 'teacher_form': 教师申请表单（/api/categories 的教师视图）,
+         'all': 全部类别及来源, 'teacher': 教师端管理的类别}
+    """
+    categories = ScoreCategory.query.order_by(ScoreCategory.id).all()
+    children = {}
+    for category in categories:
+        if category.parent_id is not None:
+            children.setdefault(category.parent_id, []).append(category)
+    mains = [category for category in categories if category.parent_id is None]
+
+    def role_tree(main_names, allowed_children):
+        tree = []
+        for main_cat in mains:
+            if main_cat.name not in main_names:
+                continue
+            allowed = allowed_children.get(main_cat.name)
+            tree.append(_category_node(main_cat, children=[
+                _category_node(sub_cat) for sub_cat in children.get(main_cat.id, [])
+                if allowed is None or sub_cat.name in allowed
+            ]))
+        return tree
+
+    all_tree = []
+    teacher_tree = []
+    for main_cat in mains:
+        subs = children.get(main_cat.id, [])
+        all_tree.append(_category_node(
+            main_cat,
+            source_type='教师端' if main_cat.name in PURE_TEACHER_CATEGORIES else '学生端',
+            children=[
+                _category_node(sub_cat, source_type='教师端' if is_teacher_category(main_cat.name, sub_cat.name) else '学生端')
+                for sub_cat in subs
+            ]
+        ))
+        if main_cat.name in TEACHER_MAIN_CATEGORIES:
+            # 只保留教师端管理的子类别，没有这类子类别的主类别不返回
+            teacher_children = [
+                _category_node(sub_cat, source_type='教师端')
+                for sub_cat in subs if is_teacher_category(main_cat.name, sub_cat.name)
+            ]
+            if teacher_children:
+                teacher_tree.append(_category_node(main_cat, source_type='教师端', children=teacher_children))
+
+    return {
+        'student': role_tree(STUDENT_MAIN_CATEGORIES, STUDENT_ALLOWED_CHILDREN),
+        'teacher_form': role_tree(TEACHER_MAIN_CATEGORIES, TEACHER_ALLOWED_CHILDREN),
+        'all': all_tree,
+        'teacher': teacher_tree
+    }
+
+def category_tree(name):
+    """按类别表版本取得类别树，类别未变化时不查询数据库"""
+    version = table_versions.version('score_category')
+    if _category_trees_cache.get('version') != version:
+        _category_trees_cache.update(version=version, trees=build_category_trees())
+    return _category_trees_cache['trees'][name]
+
+def category_tree_response(name):
+    response = table_versions.json_response(f'categories-{name}', ('score_category',), lambda: category_tree(name))
+    # 返回内容与登录角色有关，不允许共享缓存
+    response.cache_control.private = True
+    return response
+
+@app.route('/api/categories', methods=['GET'])
+@query_budget(1)
+def api_get_categories():
+    # 获取用户角色
+    user_role = session.get('user', {}).get('role', 'student')
+    return category_tree_response('teacher_form' if user_role == 'teacher' else 'student')
 
 @app.route('/api/categories/all', methods=['GET'])
+@query_budget(1)
 def api_get_all_categories():
     """获取所有类别（包括教师端管理的类别），用于学生端显示"""
     if 'user' not in session:
         return jsonify({'error': '未登录'}), 401
-    
-    # 获取所有主类别
-    main_categories = ScoreCategory.query.filter(ScoreCategory.parent_id == None).all()
-    
-    result = []
-    for main_cat in main_categories:
-        # 判断主类别来源类型
-        source_type = '教师端' if main_cat.name in PURE_TEACHER_CATEGORIES else '学生端'
-        
-        category_data = {
-            'id': main_cat.id,
-            'name': main_cat.name,
-            'description': main_cat.description,
-            'max_score': main_cat.max_score,
-            'parent_id': main_cat.parent_id,
-            'source_type': source_type,
-            'children': []
-        }
-
-        # 获取子类别并判断每个子类别的来源类型
-        subcategories = ScoreCategory.query.filter_by(parent_id=main_cat.id).all()
-        for sub_cat in subcategories:
-            # 判断子类别是否为教师端管理
-            sub_source_type = '教师端' if is_teacher_category(main_cat.name, sub_cat.name) else '学生端'
-            
-            category_data['children'].append({
-                'id': sub_cat.id,
-                'name': sub_cat.name,
-                'description': sub_cat.description,
-                'max_score': sub_cat.max_score,
-                'parent_id': sub_cat.parent_id,
-                'source_type': sub_source_type
-            })
-
-        result.append(category_data)
-
-    return jsonify(result)
+    return category_tree_response('all')
 
 @app.route('/api/categories/teacher', methods=['GET'])
+@query_budget(1)
 def api_get_teacher_categories():
     """获取教师端管理的类别"""
     if 'user' not in session:
         return jsonify({'error': '未登录'}), 401
-    
-    # 获取教师端管理的主类别
-    main_categories = ScoreCategory.query.filter(
-        ScoreCategory.parent_id == None,
-        ScoreCategory.name.in_(TEACHER_MAIN_CATEGORIES)
-    ).all()
-    
-    result = []
-    for main_cat in main_categories:
-        category_data = {
-            'id': main_cat.id,
-            'name': main_cat.name,
-            'description': main_cat.description,
-            'max_score': main_cat.max_score,
-            'parent_id': main_cat.parent_id,
-            'source_type': '教师端',
-            'children': []
-        }
-
-        # 获取子类别，并根据规则设置权限
-        subcategories = ScoreCategory.query.filter_by(parent_id=main_cat.id).all()
-        for sub_cat in subcategories:
-            # 只添加教师端管理的子类别
-            if is_teacher_category(main_cat.name, sub_cat.name):
-                category_data['children'].append({
-                    'id': sub_cat.id,
-                    'name': sub_cat.name,
-                    'description': sub_cat.description,
-                    'max_score': sub_cat.max_score,
-                    'parent_id': sub_cat.parent_id,
-                    'source_type': '教师端'
-                })
-
-        # 只添加有教师端子类别的主类别
-        if category_data['children']:
-            result.append(category_data)
-
-    return jsonify(result)
+    return category_tree_response('teacher')
 
 @app.route('/api/teacher/group-applications', methods=['GET'])
 def api_get_teacher_group_applications():
@@ -428,7 +1443,8 @@ def api_get_teacher_group_applications():
         return jsonify({'error': '需要教师权限'}), 403
     
     teacher_id = session['user']['id']
-    applications = GroupApplication.query.filter_by(teacher_user_id=teacher_id).order_by(GroupApplication.created_at.desc()).all()
+    Group = score_entity(GroupApplication)
+    applications = db.session.query(Group).filter(Group.teacher_user_id == teacher_id).order_by(Group.created_at.desc()).all()
     
     result = []
     for app in applications:
@@ -447,72 +1463,75 @@ def api_get_teacher_group_applications():
     return jsonify(result)
 
 @app.route('/api/applications', methods=['POST'])
+@idempotent('application')
 def api_create_application():
     if 'user' not in session:
         return jsonify({'message': '未登录'}), 401
     
     current_user_id = session['user']['id']
-    print(f"学生申请提交，用户ID: {current_user_id}")
+    application_logger.info('学生申请提交')
     
     # 处理文件上传
     evidence_filename = ''
     if 'evidence' in request.files:
         file = request.files['evidence']
-        print(f"上传的文件: {file.filename if file else 'None'}")
+        application_logger.debug('上传的文件', extra={'upload_filename': file.filename if file else None})
         if file and file.filename:
             # 检查原始文件扩展名
             original_filename = file.filename
-            print(f"原始文件名: {original_filename}")
             
             # 检查是否为PDF文件（基于原始文件名）
             if not original_filename.lower().endswith('.pdf'):
-                print(f"原始文件不是PDF格式: {original_filename}")
+                application_logger.info('原始文件不是PDF格式', extra={'upload_filename': original_filename})
                 return jsonify({'message': '请上传PDF格式的文件'}), 400
             
             # 生成安全的文件名
             filename = secure_filename(file.filename)
-            print(f"处理后的文件名: {filename}")
             
             # 如果secure_filename过滤掉了扩展名，手动添加
             if not filename.lower().endswith('.pdf'):
                 filename = filename + '.pdf'
-                print(f"重新添加PDF扩展名: {filename}")
+                application_logger.debug('重新添加PDF扩展名', extra={'upload_filename': filename})
             
             # 添加时间戳避免重名
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
             filename = timestamp + filename
             # 保存文件
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            with metrics.timer('dyf_upload_duration_seconds', kind='evidence'):
+                file.save(file_path)
             evidence_filename = filename
-            print(f"文件保存成功: {evidence_filename}")
+            application_logger.debug('文件保存成功', extra={'evidence': evidence_filename})
     else:
-        print("未检测到文件上传")
+        application_logger.debug('未检测到文件上传')
     
     # 获取表单数据（全部必填）
     category_id = request.form.get('category_id')
     description = request.form.get('description')
     score = request.form.get('score')
     
-    print(f"表单数据 - category_id: {category_id}, description: {description[:50] if description else None}, score: {score}")
+    application_logger.debug('表单数据', extra={
+        'category_id': category_id,
+        'description_length': len(description) if description else 0,
+        'score': score
+    })
     
     # 从数据库获取当前学年
     current_year = AcademicYear.query.filter_by(is_current=True).first()
     current_academic_year = current_year.year_name if current_year else None
     
     academic_year = request.form.get('academic_year', current_academic_year)
-    print(f"学年: {academic_year}")
     
     if not category_id or not description or not score:
-        print("参数不完整，返回400错误")
         missing_fields = []
         if not category_id: missing_fields.append('申请类别')
         if not description: missing_fields.append('申请描述')
         if not score: missing_fields.append('申请分数')
+        application_logger.info('参数不完整', extra={'missing_fields': missing_fields})
         return jsonify({'message': f'请填写所有必填字段: {", ".join(missing_fields)}'}), 400
     # 学生端：证据必填
     if not evidence_filename:
-        print("缺少证据文件，返回400错误")
+        application_logger.info('缺少证据文件')
         return jsonify({'message': '请上传PDF证明材料'}), 400
     
     application = ScoreApplication(
@@ -526,6 +1545,8 @@ def api_create_application():
     )
     
     db.session.add(application)
+    db.session.flush()
+    add_review_event('application', 'created', application.id)
     db.session.commit()
     
     return jsonify({'message': '申请提交成功', 'id': application.id})
@@ -554,7 +1575,8 @@ def api_update_application(app_id):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
             filename = timestamp + filename
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            with metrics.timer('dyf_upload_duration_seconds', kind='evidence'):
+                file.save(file_path)
             application.evidence = filename
     if description:
         application.description = description
@@ -565,6 +1587,7 @@ def api_update_application(app_id):
         application.category_id = category_id
     if academic_year:
         application.academic_year = academic_year
+    add_review_event('application', 'updated', application.id)
     db.session.commit()
     return jsonify({'message': '申请已更新'})
 
@@ -579,6 +1602,7 @@ def api_withdraw_application(app_id):
     if application.status == 'approved':
         return jsonify({'message': '审核通过后不可撤回'}), 400
     application.status = 'withdrawn'
+    add_review_event('application', 'withdrawn', application.id)
     db.session.commit()
     return jsonify({'message': '申请已撤回'})
 
@@ -597,17 +1621,19 @@ def api_get_my_applications():
     if session['user']['role'] != 'student':
         return jsonify({'error': '仅学生可访问'}), 403
     
-    user_id = session['user']['id']
-    category_id = request.args.get('category_id', type=int)
-    
-    query = db.session.query(ScoreApplication, ScoreCategory).join(
-        ScoreCategory, ScoreApplication.category_id == ScoreCategory.id
-    ).filter(ScoreApplication.user_id == user_id)
+    return jsonify(build_my_applications(session['user']['id'], request.args.get('category_id', type=int)))
+
+def build_my_applications(user_id, category_id=None):
+    """学生的个人申请（含已归档学年），按提交时间倒序"""
+    Application = score_entity(ScoreApplication)
+    query = db.session.query(Application, ScoreCategory).join(
+        ScoreCategory, Application.category_id == ScoreCategory.id
+    ).filter(Application.user_id == user_id)
     
     if category_id:
-        query = query.filter(ScoreApplication.category_id == category_id)
+        query = query.filter(Application.category_id == category_id)
     
-    applications = query.order_by(ScoreApplication.created_at.desc()).all()
+    applications = query.order_by(Application.created_at.desc()).all()
     
     result = []
     for app, category in applications:
@@ -626,22 +1652,29 @@ def api_get_my_applications():
             'academic_year': app.academic_year
         })
     
-    return jsonify(result)
+    return result
 
 @app.route('/api/applications', methods=['GET'])
 def api_get_all_applications():
     if 'user' not in session or session['user']['role'] != 'admin':
         return jsonify({'message': '需要管理员权限'}), 403
     
-    applications = db.session.query(ScoreApplication, ScoreCategory, User).join(
-        ScoreCategory, ScoreApplication.category_id == ScoreCategory.id
-    ).join(User, ScoreApplication.user_id == User.id).order_by(
-        ScoreApplication.created_at.desc()
-    ).all()
+    # ?id= 可重复，只取指定的申请（审核弹窗使用）
+    ids = request.args.getlist('id', type=int)
+    return stream_json(iter_applications(ids or None))
+
+def iter_applications(ids=None):
+    """逐条产出管理员视图的个人申请（含已归档学年），ids 不为空时只产出这些申请；查询结果分批读取"""
+    Application = score_entity(ScoreApplication)
+    query = db.session.query(Application, ScoreCategory, User).join(
+        ScoreCategory, Application.category_id == ScoreCategory.id
+    ).join(User, Application.user_id == User.id)
+    if ids is not None:
+        query = query.filter(Application.id.in_(ids))
+    applications = query.order_by(Application.created_at.desc()).yield_per(EXPORT_CHUNK_SIZE)
     
-    result = []
     for app, category, user in applications:
-        result.append({
+        yield {
             'id': app.id,
             'title': app.title,
             'description': app.description,
@@ -655,9 +1688,7 @@ def api_get_all_applications():
             'user_name': user.name,
             'student_id': user.student_id,
             'class_name': user.class_name
-        })
-    
-    return jsonify(result)
+        }
 
 @app.route('/api/applications/<int:app_id>/review', methods=['PUT'])
 def api_review_application(app_id):
@@ -675,53 +1706,49 @@ def api_review_application(app_id):
         application.reviewer_id = session['user']['id']
         application.reviewed_at = datetime.utcnow()
         
-        # 如果审核通过，添加到德育分记录，先进行去重校验：同一学生、类别、学年不可重复
+        # 如果审核通过，添加到德育分记录：同一学生、类别、学年不可重复，由唯一索引保证，冲突时不插入
         if data['status'] == 'approved':
             if not application.academic_year:
                 return jsonify({'message': '申请缺少学年，无法通过'}), 400
-            existing = ScoreRecord.query.filter_by(
-                user_id=application.user_id,
-                category_id=application.category_id,
-                academic_year=application.academic_year
+            if application.academic_year in archived_years():
+                return jsonify({'message': '该学年已归档，不能再写入德育分'}), 400
+            if application.academic_year in ranking_snapshots():
+                return jsonify({'message': '该学年排名已冻结，不能再写入德育分'}), 400
+            inserted = db.session.execute(
+                score_record_insert().returning(ScoreRecord.id),
+                [{
+                    'user_id': application.user_id,
+                    'category_id': application.category_id,
+                    'score': application.score,
+                    'source': '个人申请',
+                    'description': application.title,
+                    'academic_year': application.academic_year,
+                    'created_at': datetime.utcnow(),
+                    'application_id': application.id
+                }]
             ).first()
-            if existing:
+            if inserted is None:
                 db.session.rollback()
                 return jsonify({'message': '同一学生在同一类别和学年已有记录，不能重复通过'}), 400
-            record = ScoreRecord(
-                user_id=application.user_id,
-                category_id=application.category_id,
-                score=application.score,
-                source='个人申请',
-                description=application.title,
-                academic_year=application.academic_year,
-                application_id=application.id
-            )
-            db.session.add(record)
         
+        add_review_event('application', 'reviewed', application.id)
         db.session.commit()
         return jsonify({'message': '审核完成'})
     
     except Exception as e:
         db.session.rollback()
-        print(f"审核错误: {e}")
+        review_logger.exception('审核个人申请失败', extra={'application_id': app_id})
         return jsonify({'message': f'审核失败: {str(e)}'}), 500
 
 @app.route('/api/group-applications', methods=['POST'])
+# 防重复提交由客户端的 Idempotency-Key 保证，重试直接返回第一次的结果
+@idempotent('group_application')
 def api_create_group_application():
     if 'user' not in session or session['user']['role'] != 'teacher':
         return jsonify({'message': '需要教师权限'}), 403
     teacher_user_id = session['user']['id']
     
-    print(f"开始处理团体申请，教师ID: {teacher_user_id}")
-    
-    # 防重复提交：检查最近1分钟内是否有相同教师的申请（更宽松的限制）
-    recent_apps = GroupApplication.query.filter(
-        GroupApplication.teacher_user_id == teacher_user_id,
-        GroupApplication.created_at >= datetime.utcnow() - timedelta(minutes=1)
-    ).count()
-    if recent_apps > 0:
-        print(f"检测到重复提交，最近1分钟内有 {recent_apps} 个申请")
-        return jsonify({'message': '请勿重复提交，请等待1分钟后再试'}), 400
+    application_logger.info('开始处理集体申请')
 
     # 处理证据文件
     evidence_filename = ''
@@ -732,7 +1759,8 @@ def api_create_group_application():
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
             filename = timestamp + filename
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            with metrics.timer('dyf_upload_duration_seconds', kind='evidence'):
+                file.save(file_path)
             evidence_filename = filename
 
     category_id = request.form.get('category_id')
@@ -741,15 +1769,19 @@ def api_create_group_application():
     current_year = AcademicYear.query.filter_by(is_current=True).first()
     academic_year = request.form.get('academic_year', current_year.year_name if current_year else None)
 
-    print(f"请求参数 - category_id: {category_id}, description: {description[:50] if description else None}, evidence_filename: {evidence_filename}")
+    application_logger.debug('集体申请参数', extra={
+        'category_id': category_id,
+        'description_length': len(description) if description else 0,
+        'evidence': evidence_filename
+    })
 
     if not category_id or not description:
-        print("参数不完整，返回400错误")
+        application_logger.info('参数不完整')
         return jsonify({'message': '参数不完整'}), 400
     
     # 教师端集体申请：证明材料必填
     if not evidence_filename:
-        print("缺少证明材料，返回400错误")
+        application_logger.info('缺少证明材料')
         return jsonify({'message': '请上传证明材料'}), 400
 
     group_app = GroupApplication(
@@ -763,73 +1795,81 @@ def api_create_group_application():
     db.session.add(group_app)
     db.session.flush()
 
-    # 读取成员Excel/CSV：字段 学号, 姓名, 班级, 分值
-    if 'members' not in request.files:
-        db.session.rollback()
-        return jsonify({'message': '缺少成员名单文件'}), 400
-    members_file = request.files['members']
-    file_extension = os.path.splitext(members_file.filename)[1].lower()
-    try:
-        if file_extension in ['.xlsx', '.xls']:
-            df = pd.read_excel(members_file)
-        elif file_extension == '.csv':
-            df = pd.read_csv(members_file)
-        else:
+    # 成员名单：优先使用已暂存并校验过的名单（roster_token），否则解析本次上传的文件
+    roster_token = request.form.get('roster_token')
+    if roster_token:
+        if find_roster_upload(roster_token, teacher_user_id) is None:
             db.session.rollback()
-            return jsonify({'message': '不支持的成员名单文件格式，请上传Excel或CSV文件'}), 400
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'message': f'成员名单解析失败: {str(e)}'}), 400
-
-    required_cols = ['学号', '姓名', '分值']
-    
-    # 检查必需列
-    for col in required_cols:
-        if col not in df.columns:
+            return jsonify({'message': '成员名单已过期或不存在，请重新上传'}), 400
+    else:
+        if 'members' not in request.files:
             db.session.rollback()
-            return jsonify({'message': f'成员名单缺少必需列: {col}'}), 400
+            return jsonify({'message': '缺少成员名单文件'}), 400
+        members_file = request.files['members']
+        file_extension = os.path.splitext(members_file.filename)[1].lower()
+        try:
+            with metrics.timer('dyf_upload_duration_seconds', kind='roster'):
+                roster_token = stage_roster(members_file, file_extension, teacher_user_id)
+        except rosters.RosterError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'message': f'成员名单解析失败: {str(e)}'}), 400
 
-    # 检查Excel文件中是否有重复的学号
-    student_ids = df['学号'].astype(str).str.strip()
-    duplicates_in_file = student_ids[student_ids.duplicated()].tolist()
+    # 检查名单中是否有重复的学号
+    duplicates_in_file = [row.student_id for row in roster_errors(roster_token, 'duplicate', limit=3)]
     if duplicates_in_file:
         # 只显示前3个重复的学号，避免错误信息过长
-        duplicate_sample = duplicates_in_file[:3]
-        return jsonify({'message': f'Excel文件中存在重复学号: {duplicate_sample}，请检查并删除重复行后重新提交'}), 400
-    
-    errors = []
-    added = 0
-    
-    for _, row in df.iterrows():
-        try:
-            student_id = str(row['学号']).strip()
-            score_val = int(row['分值'])
-            
-            user = User.query.filter_by(student_id=student_id, role='student').first()
-            if not user:
-                errors.append(f'学号不存在: {student_id}')
-                continue
-            member = GroupApplicationMember(
-                group_application_id=group_app.id,
-                student_user_id=user.id,
-                score=score_val
-            )
-            db.session.add(member)
-            added += 1
-        except Exception as ie:
-            if 'UNIQUE constraint failed' in str(ie):
-                errors.append(f'学号 {student_id} 已存在于此申请中')
-            else:
-                errors.append(f'处理学号 {student_id} 时出错: {str(ie)}')
+        db.session.rollback()
+        return jsonify({'message': f'Excel文件中存在重复学号: {duplicates_in_file}，请检查并删除重复行后重新提交'}), 400
 
+    errors = [f'{ROSTER_ERRORS[row.error]}: {row.student_id or "第" + str(row.row_number) + "行"}'
+              for row in roster_errors(roster_token)]
+    added = commit_roster(roster_token, group_app.id)
     if added == 0:
         db.session.rollback()
         return jsonify({'message': '成员名单为空或无有效成员', 'errors': errors}), 400
 
+    add_review_event('group_application', 'created', group_app.id)
     db.session.commit()
     return jsonify({'message': '集体申请提交成功', 'id': group_app.id, 'errors': errors})
 
+@app.route('/api/group-applications/roster', methods=['POST'])
+def api_stage_group_roster():
+    """两步提交的第一步：暂存并校验成员名单，返回校验报告和 token"""
+    if 'user' not in session or session['user']['role'] != 'teacher':
+        return jsonify({'message': '需要教师权限'}), 403
+    if 'members' not in request.files:
+        return jsonify({'message': '缺少成员名单文件'}), 400
+    members_file = request.files['members']
+    file_extension = os.path.splitext(members_file.filename)[1].lower()
+    try:
+        with metrics.timer('dyf_upload_duration_seconds', kind='roster'):
+            token = stage_roster(members_file, file_extension, session['user']['id'])
+    except rosters.RosterError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'成员名单解析失败: {str(e)}'}), 400
+    db.session.commit()
+    return jsonify(roster_report(db.session.get(RosterUpload, token)))
+
+@app.route('/api/group-applications/roster/<token>', methods=['GET'])
+@query_budget(3)
+def api_get_group_roster(token):
+    """重新获取暂存名单的校验报告"""
+    if 'user' not in session or session['user']['role'] != 'teacher':
+        return jsonify({'message': '需要教师权限'}), 403
+    upload = find_roster_upload(token, session['user']['id'])
+    if upload is None:
+        return jsonify({'message': '成员名单已过期或不存在，请重新上传'}), 404
+    return jsonify(roster_report(upload))
+
 @app.route('/api/group-applications', methods=['GET'])
+# 另加归档学年缓存失效时的一条
+@query_budget(2)
 def api_get_all_group_applications():
     if 'user' not in session:
         return jsonify({'message': '未登录'}), 401
@@ -837,55 +1877,79 @@ def api_get_all_group_applications():
     role = session['user']['role']
     user_id = session['user']['id']
     
+    # 包括已归档学年的申请
+    Group, Member = score_entity(GroupApplication), score_entity(GroupApplicationMember)
+    query = group_application_query(Group, Member)
     if role == 'admin':
         # 管理员端：返回所有集体申请
-        apps = GroupApplication.query.order_by(GroupApplication.created_at.desc()).all()
+        query = query.add_columns(db.literal(None).label('student_score'))
     elif role == 'teacher':
         # 教师端：只返回自己提交的集体申请
-        apps = GroupApplication.query.filter_by(teacher_user_id=user_id).order_by(GroupApplication.created_at.desc()).all()
+        query = query.add_columns(db.literal(None).label('student_score')).filter(
+            Group.teacher_user_id == user_id)
     else:
-        # 学生端：返回自己参与的集体申请
-        member_records = GroupApplicationMember.query.filter_by(student_user_id=user_id).all()
-        app_ids = [m.group_application_id for m in member_records]
-        apps = GroupApplication.query.filter(GroupApplication.id.in_(app_ids)).order_by(GroupApplication.created_at.desc()).all() if app_ids else []
+        # 学生端：返回自己参与的集体申请，并带出该学生在此申请中的分数
+        query = query.join(
+            Member,
+            (Member.group_application_id == Group.id) &
+            (Member.student_user_id == user_id)
+        ).add_columns(Member.score.label('student_score'))
     
-    result = []
-    for ga in apps:
-        # 如果是学生查看，返回该学生在此申请中的分数
-        student_score = None
-        if role == 'student':
-            member = GroupApplicationMember.query.filter_by(
-                group_application_id=ga.id,
-                student_user_id=user_id
-            ).first()
-            if member:
-                student_score = member.score
-        
-        result.append({
-            'id': ga.id,
-            'title': ga.title,
-            'description': ga.description,
-            'academic_year': ga.academic_year,
-            'status': ga.status,
-            'created_at': ga.created_at.isoformat(),
-            'member_count': len(ga.members),
-            'teacher_name': ga.teacher.name if ga.teacher else '未知教师',
-            'category_name': ga.category.name if ga.category else '未知类别',
-            'student_score': student_score,
-            'evidence': ga.evidence,
-            'review_comment': ga.review_comment,
-            'reviewed_at': ga.reviewed_at.isoformat() if ga.reviewed_at else None
-        })
-    return jsonify(result)
+    rows = query.order_by(Group.created_at.desc()).yield_per(EXPORT_CHUNK_SIZE)
+    return stream_json(_group_application_dict(*row) for row in rows)
+
+def group_application_query(Group=GroupApplication, Member=GroupApplicationMember):
+    """集体申请列表查询：成员数用子查询统计，教师、类别一并关联，避免逐条加载关系
+
+    Group、Member 为集体申请及其成员的查询实体（见 score_entity），默认只查主库。
+    """
+    member_count = db.session.query(
+        Member.group_application_id,
+        db.func.count(Member.id).label('member_count')
+    ).group_by(Member.group_application_id).subquery()
+    return db.session.query(
+        Group,
+        User.name.label('teacher_name'),
+        ScoreCategory.name.label('category_name'),
+        db.func.coalesce(member_count.c.member_count, 0).label('member_count')
+    ).outerjoin(User, Group.teacher_user_id == User.id).outerjoin(
+        ScoreCategory, Group.category_id == ScoreCategory.id
+    ).outerjoin(member_count, member_count.c.group_application_id == Group.id)
+
+def _group_application_dict(ga, teacher_name, category_name, count, student_score=None):
+    return {
+        'id': ga.id,
+        'title': ga.title,
+        'description': ga.description,
+        'academic_year': ga.academic_year,
+        'status': ga.status,
+        'created_at': ga.created_at.isoformat(),
+        'member_count': count,
+        'teacher_name': teacher_name or '未知教师',
+        'category_name': category_name or '未知类别',
+        'student_score': student_score,
+        'evidence': ga.evidence,
+        'review_comment': ga.review_comment,
+        'reviewed_at': ga.reviewed_at.isoformat() if ga.reviewed_at else None
+    }
+
+def serialize_group_applications(ids):
+    """管理员视图的指定集体申请（含已归档学年）"""
+    Group = score_entity(GroupApplication)
+    rows = group_application_query(Group, score_entity(GroupApplicationMember)).filter(Group.id.in_(ids)).all()
+    return [_group_application_dict(*row) for row in rows]
 
 @app.route('/api/group-applications/my', methods=['GET'])
 def api_get_my_group_applications():
     if 'user' not in session or session['user']['role'] != 'teacher':
         return jsonify({'message': '需要教师权限'}), 403
     teacher_user_id = session['user']['id']
-    apps = GroupApplication.query.filter_by(teacher_user_id=teacher_user_id).order_by(GroupApplication.created_at.desc()).all()
+    # 成员数在查询中统计：已归档申请的成员在归档库，不能通过 ga.members 加载
+    Group = score_entity(GroupApplication)
+    rows = group_application_query(Group, score_entity(GroupApplicationMember)).filter(
+        Group.teacher_user_id == teacher_user_id).order_by(Group.created_at.desc()).all()
     result = []
-    for ga in apps:
+    for ga, _, _, member_count in rows:
         result.append({
             'id': ga.id,
             'title': ga.title,
@@ -893,11 +1957,13 @@ def api_get_my_group_applications():
             'academic_year': ga.academic_year,
             'status': ga.status,
             'created_at': ga.created_at.isoformat(),
-            'member_count': len(ga.members)
+            'member_count': member_count
         })
     return jsonify(result)
 
 @app.route('/api/group-applications/<int:gid>', methods=['GET'])
+# 另加归档学年缓存失效时的一条
+@query_budget(3)
 def api_get_group_application_detail(gid):
     if 'user' not in session:
         return jsonify({'message': '未登录'}), 401
@@ -905,19 +1971,34 @@ def api_get_group_application_detail(gid):
     role = session['user']['role']
     user_id = session['user']['id']
     
-    ga = GroupApplication.query.get_or_404(gid)
+    # 已归档学年的申请及成员从归档库读取
+    Group, Member = score_entity(GroupApplication), score_entity(GroupApplicationMember)
+    row = db.session.query(
+        Group,
+        User.name.label('teacher_name'),
+        ScoreCategory.name.label('category_name')
+    ).outerjoin(User, Group.teacher_user_id == User.id).outerjoin(
+        ScoreCategory, Group.category_id == ScoreCategory.id
+    ).filter(Group.id == gid).first()
+    if row is None:
+        abort(404)
+    ga, teacher_name, category_name = row
     
     # 权限检查：管理员可以查看所有申请，教师只能查看自己的申请
     if role == 'admin' or (role == 'teacher' and ga.teacher_user_id == user_id):
-        # 获取成员详情
+        # 获取成员详情（一次关联查询带出学生信息）
+        member_rows = db.session.query(
+            Member.score, User.student_id, User.name, User.class_name
+        ).outerjoin(User, Member.student_user_id == User.id).filter(
+            Member.group_application_id == ga.id
+        ).order_by(Member.id).all()
         members = []
-        for member in ga.members:
-            student = User.query.get(member.student_user_id)
+        for score, student_id, student_name, class_name in member_rows:
             members.append({
-                'student_id': student.student_id if student else '',
-                'student_name': student.name if student else '',
-                'class_name': student.class_name if student else '',
-                'score': member.score
+                'student_id': student_id or '',
+                'student_name': student_name or '',
+                'class_name': class_name or '',
+                'score': score
             })
         
         return jsonify({
@@ -927,8 +2008,8 @@ def api_get_group_application_detail(gid):
             'academic_year': ga.academic_year,
             'status': ga.status,
             'created_at': ga.created_at.isoformat(),
-            'teacher_name': ga.teacher.name if ga.teacher else '未知教师',
-            'category_name': ga.category.name if ga.category else '未知类别',
+            'teacher_name': teacher_name or '未知教师',
+            'category_name': category_name or '未知类别',
             'evidence': ga.evidence,
             'review_comment': ga.review_comment,
             'members': members
@@ -959,7 +2040,8 @@ def api_update_group_application(gid):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
             filename = timestamp + filename
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
+            with metrics.timer('dyf_upload_duration_seconds', kind='evidence'):
+                file.save(file_path)
             ga.evidence = filename
     if title:
         ga.title = title
@@ -970,43 +2052,100 @@ def api_update_group_application(gid):
     if category_id is not None:
         ga.category_id = category_id
 
-    # 可选：若上传了新成员名单，覆盖原有明细
-    if 'members' in request.files:
+    # 可选：若上传了新成员名单（或带已暂存名单的 roster_token），按差异更新成员
+    roster_token = request.form.get('roster_token')
+    member_changes = None
+    if roster_token:
+        if find_roster_upload(roster_token, teacher_user_id) is None:
+            db.session.rollback()
+            return jsonify({'message': '成员名单已过期或不存在，请重新上传'}), 400
+    elif 'members' in request.files:
         members_file = request.files['members']
+        file_extension = os.path.splitext(members_file.filename)[1].lower()
         try:
-            df = pd.read_excel(members_file)
+            with metrics.timer('dyf_upload_duration_seconds', kind='roster'):
+                roster_token = stage_roster(members_file, file_extension, teacher_user_id)
+        except rosters.RosterError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
         except Exception as e:
+            db.session.rollback()
             return jsonify({'message': f'成员名单解析失败: {str(e)}'}), 400
-        required_cols = ['学号', '姓名', '分值']
-        
-        # 检查必需列
-        for col in required_cols:
-            if col not in df.columns:
-                return jsonify({'message': f'成员名单缺少必需列: {col}'}), 400
-        # 清空旧明细
-        GroupApplicationMember.query.filter_by(group_application_id=ga.id).delete()
-        added = 0
-        for _, row in df.iterrows():
-            try:
-                student_id = str(row['学号']).strip()
-                score_val = int(row['分值'])
-                user = User.query.filter_by(student_id=student_id, role='student').first()
-                if not user:
-                    continue
-                member = GroupApplicationMember(
-                    group_application_id=ga.id,
-                    student_user_id=user.id,
-                    score=score_val
-                )
-                db.session.add(member)
-                added += 1
-            except Exception:
-                continue
-        if added == 0:
+    if roster_token:
+        duplicates_in_file = [row.student_id for row in roster_errors(roster_token, 'duplicate', limit=3)]
+        if duplicates_in_file:
+            db.session.rollback()
+            return jsonify({'message': f'Excel文件中存在重复学号: {duplicates_in_file}，请检查并删除重复行后重新提交'}), 400
+        valid_count = db.session.execute(
+            db.select(db.func.count()).select_from(_valid_roster_rows(roster_token).subquery())
+        ).scalar()
+        if valid_count == 0:
+            db.session.rollback()
             return jsonify({'message': '成员名单为空或无有效成员'}), 400
+        member_changes = apply_roster_diff(roster_token, ga.id)
+
+    add_review_event('group_application', 'updated', ga.id)
+    db.session.commit()
+    result = {'message': '集体申请已更新'}
+    if member_changes is not None:
+        result['members'] = member_changes
+    return jsonify(result)
+
+@app.route('/api/group-applications/<int:gid>/members', methods=['PATCH'])
+@query_budget(7)
+def api_patch_group_application_members(gid):
+    """按学号修改少量成员，不必重新上传整份名单
+
+    请求体：{"upsert": [{"student_id": "...", "score": 2}, ...], "remove": ["学号", ...]}
+    upsert 中已在申请中的学生改分，不在的加入；remove 中的学生移出申请。
+    """
+    if 'user' not in session or session['user']['role'] != 'teacher':
+        return jsonify({'message': '需要教师权限'}), 403
+    ga = GroupApplication.query.get_or_404(gid)
+    if ga.teacher_user_id != session['user']['id']:
+        return jsonify({'message': '无权修改他人申请'}), 403
+    if ga.status == 'approved':
+        return jsonify({'message': '审核通过后不可修改'}), 400
 
+    data = request.get_json(silent=True) or {}
+    upsert = data.get('upsert') or []
+    remove = data.get('remove') or []
+    if not isinstance(upsert, list) or not isinstance(remove, list) or not (upsert or remove):
+        return jsonify({'message': '请求数据为空'}), 400
+    scores = {}
+    for item in upsert:
+        score = rosters.parse_score(item.get('score')) if isinstance(item, dict) else None
+        if score is None:
+            return jsonify({'message': f'分值无效: {item}'}), 400
+        scores[str(item.get('student_id', '')).strip()] = score
+    remove = {str(student_id).strip() for student_id in remove}
+    if scores.keys() & remove:
+        return jsonify({'message': f'学号不能同时修改和移除: {sorted(scores.keys() & remove)[:3]}'}), 400
+
+    user_ids = dict(db.session.query(User.student_id, User.id).filter(
+        User.student_id.in_(scores.keys() | remove), User.role == 'student').all())
+    unknown = sorted((scores.keys() | remove) - user_ids.keys())
+    if unknown:
+        return jsonify({'message': '学号不存在', 'unknown': unknown}), 400
+
+    removed = 0
+    if scores:
+        statement = sqlite_insert(GroupApplicationMember)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['group_application_id', 'student_user_id'],
+            set_={'score': statement.excluded.score}
+        ), [
+            {'group_application_id': ga.id, 'student_user_id': user_ids[student_id], 'score': score}
+            for student_id, score in scores.items()
+        ])
+    if remove:
+        removed = GroupApplicationMember.query.filter(
+            GroupApplicationMember.group_application_id == ga.id,
+            GroupApplicationMember.student_user_id.in_([user_ids[student_id] for student_id in remove])
+        ).delete(synchronize_session=False)
+    add_review_event('group_application', 'updated', ga.id)
     db.session.commit()
-    return jsonify({'message': '集体申请已更新'})
+    return jsonify({'message': '成员已更新', 'upserted': len(scores), 'removed': removed})
 
 @app.route('/api/group-applications/<int:gid>/withdraw', methods=['POST'])
 def api_withdraw_group_application(gid):
@@ -1019,17 +2158,18 @@ def api_withdraw_group_application(gid):
     if ga.status == 'approved':
         return jsonify({'message': '审核通过后不可撤回'}), 400
     ga.status = 'withdrawn'
+    add_review_event('group_application', 'withdrawn', ga.id)
     db.session.commit()
     return jsonify({'message': '集体申请已撤回'})
 
 @app.route('/api/group-applications/<int:gid>/review', methods=['PUT'])
+@query_budget(6)
 def api_review_group_application(gid):
     try:
-        print(f"审核集体申请 {gid}，用户: {session.get('user', {}).get('name', '未知')}")
         if 'user' not in session or session['user']['role'] != 'admin':
             return jsonify({'message': '需要管理员权限'}), 403
         data = request.get_json()
-        print(f"请求数据: {data}")
+        review_logger.info('审核集体申请', extra={'group_application_id': gid, 'status': (data or {}).get('status')})
         if not data:
             return jsonify({'message': '请求数据为空'}), 400
         status = data.get('status')
@@ -1045,41 +2185,274 @@ def api_review_group_application(gid):
         ga.reviewed_at = datetime.utcnow()
 
         if status == 'approved':
-            # 去重校验：任一成员存在相同user、category、academic_year记录则整单拒绝
-            conflicts = []
-            for m in ga.members:
-                exist = ScoreRecord.query.filter_by(
-                    user_id=m.student_user_id,
-                    category_id=ga.category_id,
-                    academic_year=ga.academic_year
-                ).first()
-                if exist:
-                    student = User.query.get(m.student_user_id)
-                    conflicts.append({'student_id': student.student_id, 'name': student.name})
-            if conflicts:
-                db.session.rollback()
-                return jsonify({'message': '存在重复记录，无法通过', 'conflicts': conflicts}), 400
-            # 批量落库
-            for m in ga.members:
-                rec = ScoreRecord(
-                    user_id=m.student_user_id,
-                    category_id=ga.category_id,
-                    score=m.score,
-                    source='集体申请',
-                    description=ga.title,
-                    academic_year=ga.academic_year,
-                    group_application_id=ga.id
-                )
-                db.session.add(rec)
-
+            if ga.academic_year in archived_years():
+                return jsonify({'message': '该学年已归档，不能再写入德育分'}), 400
+            if ga.academic_year in ranking_snapshots():
+                return jsonify({'message': '该学年排名已冻结，不能再写入德育分'}), 400
+            members = db.session.query(
+                GroupApplicationMember.student_user_id, GroupApplicationMember.score, User.student_id, User.name
+            ).join(
+                User, User.id == GroupApplicationMember.student_user_id
+            ).filter(GroupApplicationMember.group_application_id == ga.id).all()
+            if members:
+                # 批量落库，已有相同 user、category、academic_year 记录的成员被唯一索引跳过
+                now = datetime.utcnow()
+                inserted = db.session.execute(score_record_insert().returning(ScoreRecord.user_id), [
+                    {
+                        'user_id': student_user_id,
+                        'category_id': ga.category_id,
+                        'score': score,
+                        'source': '集体申请',
+                        'description': ga.title,
+                        'academic_year': ga.academic_year,
+                        'created_at': now,
+                        'group_application_id': ga.id
+                    }
+                    for student_user_id, score, _, _ in members
+                ]).scalars().all()
+                # 任一成员冲突则整单拒绝
+                if len(inserted) < len(members):
+                    db.session.rollback()
+                    inserted = set(inserted)
+                    conflicts = [
+                        {'student_id': sid, 'name': name}
+                        for student_user_id, _, sid, name in members if student_user_id not in inserted
+                    ]
+                    return jsonify({'message': '存在重复记录，无法通过', 'conflicts': conflicts}), 400
+
+        add_review_event('group_application', 'reviewed', ga.id)
         db.session.commit()
-        print(f"集体申请 {gid} 审核成功，状态: {status}")
+        review_logger.info('集体申请审核完成', extra={'group_application_id': gid, 'status': status})
         return jsonify({'message': '审核完成'})
     except Exception as e:
         db.session.rollback()
-        print(f"审核集体申请 {gid} 失败: {str(e)}")
+        review_logger.exception('审核集体申请失败', extra={'group_application_id': gid})
         return jsonify({'message': f'审核失败: {str(e)}'}), 500
 
+@app.route('/api/review-events', methods=['GET'])
+@query_budget(1)
+def api_review_events():
+    """审核队列事件流（text/event-stream），断线重连时按 Last-Event-ID 续传"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        # 新连接从当前最新的事件之后开始
+        last_id = db.session.query(db.func.coalesce(db.func.max(ReviewEvent.id), 0)).scalar()
+    db.session.close()
+
+    return Response(
+        stream_with_context(review_events.stream(fetch_review_events, last_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# 审核队列每页条数
+REVIEW_QUEUE_PAGE_SIZE = 50
+REVIEW_QUEUE_MAX_PAGE_SIZE = 200
+
+def _encode_queue_cursor(row):
+    raw = json.dumps([row.created_at.isoformat(), row.kind, row.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_queue_cursor(cursor):
+    created_at, kind, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(created_at), str(kind), int(item_id)
+
+def _application_queue_select(Application):
+    """审核队列和搜索中个人申请一路的公共投影，Application 为某个库中的个人申请表（见 schema_model）"""
+    return db.select(
+        db.literal('application').label('kind'),
+        Application.id, Application.title, Application.status, Application.created_at,
+        Application.academic_year, ScoreCategory.name.label('category_name'),
+        User.name.label('submitter_name'), User.student_id, User.class_name,
+        Application.score, db.null().label('member_count')
+    ).join(User, User.id == Application.user_id
+    ).outerjoin(ScoreCategory, ScoreCategory.id == Application.category_id)
+
+def _group_queue_select(Group, Member):
+    """审核队列和搜索中集体申请一路的公共投影，Group、Member 为同一个库中的集体申请及成员表"""
+    teacher = db.aliased(User)
+    member_count = db.select(db.func.count(Member.id)).where(
+        Member.group_application_id == Group.id
+    ).scalar_subquery()
+    return db.select(
+        db.literal('group_application').label('kind'),
+        Group.id, Group.title, Group.status, Group.created_at,
+        Group.academic_year, ScoreCategory.name.label('category_name'),
+        teacher.name.label('submitter_name'), db.null().label('student_id'), db.null().label('class_name'),
+        db.null().label('score'), member_count.label('member_count')
+    ).join(teacher, teacher.id == Group.teacher_user_id
+    ).outerjoin(ScoreCategory, ScoreCategory.id == Group.category_id)
+
+def _queue_item(row):
+    return {
+        'kind': row.kind,
+        'id': row.id,
+        'title': row.title,
+        'status': row.status,
+        'created_at': row.created_at.isoformat(),
+        'academic_year': row.academic_year,
+        'category_name': row.category_name,
+        'submitter_name': row.submitter_name,
+        'student_id': row.student_id,
+        'class_name': row.class_name,
+        'score': row.score,
+        'member_count': row.member_count
+    }
+
+def _pending_counts():
+    counts = db.session.execute(db.select(
+        db.select(db.func.count()).where(ScoreApplication.status == 'pending').scalar_subquery(),
+        db.select(db.func.count()).where(GroupApplication.status == 'pending').scalar_subquery()
+    )).one()
+    return {'application': counts[0], 'group_application': counts[1]}
+
+def _review_queue_branch(kind, model, query, status, academic_year, cursor, limit):
+    """审核队列的一路：按 (created_at, id) 倒序取不超过 limit 条，分页条件在各自的索引上执行"""
+    if status:
+        query = query.where(model.status == status)
+    if academic_year:
+        query = query.where(model.academic_year == academic_year)
+    if cursor:
+        created_at, cursor_kind, cursor_id = cursor
+        # 排序为 (created_at, kind, id) 倒序，kind 在本路中是常量
+        if kind < cursor_kind:
+            query = query.where(model.created_at <= created_at)
+        elif kind == cursor_kind:
+            query = query.where(db.tuple_(model.created_at, model.id) < db.tuple_(created_at, cursor_id))
+        else:
+            query = query.where(model.created_at < created_at)
+    query = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit).subquery()
+    return db.select(query).select_from(query)
+
+@app.route('/api/review-queue', methods=['GET'])
+# 另加归档学年缓存失效时的一条
+@query_budget(3)
+def api_review_queue():
+    """统一审核队列：个人申请与集体申请在 SQL 中合并，按提交时间倒序、游标分页
+
+    参数：status（默认 pending，all 表示全部）、academic_year、limit、cursor（上一页返回的 next_cursor）
+    """
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    status = request.args.get('status', 'pending')
+    if status == 'all':
+        status = None
+    academic_year = request.args.get('academic_year')
+    try:
+        limit = min(max(int(request.args.get('limit', REVIEW_QUEUE_PAGE_SIZE)), 1), REVIEW_QUEUE_MAX_PAGE_SIZE)
+        cursor = _decode_queue_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (TypeError, ValueError):
+        return jsonify({'message': '分页参数无效'}), 400
+
+    # 各路使用相同的投影；多取一条用于判断是否还有下一页。
+    # 已归档学年的申请在归档库中另成两路；归档时不允许有待审核申请，待审核队列只查主库
+    branches = []
+    for schema in [HOT_SCHEMA] if status == 'pending' else score_schemas(academic_year):
+        Application = schema_model(ScoreApplication, schema)
+        Group = schema_model(GroupApplication, schema)
+        branches.append(_review_queue_branch('application', Application, _application_queue_select(Application),
+                                             status, academic_year, cursor, limit + 1))
+        branches.append(_review_queue_branch(
+            'group_application', Group, _group_queue_select(Group, schema_model(GroupApplicationMember, schema)),
+            status, academic_year, cursor, limit + 1))
+    queue = db.union_all(*branches).subquery()
+    rows = db.session.execute(
+        db.select(queue).order_by(queue.c.created_at.desc(), queue.c.kind.desc(), queue.c.id.desc()).limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'items': [_queue_item(row) for row in rows],
+        'next_cursor': _encode_queue_cursor(rows[-1]) if has_more else None,
+        'pending_counts': _pending_counts()
+    })
+
+# 搜索结果每页条数
+SEARCH_PAGE_SIZE = 20
+
+def _search_branch(query, model, schema, index, keywords, use_match, status, academic_year, college_filter):
+    """搜索的一路：连接 schema 库中的全文索引并加上筛选条件"""
+    fts = search_index.search_table(index, schema)
+    query = query.join(fts, fts.c.rowid == model.id)
+    if use_match:
+        query = query.where(search_index.match_clause(index, keywords)).add_columns(
+            search_index.rank_column(index).label('rank'))
+    else:
+        # 关键词太短，trigram 无法匹配，逐个关键词在标题或说明中做子串匹配
+        for keyword in keywords:
+            pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.where(db.or_(fts.c.title.like(pattern, escape='\\'),
+                                       fts.c.description.like(pattern, escape='\\')))
+        query = query.add_columns(db.literal(0.0).label('rank'))
+    if status:
+        query = query.where(model.status == status)
+    if academic_year:
+        query = query.where(model.academic_year == academic_year)
+    if college_filter is not None:
+        query = query.where(college_filter)
+    return query
+
+@app.route('/api/applications/search', methods=['GET'])
+# 另加归档学年缓存失效时的一条
+@query_budget(2)
+def api_search_applications():
+    """按标题和说明全文搜索个人申请与集体申请，按相关度排序、分页
+
+    参数：q（关键词，空格分隔，全部匹配）、status、academic_year、college、page、per_page
+    集体申请按成员所在书院筛选。
+    """
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    keywords, use_match = search_index.split_keywords(request.args.get('q', ''))
+    if not keywords:
+        return jsonify({'message': '请输入搜索关键词'}), 400
+    status = request.args.get('status')
+    academic_year = request.args.get('academic_year')
+    college = request.args.get('college')
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', SEARCH_PAGE_SIZE)), 1), REVIEW_QUEUE_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'message': '分页参数无效'}), 400
+
+    # 主库和归档库各有一套索引，已归档学年的申请在归档库中另成两路
+    branches = []
+    for schema in score_schemas(academic_year):
+        Application = schema_model(ScoreApplication, schema)
+        Group, Member = schema_model(GroupApplication, schema), schema_model(GroupApplicationMember, schema)
+        branches.append(_search_branch(
+            _application_queue_select(Application), Application, schema, 'application_search', keywords, use_match,
+            status, academic_year, User.college == college if college else None))
+        member_in_college = db.exists().where(
+            Member.group_application_id == Group.id,
+            Member.student_user_id == User.id,
+            User.college == college
+        ) if college else None
+        branches.append(_search_branch(
+            _group_queue_select(Group, Member), Group, schema, 'group_application_search', keywords, use_match,
+            status, academic_year, member_in_college))
+    results = db.union_all(*branches).subquery()
+    rows = db.session.execute(
+        db.select(results)
+        .order_by(results.c.rank, results.c.created_at.desc(), results.c.kind, results.c.id.desc())
+        .limit(per_page + 1).offset((page - 1) * per_page)
+    ).all()
+
+    return jsonify({
+        'items': [dict(_queue_item(row), rank=row.rank) for row in rows[:per_page]],
+        'page': page,
+        'per_page': per_page,
+        'has_more': len(rows) > per_page
+    })
+
 @app.route('/api/statistics', methods=['GET'])
 def api_get_statistics():
     if 'user' not in session or session['user']['role'] != 'admin':
@@ -1089,12 +2462,12 @@ def api_get_statistics():
     current_year = AcademicYear.query.filter_by(is_current=True).first()
     default_academic_year = current_year.year_name if current_year else None
     
-    # 统计个人申请
-    total_individual_applications = ScoreApplication.query.count()
+    # 统计个人申请（总数包括已归档学年，待审核的只在主库）
+    total_individual_applications = db.session.query(score_entity(ScoreApplication)).count()
     pending_individual_applications = ScoreApplication.query.filter_by(status='pending').count()
     
     # 统计集体申请
-    total_group_applications = GroupApplication.query.count()
+    total_group_applications = db.session.query(score_entity(GroupApplication)).count()
     pending_group_applications = GroupApplication.query.filter_by(status='pending').count()
     
     # 总申请数 = 个人申请 + 集体申请
@@ -1109,13 +2482,14 @@ def api_get_statistics():
         'totalGroupApplications': total_group_applications,
         'pendingIndividualApplications': pending_individual_applications,
         'pendingGroupApplications': pending_group_applications,
-        'totalScores': db.session.query(db.func.sum(ScoreRecord.score)).scalar() or 0,
+        'totalScores': db.session.query(db.func.sum(score_entity(ScoreRecord).score)).scalar() or 0,
         'defaultAcademicYear': default_academic_year
     }
     
     return jsonify(stats)
 
 @app.route('/api/scores/my', methods=['GET'])
+@query_budget(4)
 def api_get_my_scores():
     if 'user' not in session:
         return jsonify({'error': '未登录'}), 401
@@ -1126,40 +2500,46 @@ def api_get_my_scores():
     # 过滤参数：academic_year，如 2027-2028
     academic_year = request.args.get('academic_year')
 
-    # 获取所有德育分记录，包括学生端和教师端可申请的类别
-    query = db.session.query(ScoreRecord, ScoreCategory).join(
-        ScoreCategory, ScoreRecord.category_id == ScoreCategory.id
-    ).filter(ScoreRecord.user_id == user_id)
-
     if academic_year:
-        query = query.filter(ScoreRecord.academic_year == academic_year)
+        rules_year = academic_year
+    else:
+        # 未指定学年时按当前学年的规则计算
+        current_year = AcademicYear.query.filter_by(is_current=True).first()
+        rules_year = current_year.year_name if current_year else None
 
-    scores = query.order_by(
-        ScoreRecord.created_at.desc()
-    ).all()
-    
-    result = []
-    total_score = 0
+    return jsonify(build_my_scores(user_id, academic_year, rules_year))
+
+def build_my_scores(user_id, academic_year, rules_year):
+    """学生的德育分记录及按 rules_year 学年规则计算的各主类别最终分数、总分"""
+    # 获取所有德育分记录，包括学生端和教师端可申请的类别；同时关联父类别，避免逐条查询
+    parent = db.aliased(ScoreCategory)
+
+    def build(Record):
+        query = db.session.query(Record, ScoreCategory, parent.name).join(
+            ScoreCategory, Record.category_id == ScoreCategory.id
+        ).outerjoin(
+            parent, ScoreCategory.parent_id == parent.id
+        ).filter(Record.user_id == user_id)
+        if academic_year:
+            query = query.filter(Record.academic_year == academic_year)
+        return query.order_by(Record.created_at.desc())
+
+    scores = query_score_records(build, academic_year)
     
     # 使用定义的类别常量
-    teacher_categories = TEACHER_MAIN_CATEGORIES
     student_categories = STUDENT_MAIN_CATEGORIES
+    rules = get_scoring_rules(rules_year)
     
-    # 按主类别分组统计，应用分数上限限制
+    # 按主类别分组，同时统计各主类别的原始总分
     category_scores = {}
+    original_scores = {}
     
-    for record, category in scores:
+    for record, category, parent_name in scores:
         # 获取主类别
-        if category.parent_id:
-            parent_category = ScoreCategory.query.get(category.parent_id)
-            main_category_name = parent_category.name
-        else:
-            main_category_name = category.name
-        
-        if main_category_name not in category_scores:
-            category_scores[main_category_name] = []
+        main_category_name = parent_name if category.parent_id else category.name
+        original_scores[main_category_name] = original_scores.get(main_category_name, 0) + record.score
         
-        category_scores[main_category_name].append({
+        category_scores.setdefault(main_category_name, []).append({
             'id': record.id,
             'score': record.score,
             'source': record.source,
@@ -1171,23 +2551,15 @@ def api_get_my_scores():
             'group_application_id': record.group_application_id
         })
     
-    # 应用特殊规则计算最终分数（项目类别层面限制）
-    final_scores = {}
+    # 应用计分规则计算最终分数（子类别上限、主类别上限、任职分取最高）
+    final_scores, total_score = scoring.score_records(
+        rules, [(record.category_id, record.score) for record, _, _ in scores])
     result = []
-    total_score = 0
     
     for main_category, records in category_scores.items():
-        # 计算该主类别的原始总分
-        total_category_score = sum([r['score'] for r in records])
-        
-        # 使用新函数计算最终分数（应用子类别限制，如工时最多1分）
-        final_score = calculate_category_score_with_subcategory(main_category, records)
-        
-        final_scores[main_category] = final_score
-        total_score += final_score
-        
-        # 获取上限
-        max_limit = CATEGORY_MAX_LIMITS.get(main_category, 100)
+        final_score = final_scores.get(main_category, 0)
+        total_category_score = original_scores[main_category]
+        max_limit = rules.cap_of(main_category)
         
         # 为每个记录添加计算后的分数和主类别信息
         for record in records:
@@ -1211,10 +2583,95 @@ def api_get_my_scores():
                 'is_limited': total_category_score > max_limit  # 是否达到上限
             })
     
-    # 设置总分最大值(100)和最小值(0)
-    total_score = max(0, min(100, total_score))
-    
-    return jsonify({'scores': result, 'totalScore': total_score, 'categoryScores': final_scores})
+    return {'scores': result, 'totalScore': total_score, 'categoryScores': final_scores}
+
+# 学生首页数据依赖的共享表，与学生自己的数据版本号一起组成 ETag；
+# 计分规则缓存按同样的 scoring_rule、score_category 版本戳重新加载，新 ETag 下不会返回按旧规则计算的分数
+DASHBOARD_TABLES = ('score_category', 'academic_year', 'scoring_rule', 'archived_year')
+
+@app.route('/api/dashboard', methods=['GET'])
+# 常态 4 条；类别树、计分规则和归档学年缓存失效时另加至多 4 条
+@query_budget(8)
+def api_get_dashboard():
+    """学生首页：类别树、个人申请、学年信息和德育分一次返回
+
+    参数 academic_year 默认当前学年。学生的记录、申请及共享表都未变化时返回 304。
+    """
+    if 'user' not in session:
+        return jsonify({'error': '未登录'}), 401
+    if session['user']['role'] != 'student':
+        return jsonify({'error': '仅学生可访问'}), 403
+
+    user_id = session['user']['id']
+    academic_year = request.args.get('academic_year')
+    versions = [student_versions.student_version(db.session, user_id)]
+    versions += [table_versions.version(name) for name in DASHBOARD_TABLES]
+    key = json.dumps([user_id, academic_year, versions])
+    etag = 'dashboard-' + hashlib.sha1(key.encode()).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        years = build_academic_years()
+        selected_year = academic_year or years['currentAcademicYear']
+        response = jsonify({
+            'academicYear': selected_year,
+            'academicYears': years,
+            'categories': category_tree('all'),
+            'applications': build_my_applications(user_id),
+            'scores': build_my_scores(user_id, selected_year, selected_year)
+        })
+    response.set_etag(etag)
+    # 内容因学生而异，只允许浏览器缓存，每次使用前向服务器确认
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/scores/transcript', methods=['GET'])
+# 有归档学年时多查一次归档库（另加归档学年缓存失效时的一条）
+@query_budget(6)
+def api_get_my_transcript():
+    """学生多学年成绩单：每学年主类别分数、总分及与上一学年的变化"""
+    if 'user' not in session:
+        return jsonify({'error': '未登录'}), 401
+    if session['user']['role'] != 'student':
+        return jsonify({'error': '仅学生可访问'}), 403
+
+    user = db.session.get(User, session['user']['id'])
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+    transcripts = build_transcripts([user.id])
+    return jsonify(_transcript_payload(user, transcripts[user.id]))
+
+@app.route('/api/admin/scores/transcripts', methods=['POST'])
+# 有归档学年时多查一次归档库（另加归档学年缓存失效时的一条）
+@query_budget(6)
+def api_admin_get_transcripts():
+    """管理员批量获取学生多学年成绩单，请求体: {"student_ids": ["学号", ...]}"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    data = request.get_json(silent=True) or {}
+    student_ids = data.get('student_ids')
+    if not isinstance(student_ids, list) or not student_ids:
+        return jsonify({'message': '请提供学号列表 student_ids'}), 400
+    student_ids = list(dict.fromkeys(str(sid).strip() for sid in student_ids))
+    if len(student_ids) > TRANSCRIPT_BATCH_LIMIT:
+        return jsonify({'message': f'单次最多查询 {TRANSCRIPT_BATCH_LIMIT} 名学生'}), 400
+
+    users = User.query.filter(User.role == 'student', User.student_id.in_(student_ids)).all()
+    users_by_student_id = {u.student_id: u for u in users}
+    transcripts = build_transcripts([u.id for u in users])
+
+    result = []
+    not_found = []
+    for sid in student_ids:
+        user = users_by_student_id.get(sid)
+        if user is None:
+            not_found.append(sid)
+            continue
+        result.append(_transcript_payload(user, transcripts[user.id]))
+    return jsonify({'transcripts': result, 'not_found': not_found})
 
 @app.route('/api/scores/my/export', methods=['GET'])
 def api_export_my_scores():
@@ -1223,14 +2680,15 @@ def api_export_my_scores():
     user_id = session['user']['id']
     academic_year = request.args.get('academic_year')
 
-    query = db.session.query(ScoreRecord, ScoreCategory).join(
-        ScoreCategory, ScoreRecord.category_id == ScoreCategory.id
-    ).filter(ScoreRecord.user_id == user_id)
-
-    if academic_year:
-        query = query.filter(ScoreRecord.academic_year == academic_year)
+    def build(Record):
+        query = db.session.query(Record, ScoreCategory).join(
+            ScoreCategory, Record.category_id == ScoreCategory.id
+        ).filter(Record.user_id == user_id)
+        if academic_year:
+            query = query.filter(Record.academic_year == academic_year)
+        return query.order_by(Record.created_at.desc())
 
-    rows = query.order_by(ScoreRecord.created_at.desc()).all()
+    rows = query_score_records(build, academic_year)
     data = []
     for r, cat in rows:
         data.append({
@@ -1241,11 +2699,10 @@ def api_export_my_scores():
             '学年': r.academic_year,
             '创建时间': r.created_at.strftime('%Y-%m-%d %H:%M:%S')
         })
-    df = pd.DataFrame(data)
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='我的德育分')
-    buf.seek(0)
+    # Excel 生成依赖 pandas，按需导入
+    import spreadsheets
+    with metrics.timer('dyf_export_duration_seconds', kind='my_scores_xlsx'):
+        buf = spreadsheets.to_xlsx(data, '我的德育分')
     filename = '我的德育分.xlsx' if not academic_year else f'我的德育分_{academic_year}.xlsx'
     return send_file(buf, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
@@ -1262,123 +2719,60 @@ def api_get_all_scores():
     grade = request.args.get('grade')      # 年级筛选
     class_name = request.args.get('class_name')  # 班级筛选
 
-    # 查询所有学生的德育分记录，需要应用项目类别上限
-    base = db.session.query(
-        User.id,
-        User.name,
-        User.student_id,
-        User.class_name,
-        User.college,
-        User.grade,
-        ScoreRecord.score,
-        ScoreRecord.academic_year,
-        ScoreCategory.name.label('category_name'),
-        ScoreCategory.parent_id
-    ).outerjoin(ScoreRecord, User.id == ScoreRecord.user_id).outerjoin(
-        ScoreCategory, ScoreRecord.category_id == ScoreCategory.id
-    ).filter(
-        User.role == 'student'
-    )
-
-    # 按学年筛选
-    if academic_year:
-        base = base.filter(ScoreRecord.academic_year == academic_year)
-    
-    # 按书院筛选
-    if college:
-        base = base.filter(User.college == college)
-    
-    # 按年级筛选
-    if grade:
-        base = base.filter(User.grade == grade)
-    
-    # 按班级筛选
-    if class_name:
-        base = base.filter(User.class_name == class_name)
-
-    # 获取所有记录
-    records = base.all()
-    
-    # 按学生分组，应用项目类别上限计算总分
-    student_scores = {}
-    
-    for record in records:
-        user_id = record.id
-        if user_id not in student_scores:
-            student_scores[user_id] = {
-                'name': record.name,
-                'student_id': record.student_id,
-                'class_name': record.class_name,
-                'college': record.college,
-                'grade': record.grade,
-                'category_scores': {},
-                'total_score': 0,
-                'record_count': 0
-            }
-        
-        if record.score is not None:
-            student_scores[user_id]['record_count'] += 1
-            
-            # 获取主类别
-            if record.parent_id:
-                parent_category = ScoreCategory.query.get(record.parent_id)
-                main_category_name = parent_category.name
-            else:
-                main_category_name = record.category_name
-            
-            if main_category_name not in student_scores[user_id]['category_scores']:
-                student_scores[user_id]['category_scores'][main_category_name] = []
-            
-            # 存储包含子类别信息的记录
-            student_scores[user_id]['category_scores'][main_category_name].append({
-                'score': record.score,
-                'category_name': record.category_name
-            })
-    
-    # 应用项目类别上限计算最终分数
-    result = []
-    for user_id, data in student_scores.items():
-        total_score = 0
-        
-        for main_category, records in data['category_scores'].items():
-            # 使用新函数计算最终分数（应用子类别限制，如工时最多1分）
-            final_score = calculate_category_score_with_subcategory(main_category, records)
-            total_score += final_score
-        
-        # 设置总分最大值(100)和最小值(0)
-        total_score = max(0, min(100, total_score))
-        
-        result.append({
-            'name': data['name'],
-            'student_id': data['student_id'],
-            'class_name': data['class_name'],
-            'college': data['college'],
-            'grade': data['grade'],
-            'total_score': total_score,
-            'record_count': data['record_count']
-        })
+    # 已冻结的学年直接读快照，附带各范围内的排名
+    snapshot_id = ranking_snapshots().get(academic_year)
+    if snapshot_id:
+        return stream_json({
+            'name': row.name,
+            'student_id': row.student_id,
+            'class_name': row.class_name,
+            'college': row.college,
+            'grade': row.grade,
+            'total_score': row.total_score,
+            'record_count': row.record_count,
+            'overall_rank': row.overall_rank,
+            'college_rank': row.college_rank,
+            'grade_rank': row.grade_rank,
+            'class_rank': row.class_rank
+        } for row in snapshot_rows(snapshot_id, college, grade, class_name))
+
+    # 排序需要全部总分，排序前每个学生只保留一个紧凑元组，排序后再逐个生成字典流式发送
+    ranked = []
+    for student, _, total_score, record_count in iter_student_scores(
+            academic_year, college, grade, class_name):
+        ranked.append((total_score, record_count, student.name, student.student_id,
+                       student.class_name, student.college, student.grade))
     
     # 按总分排序
-    result.sort(key=lambda x: x['total_score'], reverse=True)
-    
-    return jsonify(result)
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    
+    return stream_json({
+        'name': item[2],
+        'student_id': item[3],
+        'class_name': item[4],
+        'college': item[5],
+        'grade': item[6],
+        'total_score': item[0],
+        'record_count': item[1]
+    } for item in ranked)
 
 @app.route('/api/academic-years', methods=['GET'])
+@query_budget(2)
 def api_get_academic_years():
-    """获取学年信息"""
-    # 从数据库获取当前学年
-    current_year = AcademicYear.query.filter_by(is_current=True).first()
-    current_academic_year = current_year.year_name if current_year else None
-    
-    # 获取所有可用学年
+    """获取学年信息（带 ETag，学年未变化时返回 304）"""
+    return table_versions.json_response('academic-years', ('academic_year',), build_academic_years)
+
+def build_academic_years():
+    # 获取所有可用学年，当前学年从同一次查询中取出
     all_years = AcademicYear.query.order_by(AcademicYear.year_name.desc()).all()
     available_years = [year.year_name for year in all_years]
+    current_academic_year = next((year.year_name for year in all_years if year.is_current), None)
     
-    return jsonify({
+    return {
         'currentAcademicYear': current_academic_year,
         'availableYears': available_years,
         'academicYears': [{'year_name': year, 'is_current': year == current_academic_year} for year in available_years]
-    })
+    }
 
 @app.route('/api/admin/academic-years', methods=['GET'])
 def api_admin_get_academic_years():
@@ -1387,12 +2781,14 @@ def api_admin_get_academic_years():
         return jsonify({'message': '需要管理员权限'}), 403
     
     years = AcademicYear.query.order_by(AcademicYear.year_name.desc()).all()
+    snapshots = ranking_snapshots()
     result = []
     for year in years:
         result.append({
             'id': year.id,
             'year_name': year.year_name,
             'is_current': year.is_current,
+            'ranking_frozen': year.year_name in snapshots,
             'created_at': year.created_at.isoformat() if year.created_at else None
         })
     
@@ -1415,13 +2811,85 @@ def api_admin_add_academic_year():
     if existing_year:
         return jsonify({'message': '该学年已存在'}), 400
     
-    # 创建新学年
+    # 创建新学年，计分规则沿用最近一个学年
     new_year = AcademicYear(year_name=year_name)
     db.session.add(new_year)
+    ensure_year_rules(year_name)
     db.session.commit()
     
     return jsonify({'message': '学年添加成功', 'id': new_year.id})
 
+def _scoring_rules_payload(academic_year, rule_set):
+    names = {category_id: name for category_id, _, name in category_rows()}
+    rules = ScoringRule.query.filter_by(academic_year=academic_year, rule_set=rule_set).order_by(ScoringRule.category_id).all()
+    return {
+        'academic_year': academic_year,
+        'rule_set': rule_set,
+        'rules': [{
+            'category_id': rule.category_id,
+            'category_name': names.get(rule.category_id),
+            'max_score': rule.max_score,
+            'mode': rule.mode,
+            'subcategory_caps': [
+                {'category_id': int(k), 'category_name': names.get(int(k)), 'max_score': v}
+                for k, v in json.loads(rule.subcategory_caps).items()
+            ]
+        } for rule in rules]
+    }
+
+@app.route('/api/admin/scoring-rules', methods=['GET'])
+def api_admin_get_scoring_rules():
+    """管理员查看学年计分规则，参数 academic_year、rule_set（默认 default）"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+    academic_year = request.args.get('academic_year')
+    if not academic_year:
+        return jsonify({'message': '请指定学年'}), 400
+    return jsonify(_scoring_rules_payload(academic_year, request.args.get('rule_set', DEFAULT_RULE_SET)))
+
+@app.route('/api/admin/scoring-rules', methods=['PUT'])
+def api_admin_update_scoring_rules():
+    """管理员整体替换学年计分规则
+
+    请求体: {"academic_year", "rule_set", "rules": [{"category_id", "max_score", "mode", "subcategory_caps": [{"category_id", "max_score"}]}]}
+    """
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+    data = request.get_json(silent=True) or {}
+    academic_year = data.get('academic_year')
+    rule_set = data.get('rule_set') or DEFAULT_RULE_SET
+    if not academic_year or not isinstance(data.get('rules'), list):
+        return jsonify({'message': '请提供学年和规则列表'}), 400
+
+    parents = {category_id: parent_id for category_id, parent_id, _ in category_rows()}
+    rules = []
+    seen = set()
+    try:
+        for item in data['rules']:
+            category_id = int(item['category_id'])
+            if category_id not in parents or parents[category_id] is not None:
+                return jsonify({'message': f'类别 {category_id} 不是主类别'}), 400
+            if category_id in seen:
+                return jsonify({'message': f'类别 {category_id} 重复'}), 400
+            seen.add(category_id)
+            mode = item.get('mode', scoring.MODE_SUM)
+            if mode not in scoring.SCORE_MODES:
+                return jsonify({'message': f'不支持的计分方式: {mode}'}), 400
+            subcategory_caps = {}
+            for sub in item.get('subcategory_caps', []):
+                sub_id = int(sub['category_id'])
+                if parents.get(sub_id) != category_id:
+                    return jsonify({'message': f'类别 {sub_id} 不是类别 {category_id} 的子类别'}), 400
+                subcategory_caps[sub_id] = int(sub['max_score'])
+            rules.append((category_id, int(item['max_score']), mode, subcategory_caps))
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': '规则格式错误'}), 400
+
+    save_scoring_rules(academic_year, rule_set, rules)
+    db.session.commit()
+    logger.info('计分规则已更新', extra={'academic_year': academic_year, 'rule_set': rule_set})
+    return jsonify(_scoring_rules_payload(academic_year, rule_set))
+
 @app.route('/api/admin/academic-years/<int:year_id>/set-current', methods=['POST'])
 def api_admin_set_current_year(year_id):
     """管理员设置当前学年"""
@@ -1451,6 +2919,11 @@ def api_admin_delete_academic_year(year_id):
     if not year:
         return jsonify({'message': '学年不存在'}), 404
     
+    if year.year_name in archived_years():
+        return jsonify({'message': '该学年已归档，无法删除'}), 400
+    if year.year_name in ranking_snapshots():
+        return jsonify({'message': '该学年排名已冻结，无法删除'}), 400
+
     # 检查是否有申请或记录使用该学年
     has_applications = ScoreApplication.query.filter_by(academic_year=year.year_name).first()
     has_records = ScoreRecord.query.filter_by(academic_year=year.year_name).first()
@@ -1463,6 +2936,39 @@ def api_admin_delete_academic_year(year_id):
     
     return jsonify({'message': '学年删除成功'})
 
+@app.route('/api/admin/academic-years/<int:year_id>/ranking-snapshot', methods=['POST'])
+def api_admin_freeze_ranking(year_id):
+    """管理员冻结学年最终排名；之后该学年的排名和导出直接读快照，也不能再写入德育分"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    year = AcademicYear.query.get(year_id)
+    if not year:
+        return jsonify({'message': '学年不存在'}), 404
+    if year.is_current:
+        return jsonify({'message': '不能冻结当前学年的排名'}), 400
+    if year.year_name in ranking_snapshots():
+        return jsonify({'message': '该学年排名已冻结'}), 400
+    pending = ScoreApplication.query.filter_by(academic_year=year.year_name, status='pending').count() \
+        + GroupApplication.query.filter_by(academic_year=year.year_name, status='pending').count()
+    if pending:
+        return jsonify({'message': f'该学年还有 {pending} 个待审核申请，请先处理'}), 400
+
+    snapshot = freeze_ranking(year.year_name, session['user']['id'])
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 并发的另一次冻结已先提交
+        db.session.rollback()
+        return jsonify({'message': '该学年排名已冻结'}), 400
+    logger.info('学年排名已冻结', extra={'academic_year': year.year_name, 'students': snapshot.student_count})
+    return jsonify({
+        'message': '排名已冻结',
+        'academic_year': snapshot.academic_year,
+        'student_count': snapshot.student_count,
+        'created_at': snapshot.created_at.isoformat()
+    })
+
 @app.route('/api/statistics/filters', methods=['GET'])
 def api_get_statistics_filters():
     """获取统计筛选选项"""
@@ -1515,132 +3021,183 @@ def api_export_all_scores():
     college = request.args.get('college')
     grade = request.args.get('grade')
     class_name = request.args.get('class_name')
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f'不支持的导出格式: {export_format}'}), 400
+
+    basename = '集体德育分汇总' if not academic_year else f'集体德育分汇总_{academic_year}'
+    snapshot_id = ranking_snapshots().get(academic_year)
+    if snapshot_id:
+        rows = iter_snapshot_export_rows(snapshot_id, college, grade, class_name)
+    else:
+        rows = iter_ranked_export_rows(academic_year, college, grade, class_name)
 
-    # 使用与排行榜相同的逻辑，应用项目类别上限
-    base = db.session.query(
-        User.id,
-        User.name,
-        User.student_id,
-        User.class_name,
-        User.college,
-        User.grade,
-        ScoreRecord.score,
-        ScoreRecord.academic_year,
-        ScoreCategory.name.label('category_name'),
-        ScoreCategory.parent_id
-    ).outerjoin(ScoreRecord, User.id == ScoreRecord.user_id).outerjoin(
-        ScoreCategory, ScoreRecord.category_id == ScoreCategory.id
-    ).filter(
-        User.role == 'student'
-    )
+    if export_format in ('csv', 'jsonl'):
+        # 平面格式边计算边发送，不经过 pandas
+        return stream_export(rows, export_format, basename)
 
-    if academic_year:
-        base = base.filter(ScoreRecord.academic_year == academic_year)
-    
-    if college:
-        base = base.filter(User.college == college)
-    
-    if grade:
-        base = base.filter(User.grade == grade)
-    
-    if class_name:
-        base = base.filter(User.class_name == class_name)
-
-    records = base.all()
-    
-    # 按学生分组，应用项目类别上限计算总分
-    student_scores = {}
-    
-    for record in records:
-        user_id = record.id
-        if user_id not in student_scores:
-            student_scores[user_id] = {
-                'name': record.name,
-                'student_id': record.student_id,
-                'class_name': record.class_name,
-                'college': record.college or '',
-                'grade': record.grade or '',
-                'category_scores': {},
-                'total_score': 0,
-                'record_count': 0
-            }
-        
-        if record.score is not None:
-            student_scores[user_id]['record_count'] += 1
-            
-            # 获取主类别
-            if record.parent_id:
-                parent_category = ScoreCategory.query.get(record.parent_id)
-                main_category_name = parent_category.name
-            else:
-                main_category_name = record.category_name
-            
-            if main_category_name not in student_scores[user_id]['category_scores']:
-                student_scores[user_id]['category_scores'][main_category_name] = []
-            
-            # 存储包含子类别信息的记录
-            student_scores[user_id]['category_scores'][main_category_name].append({
-                'score': record.score,
-                'category_name': record.category_name
-            })
-    
-    # 使用定义的所有类别常量
-    all_categories = ALL_MAIN_CATEGORIES
-    
-    # 应用项目类别上限计算最终分数
-    data = []
-    for user_id, data_item in student_scores.items():
-        category_scores = {}
-        total_score = 0
-        
-        for main_category, records in data_item['category_scores'].items():
-            # 使用新函数计算最终分数（应用子类别限制，如工时最多1分）
-            final_score = calculate_category_score_with_subcategory(main_category, records)
-            category_scores[main_category] = final_score
-            total_score += final_score
-        
-        # 设置总分最大值(100)和最小值(0)
-        total_score = max(0, min(100, total_score))
-        
-        # 为每个类别设置默认值0（如果没有记录）
-        for category in all_categories:
-            if category not in category_scores:
-                category_scores[category] = 0
-        
-        data.append({
-            '排名': 0,  # 稍后计算
-            '姓名': data_item['name'],
-            '学号': data_item['student_id'],
-            '班级': data_item['class_name'],
-            '书院': data_item['college'],
-            '年级': data_item['grade'],
-            '基准分': 70,
-            '思想政治理论分': category_scores.get('思想政治理论分', 0),
-            '社会服务分': category_scores.get('社会服务分', 0),
-            '集体活动分': category_scores.get('集体活动分', 0),
-            '学术科研分': category_scores.get('学术科研分', 0),
-            '文体竞赛分': category_scores.get('文体竞赛分', 0),
-            '奖励分': category_scores.get('奖励分', 0),
-            '任职分': category_scores.get('任职分', 0),
-            '扣分': category_scores.get('扣分', 0),
-            '总分': total_score
-        })
-    
-    # 按总分排序并计算排名
-    data.sort(key=lambda x: x['总分'], reverse=True)
-    for i, item in enumerate(data):
-        item['排名'] = i + 1
-    
-    df = pd.DataFrame(data)
-    buf = io.BytesIO()
-    with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='集体德育分汇总')
-    buf.seek(0)
-    filename = '集体德育分汇总.xlsx' if not academic_year else f'集体德育分汇总_{academic_year}.xlsx'
+    # Excel 生成依赖 pandas，按需导入
+    import spreadsheets
+    with metrics.timer('dyf_export_duration_seconds', kind='all_scores_xlsx'):
+        buf = spreadsheets.to_xlsx(list(rows), '集体德育分汇总')
+    filename = f'{basename}.xlsx'
     return send_file(buf, as_attachment=True, download_name=filename, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
+# ==================== 分班打包导出 ====================
+# 打包方式：class 为每个班级一个工作簿，college 为每个书院一个工作簿、每个班级一个工作表
+EXPORT_BUNDLE_MODES = ('class', 'college')
+
+_export_pool = None
+_export_pool_lock = threading.Lock()
+
+def export_pool():
+    """本进程的 Excel 生成进程池，首次使用时创建
+
+    worker 进程是多线程的，fork 可能复制其他线程持有的锁（如日志队列），因此用 spawn 启动子进程；
+    任务函数在 spreadsheets 中，不需要应用上下文；子进程常驻，pandas 在每个子进程中只加载一次。
+    """
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is None:
+            _export_pool = ProcessPoolExecutor(
+                max_workers=app.config['EXPORT_BUNDLE_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _export_pool
+
+def discard_export_pool(pool):
+    """丢弃已损坏的进程池（子进程异常退出后不可再提交任务），下次 export_pool() 时重新创建"""
+    global _export_pool
+    with _export_pool_lock:
+        if _export_pool is pool:
+            _export_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def partition_export_rows(rows, mode, ties):
+    """把按总分降序的导出行分到各工作簿和工作表，排名改为班级内排名
+
+    Returns:
+        [(工作簿文件名, [(工作表名称, 行列表), ...]), ...]
+    """
+    classes = {}
+    for row in rows:
+        key = (row['书院'] or '未设置书院', row['年级'] or '未设置年级', row['班级'] or '未设置班级')
+        classes.setdefault(key, []).append(row)
+
+    def safe(name):
+        # 文件名中的路径分隔符会在 zip 中产生多余的目录
+        return name.replace('/', '_').replace('\\', '_')
+
+    workbooks = {}
+    for (college, grade, class_name), members in sorted(classes.items()):
+        # 与单独导出一个班级时的排名一致：快照同分同名次，实时计算按顺序编号
+        rank, previous = 0, None
+        for position, row in enumerate(members, 1):
+            if not ties or row['总分'] != previous:
+                rank, previous = position, row['总分']
+            row['排名'] = rank
+        if mode == 'class':
+            workbooks[f'{safe(college)}/{safe(grade)}_{safe(class_name)}.xlsx'] = [(class_name, members)]
+        else:
+            workbooks.setdefault(f'{safe(college)}.xlsx', []).append((f'{grade}_{class_name}', members))
+    return list(workbooks.items())
+
+class _ZipStream:
+    """只追加的写入缓冲区，zipfile 写完一个文件后取出已写入的字节发送"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_workbook_zip(workbooks):
+    """在进程池中并行生成各工作簿，按完成顺序写入 zip 并逐个发送"""
+    import spreadsheets
+
+    pool = export_pool()
+    limit = app.config['EXPORT_BUNDLE_WORKERS'] * 2
+    stream = _ZipStream()
+    # queued 为待提交的 (文件名, 工作表)，pending 为已提交未写入的任务
+    queued, pending = [], {}
+    retried = False
+    with metrics.timer('dyf_export_duration_seconds', kind='bundle_xlsx'):
+        # xlsx 本身已压缩，zip 中直接存储
+        with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+            workbooks = iter(workbooks)
+            while True:
+                # 控制在途任务数量，已生成未发送的工作簿不会堆积在内存中
+                queued.extend(itertools.islice(workbooks, limit - len(pending) - len(queued)))
+                try:
+                    while queued:
+                        future = pool.submit(spreadsheets.render_workbook, queued[0][1], EXPORT_COLUMNS)
+                        pending[future] = queued.pop(0)
+                    if not pending:
+                        break
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        content = future.result()
+                        archive.writestr(pending.pop(future)[0], content)
+                except BrokenProcessPool:
+                    # 子进程异常退出（如被 OOM 终止）后整个进程池失效：换新进程池，
+                    # 尚未写入 zip 的工作簿重新生成，只重试一次
+                    discard_export_pool(pool)
+                    if retried:
+                        raise
+                    retried = True
+                    queued[:0] = pending.values()
+                    pending.clear()
+                    pool = export_pool()
+                yield stream.take()
+        yield stream.take()
+
+@app.route('/api/scores/export-bundle', methods=['GET'])
+def api_export_score_bundle():
+    """按班级（或书院）拆分的排行榜 Excel 打包为 zip；各工作簿在进程池中并行生成"""
+    if 'user' not in session or session['user']['role'] != 'admin':
+        return jsonify({'message': '需要管理员权限'}), 403
+
+    academic_year = request.args.get('academic_year')
+    college = request.args.get('college')
+    grade = request.args.get('grade')
+    mode = request.args.get('by', 'class')
+    if mode not in EXPORT_BUNDLE_MODES:
+        return jsonify({'message': f'不支持的打包方式: {mode}'}), 400
+
+    snapshot_id = ranking_snapshots().get(academic_year)
+    if snapshot_id:
+        rows = iter_snapshot_export_rows(snapshot_id, college, grade)
+    else:
+        rows = iter_ranked_export_rows(academic_year, college, grade)
+    # 读库和计分在请求中完成，子进程只负责生成 Excel
+    workbooks = partition_export_rows(rows, mode, ties=bool(snapshot_id))
+    if not workbooks:
+        return jsonify({'message': '没有可导出的学生'}), 404
+
+    basename = '分班德育分' if mode == 'class' else '分书院德育分'
+    filename = f'{basename}_{academic_year}.zip' if academic_year else f'{basename}.zip'
+    return Response(
+        stream_with_context(stream_workbook_zip(workbooks)),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(filename)}"}
+    )
+
 @app.route('/api/announcements', methods=['GET'])
+@query_budget(1)
 def api_get_announcements():
+    """公告列表（带 ETag，公告和发布人未变化时返回 304）"""
+    return table_versions.json_response('announcements', ('announcement', 'user'), build_announcements)
+
+def build_announcements():
     announcements = db.session.query(Announcement, User).join(
         User, Announcement.author_id == User.id
     ).order_by(Announcement.created_at.desc()).all()
@@ -1655,7 +3212,7 @@ def api_get_announcements():
             'author_name': author.name
         })
     
-    return jsonify(result)
+    return result
 
 @app.route('/api/announcements', methods=['POST'])
 def api_create_announcement():
@@ -1683,7 +3240,7 @@ def api_create_announcement():
     
     except Exception as e:
         db.session.rollback()
-        print(f"创建公告错误: {e}")
+        logger.exception('创建公告失败')
         return jsonify({'message': f'创建公告失败: {str(e)}'}), 500
 
 @app.route('/api/announcements/<int:announcement_id>', methods=['PUT'])
@@ -1708,7 +3265,7 @@ def api_update_announcement(announcement_id):
     
     except Exception as e:
         db.session.rollback()
-        print(f"更新公告错误: {e}")
+        logger.exception('更新公告失败', extra={'announcement_id': announcement_id})
         return jsonify({'message': f'更新公告失败: {str(e)}'}), 500
 
 @app.route('/api/announcements/<int:announcement_id>', methods=['DELETE'])
@@ -1754,6 +3311,27 @@ def api_change_password():
     
     return jsonify({'message': '密码修改成功'})
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """健康检查：供负载均衡和进程管理器探测，数据库不可用时返回 503"""
+    try:
+        db.session.execute(db.text('SELECT 1'))
+    except Exception:
+        logger.exception('健康检查失败')
+        return jsonify({'status': 'unavailable'}), 503
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus 文本格式的运行指标（管理员或携带 METRICS_TOKEN 的采集端可访问）"""
+    token = app.config.get('METRICS_TOKEN')
+    authorized = 'user' in session and session['user']['role'] == 'admin'
+    if not authorized and token:
+        authorized = request.headers.get('Authorization') == f'Bearer {token}'
+    if not authorized:
+        return jsonify({'message': '需要管理员权限'}), 403
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/change-password')
 def change_password():
     """修改密码页面"""
@@ -1761,17 +3339,343 @@ def change_password():
         return redirect(url_for('login'))
     return render_template('change_password.html')
 
+def migrate_score_record_unique_index():
+    """为旧数据库的 score_record 表补建 (学生, 类别, 学年) 唯一索引，create_all 不会修改已有表"""
+    existing = {index['name'] for index in db.inspect(db.engine).get_indexes('score_record')}
+    if 'unique_score_record' in existing:
+        return
+    duplicates = db.session.query(
+        ScoreRecord.user_id, ScoreRecord.category_id, ScoreRecord.academic_year
+    ).filter(ScoreRecord.category_id.isnot(None)).group_by(
+        ScoreRecord.user_id, ScoreRecord.category_id, ScoreRecord.academic_year
+    ).having(db.func.count() > 1).all()
+    if duplicates:
+        sample = ', '.join(f'(user_id={u}, category_id={c}, academic_year={y})' for u, c, y in duplicates[:5])
+        raise RuntimeError(f'score_record 中有 {len(duplicates)} 组重复记录，清理后才能创建唯一索引: {sample}')
+    for index in ScoreRecord.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+    logger.info('已为 score_record 创建唯一索引')
+
 # 初始化数据库
 def init_db():
     with app.app_context():
         try:
             # 创建所有表
             db.create_all()
-            print("✅ SQLite数据库初始化完成")
-        except Exception as e:
-            print(f"❌ 数据库初始化错误: {e}")
+            migrate_score_record_unique_index()
+            # create_all 不会给已有的表补建新增的索引
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
+            with db.engine.begin() as connection:
+                score_archive.create_all(connection)
+                rebuilt = search_index.ensure_search_index(connection, (HOT_SCHEMA, ARCHIVE_SCHEMA))
+                student_versions.ensure_student_versions(connection)
+                score_cube.ensure_score_cube(connection, (HOT_SCHEMA, ARCHIVE_SCHEMA))
+            if rebuilt:
+                logger.info('已重建全文索引: %s', ', '.join(rebuilt))
+            # 应用停止期间数据库可能被直接修改，启动时让所有 ETag 失效
+            table_versions.bump(*VERSIONED_TABLES)
+            ReviewEvent.query.filter(
+                ReviewEvent.created_at < datetime.utcnow() - timedelta(days=REVIEW_EVENT_RETENTION_DAYS)
+            ).delete()
+            prune_roster_uploads()
+            prune_idempotency_keys()
+            db.session.commit()
+            # 为还没有计分规则的学年写入规则（按学年先后，后面的学年沿用前一学年）
+            seeded = [year.year_name for year in AcademicYear.query.order_by(AcademicYear.year_name).all()
+                      if ensure_year_rules(year.year_name)]
+            db.session.commit()
+            if seeded:
+                logger.info('已为学年写入计分规则: %s', ', '.join(seeded))
+            # 预先加载已归档学年，fork 出的 worker 直接沿用
+            archived_years()
+            logger.info('SQLite数据库初始化完成')
+        except Exception:
+            logger.exception('数据库初始化错误')
             raise
 
+# 启动时不应加载的重型依赖，只在导入导出时按需加载
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'xlsxwriter')
+
+_BOOT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import wsgi
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    rss_kb = None
+print(json.dumps({'import_seconds': elapsed, 'max_rss_kb': rss_kb, 'modules': sorted(sys.modules)}))
+"""
+
+@app.cli.command('boot-check')
+def boot_check_command():
+    """在全新的解释器中导入 wsgi，报告启动耗时和内存；启动时加载了重型依赖则以非零状态退出"""
+    output = subprocess.run(
+        [sys.executable, '-c', _BOOT_PROBE], cwd=basedir, capture_output=True, text=True, check=True
+    ).stdout
+    probe = json.loads(output.strip().splitlines()[-1])
+    loaded = [name for name in HEAVY_MODULES if name in probe['modules']]
+    click.echo(f"启动耗时: {probe['import_seconds'] * 1000:.1f} ms")
+    if probe['max_rss_kb'] is not None:
+        click.echo(f"常驻内存峰值: {probe['max_rss_kb'] / 1024:.1f} MB")
+    if loaded:
+        raise click.ClickException(f"启动时加载了重型依赖: {', '.join(loaded)}")
+    click.echo('启动时未加载重型依赖')
+
+# ==================== 计分规则管理 ====================
+scoring_rules_cli = click.Group('scoring-rules', help='按学年管理计分规则')
+app.cli.add_command(scoring_rules_cli)
+
+@scoring_rules_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--year', 'academic_year', required=True, help='规则所属学年')
+@click.option('--name', 'rule_set', default=DEFAULT_RULE_SET, show_default=True, help='规则集名称')
+def import_scoring_rules_command(path, academic_year, rule_set):
+    """从 JSON 文件导入规则集（category_caps / subcategory_caps 按类别名称配置上限，max_only 为只取最高项的主类别）"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    categories = category_rows()
+    names = {name for _, _, name in categories}
+    unknown = [name for key in ('category_caps', 'subcategory_caps') for name in data.get(key, {}) if name not in names]
+    if unknown:
+        raise click.ClickException(f'未知类别: {", ".join(unknown)}')
+    rules = scoring.rules_from_names(
+        categories, data.get('category_caps', {}), data.get('subcategory_caps', {}), data.get('max_only', []))
+    save_scoring_rules(academic_year, rule_set, rules)
+    db.session.commit()
+    click.echo(f'已导入 {academic_year} 学年规则集 {rule_set}：{len(rules)} 个主类别')
+
+@scoring_rules_cli.command('show')
+@click.option('--year', 'academic_year', required=True, help='学年')
+@click.option('--name', 'rule_set', default=DEFAULT_RULE_SET, show_default=True, help='规则集名称')
+def show_scoring_rules_command(academic_year, rule_set):
+    """显示学年规则集"""
+    rules = ScoringRule.query.filter_by(academic_year=academic_year, rule_set=rule_set).order_by(ScoringRule.category_id).all()
+    if not rules:
+        raise click.ClickException(f'{academic_year} 学年没有规则集 {rule_set}')
+    names = {category_id: name for category_id, _, name in category_rows()}
+    for rule in rules:
+        subcategory_caps = {names.get(int(k), k): v for k, v in json.loads(rule.subcategory_caps).items()}
+        click.echo(f'{names.get(rule.category_id)}: 上限 {rule.max_score}，{rule.mode}'
+                   + (f'，子类别上限 {subcategory_caps}' if subcategory_caps else ''))
+
+# ==================== 静态资源 ====================
+@app.cli.command('compress-static')
+def compress_static_command():
+    """部署时为 static 下的 CSS、JS 等生成 .br / .gz 预压缩副本"""
+    for filename, encodings in static_assets.precompress():
+        click.echo(f'{filename}: ' + ('，'.join(encodings) if encodings else '压缩后不更小，跳过'))
+
+@app.cli.command('rebuild-cube')
+@click.option('--year', 'years', multiple=True, help='要重建的学年，可重复指定；不指定时重建全部学年')
+def rebuild_cube_command(years):
+    """标记学年内所有有记录的学生并重算统计立方体（一般由触发器增量维护，无需手动执行）"""
+    connection = db.session.connection()
+    for academic_year in years or (None,):
+        for schema in (HOT_SCHEMA, ARCHIVE_SCHEMA):
+            score_cube.mark_all(connection, schema, academic_year)
+    years = years or [year for year, in db.session.execute(db.text(
+        f'SELECT DISTINCT academic_year FROM {score_cube.DIRTY_TABLE}'))]
+    for academic_year in years:
+        click.echo(f'{academic_year}: 重算 {refresh_score_cube(academic_year)} 名学生')
+    db.session.commit()
+
+# ==================== 冷学年归档命令 ====================
+archive_cli = click.Group('archive', help='把已结束学年的数据移到归档库')
+app.cli.add_command(archive_cli)
+
+def _move_archived_year(academic_year, source, target):
+    """在一个事务中移动学年数据并更新归档学年表，返回各表行数"""
+    connection = db.session.connection()
+    conflicts = score_archive.id_conflicts(connection, academic_year, source, target)
+    if conflicts:
+        raise click.ClickException(
+            f"{'归档库' if target == ARCHIVE_SCHEMA else '主库'}中已有相同 id 的行，无法移动 {academic_year} 学年: "
+            + '，'.join(f'{name} {count} 行' for name, count in conflicts.items()))
+    counts = score_archive.move_year(connection, academic_year, source, target)
+    years = score_archive.years_table
+    if target == ARCHIVE_SCHEMA:
+        connection.execute(years.insert().values(
+            year_name=academic_year, archived_at=datetime.utcnow(), row_counts=json.dumps(counts)))
+    else:
+        connection.execute(years.delete().where(years.c.year_name == academic_year))
+    db.session.commit()
+    table_versions.bump('archived_year')
+    return counts
+
+@archive_cli.command('year')
+@click.argument('academic_year')
+def archive_year_command(academic_year):
+    """归档一个学年：德育分记录、个人申请、集体申请及成员移到归档库"""
+    year = AcademicYear.query.filter_by(year_name=academic_year).first()
+    if year is None:
+        raise click.ClickException(f'学年不存在: {academic_year}')
+    if year.is_current:
+        raise click.ClickException('不能归档当前学年')
+    if academic_year in archived_years():
+        raise click.ClickException(f'{academic_year} 学年已归档')
+    pending = ScoreApplication.query.filter_by(academic_year=academic_year, status='pending').count() \
+        + GroupApplication.query.filter_by(academic_year=academic_year, status='pending').count()
+    if pending:
+        raise click.ClickException(f'{academic_year} 学年还有 {pending} 个待审核申请，请先处理')
+    counts = _move_archived_year(academic_year, HOT_SCHEMA, ARCHIVE_SCHEMA)
+    click.echo(f'已归档 {academic_year} 学年: ' + '，'.join(f'{name} {count} 行' for name, count in counts.items()))
+    click.echo('主库文件不会自动变小，可在停机时执行 VACUUM 回收空间')
+
+@archive_cli.command('restore')
+@click.argument('academic_year')
+def restore_year_command(academic_year):
+    """把已归档的学年移回主库"""
+    if academic_year not in archived_years():
+        raise click.ClickException(f'{academic_year} 学年未归档')
+    counts = _move_archived_year(academic_year, ARCHIVE_SCHEMA, HOT_SCHEMA)
+    click.echo(f'已恢复 {academic_year} 学年: ' + '，'.join(f'{name} {count} 行' for name, count in counts.items()))
+
+@archive_cli.command('list')
+def list_archived_years_command():
+    """列出已归档的学年"""
+    years = score_archive.years_table
+    for row in db.session.execute(db.select(years).order_by(years.c.year_name)):
+        counts = json.loads(row.row_counts or '{}')
+        click.echo(f'{row.year_name}（{row.archived_at:%Y-%m-%d}）: '
+                   + '，'.join(f'{name} {count} 行' for name, count in counts.items()))
+
+# ==================== 批量重算 ====================
+def iter_year_record_chunks(academic_year, chunk_size):
+    """按学生分块产出某学年的记录：[(user_id, [(category_id, 分值), ...]), ...]
+
+    与排行榜（iter_student_scores）相同，类别为空的记录也要读出，由 scoring.score_records 计入未分类分数。
+    """
+    Record = score_model(ScoreRecord, academic_year)
+    query = db.session.query(
+        Record.user_id,
+        Record.category_id,
+        Record.score
+    ).filter(
+        Record.academic_year == academic_year
+    ).order_by(Record.user_id).yield_per(EXPORT_CHUNK_SIZE)
+
+    chunk = []
+    for user_id, rows in itertools.groupby(query, key=lambda r: r[0]):
+        chunk.append((user_id, [(category_id, score) for _, category_id, score in rows]))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def save_score_totals(academic_year, rule_set, results):
+    """批量写入重算结果，已存在的 (学生, 学年, 规则集) 直接覆盖"""
+    now = datetime.utcnow()
+    # 分批执行，避免超出 SQLite 单条语句的参数个数上限
+    for i in range(0, len(results), 1000):
+        stmt = sqlite_insert(ScoreTotal).values([
+            {
+                'user_id': user_id,
+                'academic_year': academic_year,
+                'rule_set': rule_set,
+                'total_score': total,
+                'category_scores': json.dumps(category_scores, ensure_ascii=False),
+                'computed_at': now
+            }
+            for user_id, category_scores, total, _ in results[i:i + 1000]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'academic_year', 'rule_set'],
+            set_={
+                'total_score': stmt.excluded.total_score,
+                'category_scores': stmt.excluded.category_scores,
+                'computed_at': stmt.excluded.computed_at
+            }
+        )
+        db.session.execute(stmt)
+
+@app.cli.command('rescore')
+@click.option('--year', 'years', multiple=True, required=True, help='要重算的学年，可重复指定')
+@click.option('--rules', 'rule_set_name', default='default', show_default=True, help='目标规则集名称')
+@click.option('--baseline', default='default', show_default=True, help='用于对比的基准规则集')
+@click.option('--workers', type=int, default=os.cpu_count(), show_default=True, help='进程数')
+@click.option('--chunk-size', type=int, default=2000, show_default=True, help='每个任务包含的学生数')
+@click.option('--report', type=click.Path(dir_okay=False, writable=True), help='把总分有变化的学生写入 CSV')
+@click.option('--dry-run', is_flag=True, help='只计算和报告，不写入数据库')
+def rescore_command(years, rule_set_name, baseline, workers, chunk_size, report, dry_run):
+    """按指定规则集并行重算学年总分，写入 score_total 并报告与基准规则的差异"""
+    # 规则按学年保存，先确认每个学年都有目标规则集和基准规则集
+    year_rules = {}
+    for academic_year in years:
+        target_rules = get_scoring_rules(academic_year, rule_set_name)
+        baseline_rules = get_scoring_rules(academic_year, baseline)
+        if target_rules is None or baseline_rules is None:
+            missing = rule_set_name if target_rules is None else baseline
+            raise click.ClickException(f'{academic_year} 学年没有规则集 {missing}，请先用 flask scoring-rules import 导入')
+        year_rules[academic_year] = (target_rules, baseline_rules)
+
+    changes = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for academic_year in years:
+            target_rules, baseline_rules = year_rules[academic_year]
+            Record = score_model(ScoreRecord, academic_year)
+            total_students = db.session.query(
+                db.func.count(db.distinct(Record.user_id))
+            ).filter(Record.academic_year == academic_year).scalar()
+            click.echo(f'[{academic_year}] 共 {total_students} 名学生，规则集 {rule_set_name}（基准 {baseline}）')
+            done = 0
+            pending = set()
+            chunks = iter_year_record_chunks(academic_year, chunk_size)
+
+            def drain(return_when):
+                nonlocal done, pending
+                finished, pending = wait(pending, return_when=return_when)
+                for future in finished:
+                    results = future.result()
+                    if not dry_run:
+                        save_score_totals(academic_year, rule_set_name, results)
+                    for user_id, _, total, baseline_total in results:
+                        if total != baseline_total:
+                            changes.append((academic_year, user_id, baseline_total, total))
+                    done += len(results)
+                percent = done * 100 / total_students if total_students else 100
+                click.echo(f'[{academic_year}] 已处理 {done}/{total_students} ({percent:.1f}%)，有变化 {len(changes)}')
+
+            for chunk in chunks:
+                pending.add(pool.submit(scoring.rescore_chunk, target_rules, baseline_rules, chunk))
+                # 控制在途任务数量，避免一次把整个学年读进内存
+                if len(pending) >= workers * 2:
+                    drain(FIRST_COMPLETED)
+            if pending:
+                drain(ALL_COMPLETED)
+            if not dry_run:
+                db.session.commit()
+
+    click.echo(f'完成：{len(changes)} 名学生的总分与基准规则不同' + ('（试运行，未写入）' if dry_run else ''))
+    if not changes:
+        return
+
+    # 补充学生信息，按变化幅度排序输出
+    students = {}
+    user_ids = list({user_id for _, user_id, _, _ in changes})
+    for i in range(0, len(user_ids), 500):
+        for user in User.query.filter(User.id.in_(user_ids[i:i + 500])).all():
+            students[user.id] = user
+    changes.sort(key=lambda c: abs(c[3] - c[2]), reverse=True)
+    for academic_year, user_id, old_total, new_total in changes[:10]:
+        user = students.get(user_id)
+        click.echo(f'  {academic_year} {user.student_id if user else user_id} {user.name if user else ""}: '
+                   f'{old_total} -> {new_total} ({new_total - old_total:+})')
+    if report:
+        with open(report, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['学年', '学号', '姓名', '基准总分', '新总分', '变化'])
+            for academic_year, user_id, old_total, new_total in changes:
+                user = students.get(user_id)
+                writer.writerow([academic_year, user.student_id if user else '', user.name if user else '',
+                                 old_total, new_total, new_total - old_total])
+        click.echo(f'变化明细已写入 {report}')
+
 # 根据用户角色重定向到对应页面
 def redirect_by_role(user_role):
     """统一的角色重定向逻辑"""
@@ -1990,40 +3894,28 @@ def api_calculate_scores():
     if not academic_year:
         return jsonify({'error': '请指定学年'}), 400
     
-    # 获取学生的所有德育分记录
-    query = db.session.query(ScoreRecord, ScoreCategory).join(
-        ScoreCategory, ScoreRecord.category_id == ScoreCategory.id
-    ).filter(ScoreRecord.user_id == user_id, ScoreRecord.academic_year == academic_year)
-    
-    records = query.all()
+    # 获取学生的所有德育分记录（关联父类别，避免逐条查询）
+    parent = db.aliased(ScoreCategory)
+    records = query_score_records(lambda Record: db.session.query(Record, ScoreCategory, parent.name).join(
+        ScoreCategory, Record.category_id == ScoreCategory.id
+    ).outerjoin(
+        parent, ScoreCategory.parent_id == parent.id
+    ).filter(Record.user_id == user_id, Record.academic_year == academic_year), academic_year)
     
-    # 按主类别分组统计
+    # 按主类别分组
     category_scores = {}
-    total_score = 0
     
-    for record, category in records:
-        # 获取主类别
-        if category.parent_id:
-            parent_category = ScoreCategory.query.get(category.parent_id)
-            main_category_name = parent_category.name
-        else:
-            main_category_name = category.name
-        
-        if main_category_name not in category_scores:
-            category_scores[main_category_name] = []
-        
-        category_scores[main_category_name].append({
+    for record, category, parent_name in records:
+        main_category_name = parent_name if category.parent_id else category.name
+        category_scores.setdefault(main_category_name, []).append({
             'score': record.score,
             'category_name': category.name,
             'description': record.description
         })
     
-    # 应用特殊规则计算最终分数
-    final_scores = {}
-    
-    for main_category, records in category_scores.items():
-        # 使用新函数计算最终分数（应用子类别限制，如工时最多1分）
-        final_scores[main_category] = calculate_category_score_with_subcategory(main_category, records)
+    # 按该学年的计分规则计算最终分数
+    final_scores, _ = scoring.score_records(
+        get_scoring_rules(academic_year), [(record.category_id, record.score) for record, _, _ in records])
     
     # 计算总分（扣分特殊处理）
     positive_score = sum([score for category, score in final_scores.items() if category != '扣分'])
@@ -2045,7 +3937,9 @@ def api_calculate_scores():
     })
 
 if __name__ == '__main__':
+    # 开发调试用；生产环境请使用 gunicorn -c gunicorn.conf.py wsgi:app
+    create_app()
     init_db()
-    print("德育分管理系统启动中...")
-    print("前端地址: http://localhost:5000")
+    metrics.reset_directory()
+    logger.info('德育分管理系统启动中，前端地址: http://localhost:5000')
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,111 @@
+"""冷学年归档
+
+已结束学年的德育分记录、个人申请、集体申请及其成员从主库移到单独的归档库文件
+（默认 instance/archive.db）。归档库在每个连接上以 archive 的名字 ATTACH，表名与主库相同；
+查询已归档学年时把主库表换成归档库中的同名表（见 app.py 的 score_model），同一条 SQL 中
+User、ScoreCategory 等其他表仍读主库。主库的表和索引因此只保留近年的数据。
+"""
+import os
+
+from sqlalchemy import Column, DateTime, Index, MetaData, String, Table, Text, UniqueConstraint, event, text
+
+ARCHIVE_SCHEMA = 'archive'
+HOT_SCHEMA = 'main'
+
+# 按学年移动的表及筛选条件（{schema} 为数据当前所在的库）。按插入顺序排列，删除时倒序
+YEAR_FILTERS = (
+    ('score_record', 'academic_year = :year'),
+    ('score_application', 'academic_year = :year'),
+    ('group_application', 'academic_year = :year'),
+    ('group_application_member',
+     'group_application_id IN (SELECT id FROM {schema}.group_application WHERE academic_year = :year)'),
+)
+
+
+class ScoreArchive:
+    """按 Flask 扩展的方式挂载到应用上"""
+
+    def __init__(self, app=None, db=None, tables=()):
+        self.path = None
+        self.metadata = MetaData()
+        self.tables = {}
+        self.years_table = Table(
+            'archived_year', self.metadata,
+            Column('year_name', String(20), primary_key=True),
+            Column('archived_at', DateTime),
+            Column('row_counts', Text),  # JSON：表名 -> 行数
+            schema=ARCHIVE_SCHEMA,
+        )
+        if app is not None:
+            self.init_app(app, db, tables)
+
+    def init_app(self, app, db, tables):
+        app.config.setdefault('ARCHIVE_DATABASE', os.environ.get(
+            'DYF_ARCHIVE_DATABASE', os.path.join(app.instance_path, 'archive.db')))
+        self.path = app.config['ARCHIVE_DATABASE']
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        for table in tables:
+            self.tables[table.name] = self._copy_table(table)
+
+        with app.app_context():
+            event.listen(db.engine, 'connect', self._attach)
+        app.extensions['score_archive'] = self
+
+    def _attach(self, dbapi_connection, connection_record):
+        dbapi_connection.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (self.path,))
+
+    def _copy_table(self, table):
+        """归档库中的同名表：列、索引和唯一约束与主库相同；SQLite 不支持跨库外键，不复制外键"""
+        copy = Table(table.name, self.metadata, *(
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+            for column in table.columns
+        ), schema=ARCHIVE_SCHEMA)
+        for index in table.indexes:
+            Index(index.name, *(copy.c[column.name] for column in index.columns), unique=index.unique)
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                copy.append_constraint(UniqueConstraint(
+                    *(column.name for column in constraint.columns), name=constraint.name))
+        return copy
+
+    def create_all(self, connection):
+        """在归档库中建表（已存在的跳过）"""
+        self.metadata.create_all(connection)
+
+    def id_conflicts(self, connection, academic_year, source, target):
+        """要移动的行中 id 已存在于 target 库的行数
+
+        旧版本建的主库表没有 AUTOINCREMENT，行移到归档库后 SQLite 可能把相同的 id 分配给新行，
+        移动前检查，避免复制时违反主键约束。
+
+        Returns:
+            表名 -> 冲突行数，只包含有冲突的表
+        """
+        conflicts = {}
+        for name, condition in YEAR_FILTERS:
+            count = connection.execute(text(
+                f'SELECT count(*) FROM {source}.{name} WHERE {condition.format(schema=source)} '
+                f'AND id IN (SELECT id FROM {target}.{name})'
+            ), {'year': academic_year}).scalar()
+            if count:
+                conflicts[name] = count
+        return conflicts
+
+    def move_year(self, connection, academic_year, source, target):
+        """在调用方的事务中把一个学年的数据从 source 库移到 target 库：先复制，再从 source 删除
+
+        Returns:
+            表名 -> 移动的行数
+        """
+        counts = {}
+        for name, condition in YEAR_FILTERS:
+            columns = ', '.join(column.name for column in self.tables[name].columns)
+            counts[name] = connection.execute(text(
+                f'INSERT INTO {target}.{name} ({columns}) SELECT {columns} FROM {source}.{name} '
+                f'WHERE {condition.format(schema=source)}'
+            ), {'year': academic_year}).rowcount
+        for name, condition in reversed(YEAR_FILTERS):
+            connection.execute(text(
+                f'DELETE FROM {source}.{name} WHERE {condition.format(schema=source)}'
+            ), {'year': academic_year})
+        return counts
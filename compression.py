@@ -0,0 +1,128 @@
+"""响应压缩
+
+大于 COMPRESS_MIN_SIZE 字节的 JSON、HTML、CSV 等文本响应按 Accept-Encoding 压缩后发送，
+优先 brotli（需安装 Brotli 包，未安装时只用 gzip）。流式响应（流式 JSON 列表、CSV / JSON Lines 导出）
+逐块压缩，每块之后刷新，仍然边生成边发送；事件流不在可压缩类型中。
+文件响应不在这里压缩，静态文件由 static_assets 发送部署时预压缩好的副本。
+
+压缩后的响应是另一种表示，强 ETag 加上 "-br" / "-gzip" 后缀；客户端回传时在请求开始前去掉后缀，
+接口自己的 ETag 比较逻辑（如 TableVersions.json_response）无需改动。
+"""
+import gzip
+import re
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 按优先顺序排列
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/javascript',
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'image/svg+xml',
+})
+
+_ETAG_SUFFIX = re.compile(r'-(?:br|gzip)(?=")')
+
+
+def compress(data, encoding, level):
+    """按编码压缩字节串；level 为 gzip 的 1-9 或 brotli 的 0-11"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding, level):
+    """逐块压缩流式响应体；每块之后刷新压缩器，客户端收到即可解码，不必等待整个响应"""
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            for chunk in chunks:
+                data = compressor.process(chunk.encode() if isinstance(chunk, str) else chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            # wbits=31：带 gzip 头和校验尾
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk) \
+                    + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+    finally:
+        # 原响应体可能是 stream_with_context 生成器，需要关闭以释放请求上下文
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def choose_encoding(accept_encodings, encodings=ENCODINGS):
+    """客户端接受的第一个编码，都不接受时返回 None"""
+    for encoding in encodings:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+class ResponseCompression:
+    """按 Flask 扩展的方式挂载到应用上"""
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.levels = {'gzip': 6, 'br': 5}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        # 请求中压缩取中等级别，压缩率和 CPU 开销兼顾；预压缩静态文件时使用最高级别
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.levels = {'gzip': app.config['COMPRESS_GZIP_LEVEL'], 'br': app.config['COMPRESS_BROTLI_QUALITY']}
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['compression'] = self
+
+    @staticmethod
+    def _before_request():
+        if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            request.environ['HTTP_IF_NONE_MATCH'] = _ETAG_SUFFIX.sub('', if_none_match)
+
+    def _after_request(self, response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            # 流式响应长度未知，不做大小判断
+            response.response = compress_stream(response.response, encoding, self.levels[encoding])
+            response.headers.pop('Content-Length', None)
+        elif response.content_length is not None and response.content_length >= self.min_size:
+            response.set_data(compress(response.get_data(), encoding, self.levels[encoding]))
+        else:
+            return response
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak)
+        return response
@@ -0,0 +1,61 @@
+"""gunicorn 配置（生产环境）
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- 主进程预加载应用并只执行一次 init_db()，worker 不再各自建表
+- DYF_WORKERS / DYF_THREADS 控制进程数和每进程线程数
+- worker 按 DYF_MAX_REQUESTS 定期回收，退出后其指标快照由主进程归档
+- SIGTERM 优雅退出（等待 DYF_GRACEFUL_TIMEOUT 秒），SIGHUP 平滑重启全部 worker
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('DYF_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('DYF_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('DYF_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# 在 fork 之前加载应用，只读数据由 worker 写时复制共享
+preload_app = True
+
+timeout = int(os.environ.get('DYF_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('DYF_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# 定期回收 worker，防止内存缓慢增长；加抖动避免同时重启
+max_requests = int(os.environ.get('DYF_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# 访问日志由应用的结构化日志负责
+accesslog = None
+errorlog = '-'
+
+
+def on_starting(server):
+    """主进程启动时执行一次：建表并清理上次运行遗留的指标快照"""
+    from app import init_db, metrics
+    init_db()
+    metrics.reset_directory()
+    # 预加载完成后冻结现有对象，避免 worker 中的 GC 写入这些页面破坏写时复制
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """fork 之后丢弃从主进程继承的数据库连接，每个 worker 使用自己的连接池"""
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    """worker 退出前写出最后的指标快照和队列中的日志"""
+    from app import metrics, structured_logging
+    metrics.flush(force=True)
+    structured_logging.stop()
+
+
+def child_exit(server, worker):
+    """主进程回收 worker 后，把它的指标快照累加进归档快照并删除 pid 文件"""
+    from app import metrics
+    metrics.archive_process(worker.pid)
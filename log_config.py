@@ -0,0 +1,186 @@
+"""非阻塞的结构化日志
+
+请求线程里的日志调用只把记录放进内存队列（QueueHandler），由后台 QueueListener 线程
+格式化为 JSON 并写入 stdout，慢速的日志管道不会再阻塞 worker。每条记录自动带上
+request_id、user_id 和 route；各 logger 的级别可单独配置，高频的 DEBUG 日志按比例采样。
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request, session
+
+# 记录对象上的标准属性，其余属性视为结构化字段输出
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+_CONTEXT_ATTRS = ('request_id', 'user_id', 'route')
+
+
+class RequestContextFilter(logging.Filter):
+    """在产生日志的线程中附加请求上下文"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.user_id = session.get('user', {}).get('id')
+            record.route = request.endpoint
+        else:
+            record.request_id = record.user_id = record.route = None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """DEBUG 级别的记录每 N 条保留 1 条，其他级别全部保留"""
+
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        with self._lock:
+            self._counter += 1
+            keep = self._counter % self.every == 1
+        if keep:
+            record.sample_rate = self.every
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出一行 JSON"""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for attr in _CONTEXT_ATTRS:
+            value = getattr(record, attr, None)
+            if value is not None:
+                payload[attr] = value
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key not in _CONTEXT_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """队列满时直接丢弃并计数，绝不阻塞请求线程"""
+
+    def __init__(self, log_queue, metrics=None):
+        super().__init__(log_queue)
+        self.metrics = metrics
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 只在请求线程里完成参数合并和异常渲染，JSON 格式化留给监听线程
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        start = time.perf_counter()
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+            if self.metrics is not None:
+                self.metrics.inc('dyf_log_dropped_total')
+            return
+        except Exception:
+            self.handleError(record)
+            return
+        if self.metrics is not None:
+            self.metrics.inc('dyf_log_records_total', level=record.levelname)
+            self.metrics.observe('dyf_log_emit_seconds', time.perf_counter() - start)
+
+
+def _parse_levels(spec):
+    """解析 "dyf=INFO,dyf.review=DEBUG" 形式的级别配置"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class StructuredLogging:
+    """按 Flask 扩展的方式安装队列日志"""
+
+    def __init__(self, app=None, metrics=None):
+        self.listener = None
+        self.handler = None
+        if app is not None:
+            self.init_app(app, metrics)
+
+    def init_app(self, app, metrics=None):
+        app.config.setdefault('LOG_LEVEL', os.environ.get('DYF_LOG_LEVEL', 'INFO'))
+        app.config.setdefault('LOG_LEVELS', _parse_levels(os.environ.get('DYF_LOG_LEVELS')))
+        app.config.setdefault('LOG_DEBUG_SAMPLE_EVERY', int(os.environ.get('DYF_LOG_DEBUG_SAMPLE_EVERY', 10)))
+        app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+
+        self.handler = NonBlockingQueueHandler(queue.Queue(app.config['LOG_QUEUE_SIZE']), metrics)
+        self.handler.addFilter(RequestContextFilter())
+        self.handler.addFilter(DebugSamplingFilter(app.config['LOG_DEBUG_SAMPLE_EVERY']))
+
+        root = logging.getLogger('dyf')
+        root.handlers[:] = [self.handler]
+        root.setLevel(app.config['LOG_LEVEL'])
+        root.propagate = False
+        for name, level in app.config['LOG_LEVELS'].items():
+            logging.getLogger(name).setLevel(level)
+
+        self._start_listener()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._restart_after_fork)
+        atexit.register(self.stop)
+
+        app.before_request(self._assign_request_id)
+        app.after_request(self._echo_request_id)
+        app.extensions['structured_logging'] = self
+
+    def _start_listener(self):
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.handler.queue, stream, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_after_fork(self):
+        # 子进程里没有监听线程；继承来的队列中还留着父进程线程的等待者，
+        # 继续使用会导致新线程收不到通知，因此换一个新队列
+        self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+        self._start_listener()
+
+    def stop(self):
+        """停止监听线程并写出队列中剩余的记录"""
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    @staticmethod
+    def _assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+    @staticmethod
+    def _echo_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
@@ -0,0 +1,315 @@
+"""请求指标采集与 Prometheus 文本格式导出
+
+每个进程在内存中累计计数器和直方图，并定期把快照写入指标目录下以 pid 命名的文件；
+导出时合并目录下所有进程的快照，因此多 worker 部署时 /metrics 返回的是全局数据。
+worker 退出（包括按 max_requests 回收）后，主进程把它的快照累加进 metrics_archive.json 并删除原文件，
+目录中的文件数不随回收次数增长，pid 被新 worker 复用时也不会覆盖旧 worker 的计数。
+
+流式响应在视图返回后才边发送边执行查询，请求的计时和 SQL 统计保存在 request.environ 中
+（stream_with_context 会推入新的应用上下文，g 不再是同一个），到响应体结束时再记录。
+视图抛出未处理异常时不会经过 after_request，这类请求在 teardown_request 中按 500 记录。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+# 延迟直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 响应体大小直方图的桶（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# 单条日志入队耗时直方图的桶（秒）
+LOG_EMIT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005)
+# request.environ 中的请求统计：[开始时间, SQL 语句数, SQL 总耗时]
+_STATE_KEY = 'dyf.metrics'
+
+# 已退出进程的累计快照
+ARCHIVE_FILENAME = 'metrics_archive.json'
+
+# 单请求 SQL 语句数直方图的桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+
+# 指标定义：名称 -> (类型, 说明, 直方图桶)
+METRIC_DEFINITIONS = {
+    'dyf_http_requests_total': ('counter', '按路由和状态码统计的请求数', None),
+    'dyf_http_request_duration_seconds': ('histogram', '请求处理耗时', LATENCY_BUCKETS),
+    'dyf_http_response_size_bytes': ('histogram', '响应体大小', SIZE_BUCKETS),
+    'dyf_sql_queries_per_request': ('histogram', '单个请求执行的 SQL 语句数', QUERY_COUNT_BUCKETS),
+    'dyf_sql_duration_per_request_seconds': ('histogram', '单个请求的 SQL 总耗时', LATENCY_BUCKETS),
+    'dyf_sql_queries_total': ('counter', '执行的 SQL 语句总数', None),
+    'dyf_query_budget_exceeded_total': ('counter', '超出路由 SQL 语句预算的请求数', None),
+    'dyf_export_duration_seconds': ('histogram', '导出文件生成耗时', LATENCY_BUCKETS),
+    'dyf_upload_duration_seconds': ('histogram', '上传文件保存与解析耗时', LATENCY_BUCKETS),
+    'dyf_log_records_total': ('counter', '写入日志队列的记录数', None),
+    'dyf_log_dropped_total': ('counter', '日志队列已满而丢弃的记录数', None),
+    'dyf_log_emit_seconds': ('histogram', '请求线程中单条日志的入队耗时', LOG_EMIT_BUCKETS),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(label_items, extra=None):
+    items = list(label_items) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    escaped = []
+    for k, v in items:
+        v = str(v).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{k}="{v}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """进程内指标注册表，按 Flask 扩展的方式挂载到应用上"""
+
+    def __init__(self, app=None, db=None):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self.directory = None
+        self.flush_interval = 1.0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        app.config.setdefault('METRICS_DIR', os.environ.get(
+            'DYF_METRICS_DIR', os.path.join(app.instance_path, 'metrics')))
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('DYF_METRICS_TOKEN'))
+        self.directory = app.config['METRICS_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        os.makedirs(self.directory, exist_ok=True)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['metrics'] = self
+
+        if db is not None:
+            with app.app_context():
+                self.instrument_engine(db.engine)
+
+    # ---------- 采集 ----------
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRIC_DEFINITIONS[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                # 每个桶的计数 + sum + count
+                state = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """统计代码块耗时，用于导出和上传等非请求粒度的操作"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def instrument_engine(self, engine):
+        """通过引擎事件统计每个请求的 SQL 语句数和耗时"""
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get('metrics_query_start')
+            elapsed = time.perf_counter() - starts.pop() if starts else 0.0
+            state = request.environ.get(_STATE_KEY) if has_request_context() else None
+            if state is not None:
+                state[1] += 1
+                state[2] += elapsed
+
+    def _before_request(self):
+        request.environ[_STATE_KEY] = [time.perf_counter(), 0, 0.0]
+
+    def _after_request(self, response):
+        environ = request.environ
+        if _STATE_KEY not in environ:
+            return response
+        route = request.endpoint or 'unmatched'
+        method = request.method
+        after_response(response, lambda: self._record(environ, method, route, response.status_code, response))
+        return response
+
+    def _teardown_request(self, exc):
+        # 统计还在说明 after_request 没有执行（异常直接抛出），按 500 记录
+        if exc is not None:
+            self._record(request.environ, request.method, request.endpoint or 'unmatched', 500)
+
+    def _record(self, environ, method, route, status, response=None):
+        state = environ.pop(_STATE_KEY, None)
+        if state is None:
+            return
+        start, queries, sql_seconds = state
+        self.inc('dyf_http_requests_total', method=method, route=route, status=status)
+        self.observe('dyf_http_request_duration_seconds', time.perf_counter() - start, method=method, route=route)
+        # 流式响应长度未知，不计入大小统计
+        if response is not None and not response.is_streamed:
+            self.observe('dyf_http_response_size_bytes', response.calculate_content_length() or 0, route=route)
+        self.inc('dyf_sql_queries_total', queries, route=route)
+        self.observe('dyf_sql_queries_per_request', queries, route=route)
+        self.observe('dyf_sql_duration_per_request_seconds', sql_seconds, route=route)
+        self.flush()
+
+    # ---------- 多进程聚合 ----------
+    def _snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[n, list(map(list, k)), v] for (n, k), v in self._counters.items()],
+                'histograms': [[n, list(map(list, k)), list(v)] for (n, k), v in self._histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """把本进程的快照写入指标目录，默认按 METRICS_FLUSH_INTERVAL 限频"""
+        now = time.monotonic()
+        if not self.directory or (not force and now - self._last_flush < self.flush_interval):
+            return
+        self._last_flush = now
+        _write_snapshot(os.path.join(self.directory, f'metrics_{os.getpid()}.json'), self._snapshot())
+
+    def reset_directory(self):
+        """清空历史进程留下的快照，在主进程启动时调用"""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith('metrics_'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def archive_process(self, pid):
+        """把已退出进程的快照累加进归档快照并删除原文件，在 gunicorn 主进程的 child_exit 中调用"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'metrics_{pid}.json')
+        snapshot = _read_snapshot(path)
+        if snapshot is None:
+            return
+        archive_path = os.path.join(self.directory, ARCHIVE_FILENAME)
+        counters, histograms = {}, {}
+        for source in (_read_snapshot(archive_path), snapshot):
+            if source is not None:
+                _merge_snapshot(counters, histograms, source)
+        _write_snapshot(archive_path, {
+            'counters': [[n, list(map(list, k)), v] for (n, k), v in counters.items()],
+            'histograms': [[n, list(map(list, k)), v] for (n, k), v in histograms.items()],
+        })
+        # 先写归档再删除，导出时可能短暂重复计入，但不会丢失
+        os.remove(path)
+
+    def collect(self):
+        """合并所有进程的快照（含已退出进程的归档快照）"""
+        self.flush(force=True)
+        counters, histograms = {}, {}
+        for name in os.listdir(self.directory):
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            snapshot = _read_snapshot(os.path.join(self.directory, name))
+            if snapshot is not None:
+                _merge_snapshot(counters, histograms, snapshot)
+        return counters, histograms
+
+    def render(self):
+        """生成 Prometheus 文本格式"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRIC_DEFINITIONS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            else:
+                for (metric, labels), values in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(buckets, values):
+                        lines.append(f'{name}_bucket{_format_labels(labels, [("le", _format_value(float(bound)))])} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {values[-1]}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(values[-2])}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _read_snapshot(path):
+    """读取快照文件，不存在或不完整时返回 None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    # 原子替换，读取方不会看到写了一半的文件
+    os.replace(tmp_path, path)
+
+
+def _merge_snapshot(counters, histograms, snapshot):
+    """把快照累加到 counters / histograms：键为 (指标名, 标签元组)"""
+    for metric, labels, value in snapshot.get('counters', []):
+        key = (metric, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for metric, labels, values in snapshot.get('histograms', []):
+        key = (metric, tuple(map(tuple, labels)))
+        merged = histograms.get(key)
+        if merged is None:
+            histograms[key] = list(values)
+        else:
+            for i, v in enumerate(values):
+                merged[i] += v
+
+
+def after_response(response, callback):
+    """响应发送完毕后调用 callback
+
+    流式响应体中的查询在视图返回后才执行，包装响应体，结束（或被关闭）后再调用；
+    文件响应（direct_passthrough）原样发送，其中没有查询，和普通响应一样立即调用。
+    事件流（text/event-stream）是长连接，其中的轮询不属于某一次请求，只统计到建立连接为止。
+    """
+    if response.is_streamed and not response.direct_passthrough and response.mimetype != 'text/event-stream':
+        response.response = _call_after(response.response, callback)
+    else:
+        callback()
+
+
+def _call_after(chunks, callback):
+    """逐块转发流式响应体，结束（或被关闭）后调用 callback"""
+    try:
+        yield from chunks
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+        callback()
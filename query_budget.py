@@ -0,0 +1,97 @@
+"""SQL 语句预算
+
+用 @query_budget(n) 为路由声明单个请求最多允许执行的 SQL 语句数。
+测试模式（TESTING 或 QUERY_BUDGET_ENFORCE）下超出预算直接抛出 QueryBudgetExceeded，
+并列出本次请求执行过的全部语句，便于定位逐行查询（N+1）的回归；
+其他情况下只记录到 dyf_query_budget_exceeded_total 指标。
+
+流式响应（如 stream_json）在视图返回后才边发送边执行查询，计数保存在 request.environ 中
+（stream_with_context 会推入新的应用上下文，g 不再是同一个），到响应体结束时再结算。
+"""
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+from metrics import after_response
+
+# request.environ 中的计数：[语句数, 语句列表（不校验时为 None）]
+_STATE_KEY = 'dyf.query_budget'
+
+
+class QueryBudgetExceeded(AssertionError):
+    """请求执行的 SQL 语句数超过了路由声明的预算"""
+
+    def __init__(self, endpoint, budget, statements):
+        self.endpoint = endpoint
+        self.budget = budget
+        self.statements = statements
+        listing = '\n'.join(f'  {i}. {s}' for i, s in enumerate(statements, 1))
+        super().__init__(
+            f'{endpoint} 执行了 {len(statements)} 条 SQL，超出预算 {budget} 条：\n{listing}')
+
+
+def query_budget(max_queries):
+    """声明路由的 SQL 语句预算，需放在 @app.route 之下"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+class QueryBudget:
+    """按请求统计 SQL 语句并校验路由预算"""
+
+    def __init__(self, app=None, db=None):
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.extensions['query_budget'] = self
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+    def budgets(self, app):
+        """已声明预算的路由：endpoint -> 语句数上限"""
+        return {
+            endpoint: view.query_budget
+            for endpoint, view in app.view_functions.items()
+            if hasattr(view, 'query_budget')
+        }
+
+    @staticmethod
+    def _enforcing():
+        return current_app.config.get('QUERY_BUDGET_ENFORCE', current_app.testing)
+
+    def _before_request(self):
+        request.environ[_STATE_KEY] = [0, [] if self._enforcing() else None]
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context():
+            return
+        state = request.environ.get(_STATE_KEY)
+        if state is None:
+            return
+        state[0] += 1
+        if state[1] is not None:
+            state[1].append(' '.join(statement.split()))
+
+    def _after_request(self, response):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        environ = request.environ
+        endpoint = request.endpoint
+        metrics = current_app.extensions.get('metrics')
+
+        def settle():
+            count, statements = environ.pop(_STATE_KEY, (0, None))
+            if budget is None or count <= budget:
+                return
+            if statements is not None:
+                raise QueryBudgetExceeded(endpoint, budget, statements)
+            if metrics is not None:
+                metrics.inc('dyf_query_budget_exceeded_total', route=endpoint)
+
+        after_response(response, settle)
+        return response
+
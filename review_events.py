@@ -0,0 +1,94 @@
+"""审核队列事件推送（Server-Sent Events）
+
+申请的提交、修改、撤回和审核在同一事务中写入 review_event 表，表的自增 id 即事件序号。
+事务提交后唤醒本进程中等待的推送流，推送流随即读取新事件；其他 worker 写入的事件
+由推送流按 REVIEW_EVENTS_POLL_SECONDS 轮询事件表取得。客户端断线重连时通过
+Last-Event-ID 从上次收到的序号继续，不会丢事件。
+"""
+import json
+import threading
+import time
+
+from sqlalchemy import event
+
+
+def format_event(event_id, name, data):
+    """编码一条 SSE 消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f'id: {event_id}\nevent: {name}\ndata: {payload}\n\n'
+
+
+class ReviewEventBus:
+    """进程内的事件通知，按 Flask 扩展的方式挂载到应用上"""
+
+    def __init__(self, app=None, db=None):
+        self._condition = threading.Condition()
+        self._generation = 0
+        self.poll_seconds = 2.0
+        self.heartbeat_seconds = 15.0
+        self.stream_seconds = 300.0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('REVIEW_EVENTS_POLL_SECONDS', 2.0)
+        app.config.setdefault('REVIEW_EVENTS_HEARTBEAT_SECONDS', 15.0)
+        # 单个连接的最长时间，到期后由客户端带 Last-Event-ID 自动重连，避免长期占用 worker 线程
+        app.config.setdefault('REVIEW_EVENTS_STREAM_SECONDS', 300.0)
+        self.poll_seconds = app.config['REVIEW_EVENTS_POLL_SECONDS']
+        self.heartbeat_seconds = app.config['REVIEW_EVENTS_HEARTBEAT_SECONDS']
+        self.stream_seconds = app.config['REVIEW_EVENTS_STREAM_SECONDS']
+
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['review_events'] = self
+
+    # ---------- 发布 ----------
+    @staticmethod
+    def mark(session):
+        """标记当前事务写入了事件，提交后通知推送流"""
+        session.info['review_event_pending'] = True
+
+    def _after_commit(self, session):
+        if session.info.pop('review_event_pending', False):
+            self.notify()
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop('review_event_pending', None)
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """等待新的通知或超时，返回最新的通知代数"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    # ---------- 订阅 ----------
+    def stream(self, fetch, last_id):
+        """推送流生成器
+
+        Args:
+            fetch: fetch(last_id) -> [(事件序号, 事件名, 数据), ...]，按序号升序
+            last_id: 只推送序号大于它的事件
+        """
+        started = last_beat = time.monotonic()
+        yield f'retry: 3000\nid: {last_id}\nevent: ready\ndata: {{}}\n\n'
+        while time.monotonic() - started < self.stream_seconds:
+            # 先取通知代数再查询，查询期间的提交会让下面的等待立即返回
+            generation = self._generation
+            events = fetch(last_id)
+            for event_id, name, data in events:
+                yield format_event(event_id, name, data)
+                last_id = event_id
+            if events:
+                last_beat = time.monotonic()
+                continue
+            self.wait(generation, self.poll_seconds)
+            if time.monotonic() - last_beat >= self.heartbeat_seconds:
+                last_beat = time.monotonic()
+                yield ': keepalive\n\n'
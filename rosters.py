@@ -0,0 +1,103 @@
+"""成员名单的流式解析
+
+CSV 用标准库逐行读取，xlsx 用 openpyxl 的只读模式逐行读取，都不把整张表载入内存，
+也不需要导入 pandas；只有旧版 .xls 仍经由 spreadsheets（pandas）读取。
+"""
+import codecs
+import csv
+import itertools
+import math
+
+# 成员名单必需列
+ROSTER_REQUIRED_COLUMNS = ('学号', '姓名', '分值')
+ROSTER_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+class RosterError(ValueError):
+    """名单无法解析（格式不支持或缺少必需列）"""
+
+
+def _cell_text(value):
+    """单元格转文本：整数值的浮点数（Excel 中的学号）去掉小数部分"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def parse_score(value):
+    """分值转整数，无法转换时返回 None"""
+    if isinstance(value, str):
+        value = value.strip()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) or math.isinf(value) else int(value)
+
+
+def _header_positions(header):
+    header = [_cell_text(name) for name in header]
+    for name in ROSTER_REQUIRED_COLUMNS:
+        if name not in header:
+            raise RosterError(f'成员名单缺少必需列: {name}')
+    return [header.index(name) for name in ROSTER_REQUIRED_COLUMNS]
+
+
+def _iter_table(rows):
+    """rows 的第一行为表头，逐行产出 (行号, 学号, 姓名, 分值原始值)，跳过空行"""
+    rows = iter(rows)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise RosterError('成员名单为空')
+    positions = _header_positions(header)
+    for row_number, row in enumerate(rows, start=2):
+        values = [row[i] if i < len(row) else None for i in positions]
+        if all(_cell_text(value) == '' for value in values):
+            continue
+        student_id, name, raw_score = values
+        yield row_number, _cell_text(student_id), _cell_text(name), raw_score
+
+
+def _iter_csv(file):
+    # utf-8-sig 兼容 Excel 另存的带 BOM 的 CSV
+    reader = codecs.getreader('utf-8-sig')(file)
+    return _iter_table(csv.reader(reader))
+
+
+def _iter_xlsx(file):
+    import openpyxl
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from _iter_table(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def _iter_xls(file):
+    # 旧版 .xls 仍需 pandas，整表读入
+    import spreadsheets
+    df = spreadsheets.read_roster(file, '.xls')
+    columns = list(df.columns)
+    yield from _iter_table(itertools.chain([columns], df.itertuples(index=False, name=None)))
+
+
+def iter_roster(file, file_extension):
+    """按扩展名流式读取名单，逐行产出 (行号, 学号, 姓名, 分值原始值)
+
+    Raises:
+        RosterError: 格式不支持或缺少必需列
+    """
+    if file_extension == '.csv':
+        return _iter_csv(file)
+    if file_extension == '.xlsx':
+        return _iter_xlsx(file)
+    if file_extension == '.xls':
+        return _iter_xls(file)
+    raise RosterError('不支持的成员名单文件格式，请上传Excel或CSV文件')
@@ -0,0 +1,84 @@
+"""统计立方体的增量刷新标记
+
+统计页按 (学年, 书院, 年级, 班级) 预先汇总的学生数、总分均值和中位数、各主类别均分及达到上限的比例
+保存在 score_cube 表（逐级汇总到年级、书院、全校），每名学生每学年的最终分数保存在 student_year_score 表。
+需要重算的 (学生, 学年) 由触发器在写入的同一事务中记入 score_cube_dirty：
+德育分记录增删改（含批量审核、归档移动）、学生改书院/年级/班级、学年默认规则变化。
+读取立方体前只重算这些学生和他们所在的单元格（见 app.py 的 refresh_score_cube）。
+
+标记表的 version 每次标记递增；刷新只删除读取时版本未变的标记，刷新期间的新写入会留到下一次。
+"""
+from sqlalchemy import text
+
+DIRTY_TABLE = 'score_cube_dirty'
+
+_MARK = (
+    'INSERT INTO score_cube_dirty(user_id, academic_year, version) {rows} '
+    'ON CONFLICT(user_id, academic_year) DO UPDATE SET version = version + 1;'
+)
+
+# 每项为一条语句，触发器体内的分号不作为语句分隔
+_DDL = (
+    """CREATE TABLE IF NOT EXISTS score_cube_dirty (
+        user_id INTEGER NOT NULL,
+        academic_year VARCHAR(20) NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (user_id, academic_year)
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS score_record_cube_insert AFTER INSERT ON score_record
+    WHEN new.academic_year IS NOT NULL BEGIN
+        """ + _MARK.format(rows='VALUES (new.user_id, new.academic_year, 1)') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS score_record_cube_delete AFTER DELETE ON score_record
+    WHEN old.academic_year IS NOT NULL BEGIN
+        """ + _MARK.format(rows='VALUES (old.user_id, old.academic_year, 1)') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS score_record_cube_update AFTER UPDATE ON score_record BEGIN
+        """ + _MARK.format(rows='SELECT old.user_id, old.academic_year, 1 WHERE old.academic_year IS NOT NULL') + """
+        """ + _MARK.format(rows='SELECT new.user_id, new.academic_year, 1 WHERE new.academic_year IS NOT NULL') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS user_cube_update AFTER UPDATE OF college, grade, class_name ON "user" BEGIN
+        """ + _MARK.format(rows='SELECT user_id, academic_year, 1 FROM student_year_score WHERE user_id = new.id') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS scoring_rule_cube_insert AFTER INSERT ON scoring_rule
+    WHEN new.rule_set = 'default' BEGIN
+        """ + _MARK.format(rows='SELECT user_id, academic_year, 1 FROM student_year_score '
+                                'WHERE academic_year = new.academic_year') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS scoring_rule_cube_update AFTER UPDATE ON scoring_rule
+    WHEN old.rule_set = 'default' OR new.rule_set = 'default' BEGIN
+        """ + _MARK.format(rows='SELECT user_id, academic_year, 1 FROM student_year_score '
+                                "WHERE academic_year IN (old.academic_year, new.academic_year)") + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS scoring_rule_cube_delete AFTER DELETE ON scoring_rule
+    WHEN old.rule_set = 'default' BEGIN
+        """ + _MARK.format(rows='SELECT user_id, academic_year, 1 FROM student_year_score '
+                                'WHERE academic_year = old.academic_year') + """
+    END""",
+)
+
+
+def ensure_score_cube(connection, schemas):
+    """创建标记表和触发器；标记表是新建的时，把 schemas 各库中已有记录的 (学生, 学年) 全部标记一次
+
+    Returns:
+        是否新建了标记表
+    """
+    created = connection.execute(text(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': DIRTY_TABLE}).scalar() == 0
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+    if created:
+        for schema in schemas:
+            mark_all(connection, schema)
+    return created
+
+
+def mark_all(connection, schema, academic_year=None):
+    """标记 schema 库中某学年（默认全部学年）有记录的学生以及立方体中已有的学生，用于首次建立或整体重建"""
+    condition = 'academic_year IS NOT NULL' if academic_year is None else 'academic_year = :year'
+    connection.execute(text(_MARK.format(
+        rows=f'SELECT user_id, academic_year, 1 FROM {schema}.score_record WHERE {condition} '
+             f'UNION SELECT user_id, academic_year, 1 FROM student_year_score WHERE {condition}'
+    ).rstrip(';')), {'year': academic_year})
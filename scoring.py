@@ -0,0 +1,166 @@
+"""德育分计算规则与批量重算
+
+规则按学年保存在数据库（ScoringRule），加载时编译为以整数 category_id 为键的紧凑查找表
+（CompiledRules），计分循环里只做整数索引。编译结果是纯数据（可 pickle），计算函数不依赖
+Flask 应用和数据库，因此可以直接交给进程池并行执行。
+"""
+# 主类别的聚合方式
+MODE_SUM = 'sum'   # 子类别分别应用子类别上限后累加
+MODE_MAX = 'max'   # 只取最高 1 项，不累加
+SCORE_MODES = (MODE_SUM, MODE_MAX)
+
+
+class CompiledRules:
+    """编译后的计分规则
+
+    main_names[i]、caps[i]、is_max[i] 描述第 i 个主类别；main_of 把任意类别 id（主类别或子类别）
+    映射到主类别下标；sub_caps 为有独立上限的子类别 id -> 上限。
+    不属于任何主类别的记录（如 category_id 为空的初始德育分）累加后按 default_cap 计入总分。
+    """
+    __slots__ = ('main_names', 'caps', 'is_max', 'main_of', 'sub_caps', 'default_cap', 'total_min', 'total_max')
+
+    def __init__(self, main_names, caps, is_max, main_of, sub_caps, default_cap=100, total_min=0, total_max=100):
+        self.main_names = main_names
+        self.caps = caps
+        self.is_max = is_max
+        self.main_of = main_of
+        self.sub_caps = sub_caps
+        self.default_cap = default_cap
+        self.total_min = total_min
+        self.total_max = total_max
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def cap_of(self, main_name, default=100):
+        """主类别名称对应的上限"""
+        for i, name in enumerate(self.main_names):
+            if name == main_name:
+                return self.caps[i]
+        return default
+
+
+def rules_from_names(categories, category_caps, subcategory_caps, max_only):
+    """把按名称配置的上限（如 CATEGORY_MAX_LIMITS）转换为按类别 id 的规则行
+
+    Args:
+        categories: [(id, parent_id, name), ...]
+        category_caps: 主类别名称 -> 上限
+        subcategory_caps: 子类别名称 -> 上限
+        max_only: 只取最高 1 项的主类别名称
+
+    Returns:
+        [(主类别 id, 上限, 聚合方式, {子类别 id: 上限}), ...]
+    """
+    children = {}
+    for category_id, parent_id, name in categories:
+        if parent_id is not None and name in subcategory_caps:
+            children.setdefault(parent_id, {})[category_id] = subcategory_caps[name]
+    rules = []
+    for category_id, parent_id, name in categories:
+        if parent_id is None and name in category_caps:
+            mode = MODE_MAX if name in max_only else MODE_SUM
+            rules.append((category_id, category_caps[name], mode, children.get(category_id, {})))
+    return rules
+
+
+def compile_rules(categories, rules, default_cap=100, total_min=0, total_max=100):
+    """把类别树和规则行编译为 CompiledRules
+
+    Args:
+        categories: [(id, parent_id, name), ...]
+        rules: [(主类别 id, 上限, 聚合方式, {子类别 id: 上限}), ...]；没有规则的主类别按 default_cap 累加
+    """
+    rules_by_main = {rule[0]: rule for rule in rules}
+    main_names, caps, is_max = [], [], []
+    index_of = {}
+    for category_id, parent_id, name in categories:
+        if parent_id is None:
+            rule = rules_by_main.get(category_id)
+            index_of[category_id] = len(main_names)
+            main_names.append(name)
+            caps.append(rule[1] if rule else default_cap)
+            is_max.append(bool(rule) and rule[2] == MODE_MAX)
+
+    main_of = {}
+    sub_caps = {}
+    for category_id, parent_id, _ in categories:
+        main_id = category_id if parent_id is None else parent_id
+        if main_id in index_of:
+            main_of[category_id] = index_of[main_id]
+    for main_id, _, _, subcategory_caps in rules:
+        for sub_id, cap in subcategory_caps.items():
+            sub_caps[int(sub_id)] = cap
+    return CompiledRules(main_names, caps, is_max, main_of, sub_caps, default_cap, total_min, total_max)
+
+
+def score_records(rules, records):
+    """按编译后的规则计算一名学生一个学年的分数
+
+    Args:
+        rules: CompiledRules
+        records: [(category_id, 分值), ...]
+
+    Returns:
+        (主类别名称 -> 最终分数（只含有记录的主类别）, 总分)
+    """
+    main_of = rules.main_of
+    is_max = rules.is_max
+    sub_caps = rules.sub_caps
+    count = len(rules.main_names)
+    sums = [0] * count
+    present = [False] * count
+    capped_subtotals = {}
+    uncategorized = None
+    for category_id, score in records:
+        i = main_of.get(category_id)
+        if i is None:
+            uncategorized = (uncategorized or 0) + score
+            continue
+        if not present[i]:
+            present[i] = True
+            if is_max[i]:
+                sums[i] = score
+                continue
+        if is_max[i]:
+            if score > sums[i]:
+                sums[i] = score
+        elif category_id in sub_caps:
+            capped_subtotals[category_id] = capped_subtotals.get(category_id, 0) + score
+        else:
+            sums[i] += score
+    for category_id, subtotal in capped_subtotals.items():
+        sums[main_of[category_id]] += min(subtotal, sub_caps[category_id])
+
+    category_scores = {}
+    total = 0
+    caps = rules.caps
+    for i in range(count):
+        if present[i]:
+            final = min(sums[i], caps[i])
+            category_scores[rules.main_names[i]] = final
+            total += final
+    if uncategorized is not None:
+        total += min(uncategorized, rules.default_cap)
+    return category_scores, max(rules.total_min, min(rules.total_max, total))
+
+
+def rescore_chunk(target_rules, baseline_rules, students):
+    """进程池任务：按目标规则和基准规则分别计算一批学生
+
+    Args:
+        students: [(user_id, [(category_id, 分值), ...]), ...]
+
+    Returns:
+        [(user_id, 目标各类别分数, 目标总分, 基准总分), ...]
+    """
+    results = []
+    for user_id, records in students:
+        category_scores, total = score_records(target_rules, records)
+        _, baseline_total = score_records(baseline_rules, records)
+        results.append((user_id, category_scores, total, baseline_total))
+    return results
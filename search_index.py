@@ -0,0 +1,91 @@
+"""申请标题和说明的全文索引（SQLite FTS5）
+
+个人申请和集体申请各有一张外部内容（external content）FTS5 表，rowid 即申请 id，文本不重复存储。
+索引由源表上的触发器在同一事务中维护，应用代码无需关心。分词器为 trigram，
+中文无需分词即可按任意 3 个及以上字符的片段检索；更短的关键词改用 LIKE 检索。
+主库和归档库各有一套同名的索引表和触发器，申请移到归档库时随触发器从一边的索引删除、加入另一边。
+"""
+from sqlalchemy import column, func, literal_column, table, text
+
+# (索引表, 源表)
+SEARCH_TABLES = (
+    ('application_search', 'score_application'),
+    ('group_application_search', 'group_application'),
+)
+
+# trigram 分词器能检索的最短关键词
+MIN_MATCH_LENGTH = 3
+
+# bm25 中标题的权重高于说明
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# 每项为一条语句，触发器体内的分号不作为语句分隔；触发器体中的表与触发器在同一个库
+_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.{index} USING fts5(
+        title, description, content='{source}', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS {schema}.{index}_insert AFTER INSERT ON {source} BEGIN
+        INSERT INTO {index}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {schema}.{index}_delete AFTER DELETE ON {source} BEGIN
+        INSERT INTO {index}({index}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {schema}.{index}_update AFTER UPDATE OF title, description ON {source} BEGIN
+        INSERT INTO {index}({index}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {index}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+)
+
+
+def search_table(name, schema=None):
+    """FTS5 表的轻量 Core 表对象，用于在查询中连接；schema 为空时为主库的表
+
+    MATCH 和 bm25 以不带库名的表名引用索引，同一个 SELECT 中只能连接一张同名索引表。
+    """
+    return table(name, column('rowid'), column('title'), column('description'), schema=schema)
+
+
+def ensure_search_index(connection, schemas):
+    """在 schemas 各库中创建索引表和触发器；索引与源表行数不一致时（如源表被重建或直接导入过数据）重建索引
+
+    Returns:
+        重建过的索引表名列表（库名.表名）
+    """
+    rebuilt = []
+    for schema in schemas:
+        for index, source in SEARCH_TABLES:
+            for statement in _DDL:
+                connection.exec_driver_sql(statement.format(schema=schema, index=index, source=source))
+            indexed = connection.execute(text(f'SELECT count(*) FROM {schema}.{index}_docsize')).scalar()
+            total = connection.execute(text(f'SELECT count(*) FROM {schema}.{source}')).scalar()
+            if indexed != total:
+                rebuild_search_index(connection, schema, index)
+                rebuilt.append(f'{schema}.{index}')
+    return rebuilt
+
+
+def rebuild_search_index(connection, schema, index):
+    """按源表内容重建索引"""
+    connection.exec_driver_sql(f"INSERT INTO {schema}.{index}({index}) VALUES ('rebuild')")
+
+
+def match_expression(keywords):
+    """把关键词列表转换为 FTS5 查询：每个关键词作为短语，全部匹配"""
+    return ' '.join('"' + keyword.replace('"', '""') + '"' for keyword in keywords)
+
+
+def split_keywords(query):
+    """按空白拆分关键词；全部关键词都不短于 MIN_MATCH_LENGTH 时才能使用 MATCH"""
+    keywords = query.split()
+    return keywords, bool(keywords) and all(len(keyword) >= MIN_MATCH_LENGTH for keyword in keywords)
+
+
+def match_clause(index, keywords):
+    """WHERE 条件：索引表匹配全部关键词"""
+    return literal_column(index).op('MATCH')(match_expression(keywords))
+
+
+def rank_column(index):
+    """bm25 相关度，越小越相关"""
+    return func.bm25(literal_column(index), TITLE_WEIGHT, DESCRIPTION_WEIGHT)
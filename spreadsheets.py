@@ -0,0 +1,59 @@
+"""表格导入导出（依赖 pandas / openpyxl / xlsxwriter）
+
+pandas 导入耗时且常驻内存较大，而绝大多数请求只读写 JSON，因此 app.py 不在顶层
+导入本模块，只在读取旧版 .xls 名单或生成 Excel 时按需加载。
+render_workbook 只依赖本模块，可以在进程池的子进程中执行。
+"""
+import io
+import re
+
+import pandas as pd
+
+
+def read_roster(file, file_extension):
+    """读取成员名单（Excel 或 CSV），不支持的格式返回 None
+
+    名单解析由 rosters.py 流式完成，这里只作为旧版 .xls 的整表读取回退。
+    """
+    if file_extension in ['.xlsx', '.xls']:
+        return pd.read_excel(file)
+    if file_extension == '.csv':
+        return pd.read_csv(file)
+    return None
+
+
+def to_xlsx(rows, sheet_name):
+    """把字典列表写成单工作表的 xlsx，返回已定位到开头的缓冲区"""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
+        pd.DataFrame(rows).to_excel(writer, index=False, sheet_name=sheet_name)
+    buf.seek(0)
+    return buf
+
+
+# Excel 工作表名称的长度上限和不允许的字符
+SHEET_NAME_MAX_LENGTH = 31
+_SHEET_NAME_INVALID = re.compile(r'[\[\]:*?/\\]')
+
+
+def sheet_title(name, used):
+    """合法且在 used 中未出现过的工作表名称（重名时加序号），并加入 used"""
+    base = _SHEET_NAME_INVALID.sub('_', name).strip("'") or 'Sheet'
+    title = base[:SHEET_NAME_MAX_LENGTH]
+    n = 1
+    while title.lower() in used:
+        n += 1
+        suffix = f'({n})'
+        title = base[:SHEET_NAME_MAX_LENGTH - len(suffix)] + suffix
+    used.add(title.lower())
+    return title
+
+
+def render_workbook(sheets, columns):
+    """把 [(工作表名称, 字典列表), ...] 写成多工作表的 xlsx，返回字节串（可跨进程传回）"""
+    buf = io.BytesIO()
+    used = set()
+    with pd.ExcelWriter(buf, engine='xlsxwriter') as writer:
+        for name, rows in sheets:
+            pd.DataFrame(rows, columns=columns).to_excel(writer, index=False, sheet_name=sheet_title(name, used))
+    return buf.getvalue()
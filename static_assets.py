@@ -0,0 +1,123 @@
+"""静态资源的内容指纹与预压缩
+
+url_for('static', filename=...) 自动附加文件内容哈希参数 v。带当前哈希的请求按一年 immutable 缓存，
+浏览器不再逐页重新验证；文件内容变化后 URL 随之变化，旧缓存自然失效。
+部署时执行 flask compress-static 在原文件旁生成 .br / .gz 副本，请求时按 Accept-Encoding
+直接发送副本，不在请求中压缩。副本比原文件旧（原文件已更新但未重新生成）时不使用。
+"""
+import hashlib
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+import compression
+
+# 带内容哈希的 URL 的缓存时间
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# 需要预压缩的文件类型（图片、字体等本身已压缩）
+PRECOMPRESS_SUFFIXES = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+# 预压缩副本的扩展名
+VARIANT_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+# 预压缩使用最高压缩级别
+PRECOMPRESS_LEVELS = {'br': 11, 'gzip': 9}
+
+
+class StaticAssets:
+    """按 Flask 扩展的方式挂载到应用上，接管 static 端点"""
+
+    def __init__(self, app=None):
+        self.folder = None
+        # 文件名 -> (修改时间, 大小, 哈希)
+        self._fingerprints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.static_folder
+        app.url_defaults(self._url_defaults)
+        app.view_functions['static'] = self.send_static
+        app.extensions['static_assets'] = self
+
+    def fingerprint(self, filename):
+        """文件内容 SHA-256 的前 12 位，按修改时间和大小缓存；文件不存在时返回 None"""
+        path = safe_join(self.folder, filename)
+        try:
+            stat = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        cached = self._fingerprints.get(filename)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        value = digest.hexdigest()[:12]
+        self._fingerprints[filename] = (stat.st_mtime_ns, stat.st_size, value)
+        return value
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = self.fingerprint(values['filename'])
+            if version:
+                values['v'] = version
+
+    def _variant(self, filename):
+        """客户端接受且不比原文件旧的预压缩副本：(编码, 副本文件名)，没有时返回 (None, filename)"""
+        path = safe_join(self.folder, filename)
+        if path is None or not os.path.isfile(path):
+            return None, filename
+        mtime = os.stat(path).st_mtime_ns
+        for encoding in compression.ENCODINGS:
+            variant = filename + VARIANT_SUFFIXES[encoding]
+            variant_path = path + VARIANT_SUFFIXES[encoding]
+            if (request.accept_encodings[encoding] and os.path.isfile(variant_path)
+                    and os.stat(variant_path).st_mtime_ns >= mtime):
+                return encoding, variant
+        return None, filename
+
+    def send_static(self, filename):
+        encoding, served = self._variant(filename)
+        immutable = request.args.get('v') is not None and request.args['v'] == self.fingerprint(filename)
+        response = send_from_directory(
+            self.folder, served,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            max_age=IMMUTABLE_MAX_AGE if immutable else None
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if filename.endswith(PRECOMPRESS_SUFFIXES):
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.cache_control.immutable = True
+        return response
+
+    def precompress(self):
+        """为静态目录下的文本文件生成预压缩副本，只保留比原文件小的
+
+        Returns:
+            [(文件名, [生成的编码, ...]), ...]
+        """
+        written = []
+        for root, _, files in os.walk(self.folder):
+            for name in sorted(files):
+                if not name.endswith(PRECOMPRESS_SUFFIXES):
+                    continue
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    data = f.read()
+                encodings = []
+                for encoding in compression.ENCODINGS:
+                    variant_path = path + VARIANT_SUFFIXES[encoding]
+                    compressed = compression.compress(data, encoding, PRECOMPRESS_LEVELS[encoding])
+                    if len(compressed) >= len(data):
+                        if os.path.exists(variant_path):
+                            os.remove(variant_path)
+                        continue
+                    with open(variant_path, 'wb') as f:
+                        f.write(compressed)
+                    encodings.append(encoding)
+                written.append((os.path.relpath(path, self.folder), encodings))
+        return written
@@ -0,0 +1,48 @@
+"""学生个人数据的版本号
+
+score_record 和 score_application 上的触发器在写入的同一事务中为受影响的学生递增版本号，
+逐条写入、批量审核、归档移动以及直接修改数据库都会覆盖到，应用代码无需关心。
+学生首页的 ETag 由该版本号和共享表的版本戳组成，学生自己的数据没有变化时直接返回 304。
+"""
+from sqlalchemy import text
+
+VERSION_TABLE = 'student_data_version'
+SOURCE_TABLES = ('score_record', 'score_application')
+
+_BUMP = (
+    'INSERT INTO student_data_version(user_id, version) VALUES ({row}.user_id, 1) '
+    'ON CONFLICT(user_id) DO UPDATE SET version = version + 1;'
+)
+
+# 每项为一条语句，触发器体内的分号不作为语句分隔
+_DDL = (
+    """CREATE TRIGGER IF NOT EXISTS {source}_version_insert AFTER INSERT ON {source} BEGIN
+        """ + _BUMP.format(row='new') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {source}_version_delete AFTER DELETE ON {source} BEGIN
+        """ + _BUMP.format(row='old') + """
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS {source}_version_update AFTER UPDATE ON {source} BEGIN
+        """ + _BUMP.format(row='old') + """
+        """ + _BUMP.format(row='new') + """
+    END""",
+)
+
+
+def ensure_student_versions(connection):
+    """创建版本表和触发器（已存在的跳过）"""
+    connection.exec_driver_sql(
+        f'CREATE TABLE IF NOT EXISTS {VERSION_TABLE} '
+        '(user_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)'
+    )
+    for source in SOURCE_TABLES:
+        for statement in _DDL:
+            connection.exec_driver_sql(statement.format(source=source))
+
+
+def student_version(session, user_id):
+    """学生数据的版本号，从未写入过时为 0"""
+    version = session.execute(
+        text(f'SELECT version FROM {VERSION_TABLE} WHERE user_id = :user_id'), {'user_id': user_id}
+    ).scalar()
+    return version or 0
@@ -0,0 +1,128 @@
+import os
+import random
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as dyf  # noqa: E402
+
+YEARS = ('2024-2025', '2025-2026')
+# 所有测试用户共用一个密码散列，避免每次建库重复计算
+PASSWORD_HASH = dyf.generate_password_hash('x')
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    instance = tmp_path_factory.mktemp('instance')
+    dyf.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(instance / 'moral_score.db'),
+        'ARCHIVE_DATABASE': str(instance / 'archive.db'),
+        'METRICS_DIR': str(instance / 'metrics'),
+        'TABLE_VERSIONS_DIR': str(instance / 'versions'),
+        'UPLOAD_FOLDER': str(instance / 'uploads'),
+    })
+    return dyf.app
+
+
+def _database_files(app):
+    return app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):], app.config['ARCHIVE_DATABASE']
+
+
+def _release_connections(app):
+    with app.app_context():
+        dyf.db.session.remove()
+        dyf.db.engine.dispose()
+
+
+@pytest.fixture(scope='session')
+def seed_files(app, tmp_path_factory):
+    """建库并写入种子数据一次，保存数据库文件副本"""
+    for path in _database_files(app):
+        if os.path.exists(path):
+            os.remove(path)
+    dyf.init_db()
+    with app.app_context():
+        db = dyf.db
+        admin = dyf.User(username='admin', name='管理员', role='admin', password_hash=PASSWORD_HASH)
+        teacher = dyf.User(username='t1', name='老师', role='teacher', employee_id='T1', password_hash=PASSWORD_HASH)
+        db.session.add_all([admin, teacher])
+        for i in range(30):
+            db.session.add(dyf.User(
+                username=f's{i}', name=f'学生{i}', role='student', student_id=f'2023{i:04d}',
+                class_name=f'{i % 3 + 1}班', college='A书院' if i % 2 else 'B书院', grade='2023',
+                password_hash=PASSWORD_HASH))
+        db.session.add(dyf.AcademicYear(year_name=YEARS[0], is_current=False))
+        db.session.add(dyf.AcademicYear(year_name=YEARS[1], is_current=True))
+        db.session.flush()
+
+        for main in dyf.ALL_MAIN_CATEGORIES:
+            parent = dyf.ScoreCategory(name=main, max_score=dyf.CATEGORY_MAX_LIMITS.get(main, 100))
+            db.session.add(parent)
+            db.session.flush()
+            children = set(dyf.TEACHER_ALLOWED_CHILDREN.get(main, [])) | set(dyf.STUDENT_ALLOWED_CHILDREN.get(main, []))
+            for name in sorted(children):
+                db.session.add(dyf.ScoreCategory(name=name, parent_id=parent.id, max_score=10))
+        db.session.flush()
+
+        rng = random.Random(1)
+        subcategories = dyf.ScoreCategory.query.filter(dyf.ScoreCategory.parent_id.isnot(None)).all()
+        students = dyf.User.query.filter_by(role='student').order_by(dyf.User.id).all()
+        for student in students:
+            for category in rng.sample(subcategories, 5):
+                for year in YEARS:
+                    db.session.add(dyf.ScoreRecord(
+                        user_id=student.id, category_id=category.id, score=rng.randint(-1, 4),
+                        source='个人申请', description='x', academic_year=year))
+            db.session.add(dyf.ScoreApplication(
+                user_id=student.id, category_id=subcategories[0].id, title='校运会', description='校运会 100米',
+                score=1, evidence='a.pdf', academic_year=YEARS[1]))
+        group = dyf.GroupApplication(
+            teacher_user_id=teacher.id, category_id=subcategories[1].id, title='竞赛', description='程序设计竞赛',
+            evidence='b.pdf', academic_year=YEARS[1])
+        db.session.add(group)
+        db.session.flush()
+        for student in students[:10]:
+            db.session.add(dyf.GroupApplicationMember(group_application_id=group.id, student_user_id=student.id, score=2))
+        db.session.commit()
+        # init_db 时还没有学年，按刚写入的类别补写计分规则
+        for year in YEARS:
+            dyf.ensure_year_rules(year)
+        db.session.commit()
+
+
+
+    _release_connections(app)
+    saved = tmp_path_factory.mktemp('seed')
+    copies = []
+    for path in _database_files(app):
+        copies.append((str(saved / os.path.basename(path)), path))
+        shutil.copyfile(path, copies[-1][0])
+    return copies
+
+
+@pytest.fixture
+def seeded(app, seed_files):
+    """每个测试从种子数据的副本开始：30 名学生，两个学年各有记录，当前学年有待审核的申请"""
+    _release_connections(app)
+    for saved, path in seed_files:
+        shutil.copyfile(saved, path)
+    with app.app_context():
+        # 数据库被整体替换，让按版本戳缓存的内容全部失效
+        dyf.table_versions.bump(*dyf.VERSIONED_TABLES, 'archived_year')
+    dyf.invalidate_scoring_rules()
+    return app
+
+
+def login(app, role, username=None):
+    """以指定角色（或指定用户名）登录的测试客户端"""
+    client = app.test_client()
+    with app.app_context():
+        query = dyf.User.query.filter_by(username=username) if username else dyf.User.query.filter_by(role=role)
+        user = query.order_by(dyf.User.id).first().to_dict()
+    with client.session_transaction() as session:
+        session['user'] = user
+    return client
@@ -0,0 +1,130 @@
+import csv
+import io
+
+import app as dyf
+from conftest import YEARS, login
+
+
+def _export_rows(client, query=''):
+    response = client.get(f'/api/scores/export?format=csv{query}')
+    assert response.status_code == 200
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True).lstrip('﻿'))))
+
+
+def _archive_cli(app, *args):
+    # flask 命令行会推入应用上下文，直接调用 app.cli 时需自行推入
+    with app.app_context():
+        return app.test_cli_runner().invoke(args=['archive', *args])
+
+
+def _add_old_year_record(app):
+    """给归档学年补一条记录，使该学年持有主库中最大的 id"""
+    with app.app_context():
+        record = dyf.ScoreRecord(user_id=dyf.User.query.filter_by(role='student').first().id, category_id=None,
+                                 score=1, source='补录', academic_year=YEARS[0])
+        dyf.db.session.add(record)
+        dyf.db.session.commit()
+        return record.id
+
+
+def test_all_years_reads_include_archived_year(seeded):
+    admin = login(seeded, 'admin')
+    before_export = _export_rows(admin)
+    before_all = admin.get('/api/scores/all?academic_year=').get_json()
+
+    result = _archive_cli(seeded, 'year', YEARS[0])
+    assert result.exit_code == 0, result.output
+    with seeded.app_context():
+        assert dyf.ScoreRecord.query.filter_by(academic_year=YEARS[0]).count() == 0
+
+    # 不指定学年的排行榜和导出仍合并归档学年的记录
+    assert _export_rows(admin) == before_export
+    assert admin.get('/api/scores/all?academic_year=').get_json() == before_all
+    # 指定学年时读归档库
+    assert len(_export_rows(admin, f'&academic_year={YEARS[0]}')) == 31
+
+
+def test_new_rows_do_not_reuse_archived_ids(seeded):
+    archived_id = _add_old_year_record(seeded)
+    assert _archive_cli(seeded, 'year', YEARS[0]).exit_code == 0
+
+    # 最大 id 的行已移走，新行仍不能复用它的 id
+    with seeded.app_context():
+        record = dyf.ScoreRecord(user_id=dyf.User.query.filter_by(role='student').first().id, category_id=None,
+                                 score=2, source='补录', academic_year=YEARS[1])
+        dyf.db.session.add(record)
+        dyf.db.session.commit()
+        assert record.id > archived_id
+
+    result = _archive_cli(seeded, 'restore', YEARS[0])
+    assert result.exit_code == 0, result.output
+    with seeded.app_context():
+        assert dyf.db.session.get(dyf.ScoreRecord, archived_id).academic_year == YEARS[0]
+
+
+def test_restore_reports_id_conflicts(seeded):
+    archived_id = _add_old_year_record(seeded)
+    assert _archive_cli(seeded, 'year', YEARS[0]).exit_code == 0
+
+    # 旧版本建的表没有 AUTOINCREMENT，主库新行可能拿到已归档的 id
+    with seeded.app_context():
+        dyf.db.session.add(dyf.ScoreRecord(id=archived_id, user_id=dyf.User.query.filter_by(role='student').first().id,
+                                           category_id=None, score=2, source='补录', academic_year=YEARS[1]))
+        dyf.db.session.commit()
+
+    result = _archive_cli(seeded, 'restore', YEARS[0])
+    assert result.exit_code != 0
+    assert 'score_record 1 行' in result.output
+    with seeded.app_context():
+        assert YEARS[0] in dyf.archived_years()
+
+
+def _add_old_year_applications(app):
+    """给归档学年补一个已通过的个人申请和一个含两名成员的集体申请，返回 (个人申请 id, 集体申请 id)"""
+    with app.app_context():
+        teacher = dyf.User.query.filter_by(role='teacher').first()
+        students = dyf.User.query.filter_by(role='student').order_by(dyf.User.id).limit(2).all()
+        category = dyf.ScoreCategory.query.filter(dyf.ScoreCategory.parent_id.isnot(None)).first()
+        application = dyf.ScoreApplication(
+            user_id=students[0].id, category_id=category.id, title='往年志愿服务', description='敬老院志愿服务',
+            score=1, status='approved', academic_year=YEARS[0])
+        group = dyf.GroupApplication(
+            teacher_user_id=teacher.id, category_id=category.id, title='往年合唱比赛', description='校合唱比赛',
+            status='approved', academic_year=YEARS[0])
+        dyf.db.session.add_all([application, group])
+        dyf.db.session.flush()
+        for student in students:
+            dyf.db.session.add(dyf.GroupApplicationMember(
+                group_application_id=group.id, student_user_id=student.id, score=2))
+        dyf.db.session.commit()
+        return application.id, group.id
+
+
+def test_archived_applications_remain_readable(seeded):
+    application_id, group_id = _add_old_year_applications(seeded)
+    assert _archive_cli(seeded, 'year', YEARS[0]).exit_code == 0
+    with seeded.app_context():
+        assert dyf.db.session.get(dyf.GroupApplication, group_id) is None
+
+    student = login(seeded, 'student')
+    mine = student.get('/api/applications/my').get_json()
+    assert [item['academic_year'] for item in mine if item['id'] == application_id] == [YEARS[0]]
+    assert any(item['id'] == group_id for item in student.get('/api/group-applications').get_json())
+
+    admin = login(seeded, 'admin')
+    detail = admin.get(f'/api/group-applications/{group_id}')
+    assert detail.status_code == 200
+    assert detail.get_json()['academic_year'] == YEARS[0]
+    assert len(detail.get_json()['members']) == 2
+
+    teacher = login(seeded, 'teacher')
+    own = {item['id']: item for item in teacher.get('/api/group-applications/my').get_json()}
+    assert own[group_id]['member_count'] == 2
+
+    queue = admin.get(f'/api/review-queue?status=all&academic_year={YEARS[0]}').get_json()
+    assert {(item['kind'], item['id']) for item in queue['items']} == {
+        ('application', application_id), ('group_application', group_id)}
+    # 归档库有自己的全文索引，长关键词走 MATCH，短关键词走 LIKE
+    for query in ('合唱比赛', '合唱'):
+        found = admin.get(f'/api/applications/search?q={query}').get_json()['items']
+        assert [(item['kind'], item['id']) for item in found] == [('group_application', group_id)]
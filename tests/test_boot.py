@@ -0,0 +1,30 @@
+import json
+import os
+import subprocess
+import sys
+
+import app as dyf
+
+# 在全新的解释器中创建应用，输出已加载的重型依赖
+_PROBE = """
+import json, sys
+import app
+app.create_app(json.loads(sys.argv[1]))
+print(json.dumps([name for name in app.HEAVY_MODULES if name in sys.modules]))
+"""
+
+
+def test_create_app_does_not_import_heavy_modules(tmp_path):
+    config = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'moral_score.db'),
+        'ARCHIVE_DATABASE': str(tmp_path / 'archive.db'),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'TABLE_VERSIONS_DIR': str(tmp_path / 'versions'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    }
+    output = subprocess.run(
+        [sys.executable, '-c', _PROBE, json.dumps(config)],
+        cwd=os.path.dirname(os.path.abspath(dyf.__file__)), capture_output=True, text=True, check=True,
+    ).stdout
+    loaded = json.loads(output.strip().splitlines()[-1])
+    assert 'pandas' not in loaded
@@ -0,0 +1,66 @@
+from sqlalchemy import event
+
+import app as dyf
+from conftest import login
+
+
+def _get(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return response
+
+
+def _count_queries(app, call):
+    with app.app_context():
+        engine = dyf.db.engine
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        call()
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return statements
+
+
+def test_role_trees_follow_allowed_children(seeded):
+    student_tree = _get(login(seeded, 'student'), '/api/categories').get_json()
+    assert [main['name'] for main in student_tree] == [
+        name for name in dyf.ALL_MAIN_CATEGORIES if name in dyf.STUDENT_MAIN_CATEGORIES]
+    for main in student_tree:
+        allowed = dyf.STUDENT_ALLOWED_CHILDREN.get(main['name'])
+        assert allowed is None or {child['name'] for child in main['children']} <= set(allowed)
+
+    teacher = login(seeded, 'teacher')
+    teacher_form = _get(teacher, '/api/categories').get_json()
+    assert {main['name'] for main in teacher_form} <= set(dyf.TEACHER_MAIN_CATEGORIES)
+    teacher_tree = _get(teacher, '/api/categories/teacher').get_json()
+    for main in teacher_tree:
+        assert main['children'] and all(
+            dyf.is_teacher_category(main['name'], child['name']) for child in main['children'])
+
+    all_tree = _get(teacher, '/api/categories/all').get_json()
+    with seeded.app_context():
+        assert sum(1 + len(main['children']) for main in all_tree) == dyf.ScoreCategory.query.count()
+
+
+def test_warm_trees_need_no_queries_until_a_category_changes(seeded):
+    student = login(seeded, 'student')
+    first = _get(student, '/api/categories')
+    assert 'private' in first.headers['Cache-Control']
+
+    paths = ['/api/categories', '/api/categories/all', '/api/categories/teacher']
+    for path in paths:
+        _get(student, path)
+    assert _count_queries(seeded, lambda: [_get(student, path) for path in paths]) == []
+    assert student.get('/api/categories', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    with seeded.app_context():
+        parent = dyf.ScoreCategory.query.filter_by(name='社会服务分', parent_id=None).one()
+        dyf.db.session.add(dyf.ScoreCategory(name='志愿服务', parent_id=parent.id, max_score=10))
+        dyf.db.session.commit()
+
+    changed = student.get('/api/categories', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    all_names = {child['name'] for main in _get(student, '/api/categories/all').get_json() for child in main['children']}
+    assert '志愿服务' in all_names
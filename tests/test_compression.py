@@ -0,0 +1,67 @@
+import gzip
+import os
+
+from flask import url_for
+
+import app as dyf
+from conftest import YEARS, login
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+def test_streamed_json_is_gzipped(seeded):
+    admin = login(seeded, 'admin')
+    plain = admin.get('/api/scores/all', query_string={'academic_year': YEARS[1]})
+    compressed = admin.get('/api/scores/all', query_string={'academic_year': YEARS[1]}, headers=GZIP)
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+
+def test_small_responses_are_sent_as_is(seeded):
+    response = login(seeded, 'student').get('/api/announcements', headers=GZIP)
+    assert len(response.get_data()) < dyf.app.config['COMPRESS_MIN_SIZE']
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_compressed_etag_revalidates(seeded):
+    client = login(seeded, 'student')
+    response = client.get('/api/categories/all', headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].endswith('-gzip"')
+    again = client.get('/api/categories/all', headers=dict(GZIP, **{'If-None-Match': response.headers['ETag']}))
+    assert again.status_code == 304
+
+
+def test_fingerprinted_static_files_use_precompressed_copies(seeded, tmp_path, monkeypatch):
+    assets = dyf.static_assets
+    monkeypatch.setattr(assets, 'folder', str(tmp_path))
+    monkeypatch.setattr(assets, '_fingerprints', {})
+    (tmp_path / 'css').mkdir()
+    source = tmp_path / 'css' / 'site.css'
+    source.write_text('body { margin: 0; }\n' * 200)
+    assert assets.precompress() == [(os.path.join('css', 'site.css'), ['gzip'])]
+
+    with seeded.test_request_context():
+        url = url_for('static', filename='css/site.css')
+    assert url.endswith(f'?v={assets.fingerprint("css/site.css")}')
+
+    client = seeded.test_client()
+    response = client.get(url, headers=GZIP)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.cache_control.immutable and response.cache_control.max_age == 365 * 24 * 3600
+    assert gzip.decompress(response.get_data()) == source.read_bytes()
+    response.close()
+
+    # 旧哈希不按 immutable 缓存；原文件比副本新时发送原文件
+    stale = client.get('/static/css/site.css?v=000000000000', headers=GZIP)
+    assert not stale.cache_control.immutable
+    stale.close()
+    source.write_text('body { margin: 1px; }\n' * 200)
+    os.utime(source, ns=(os.stat(source).st_atime_ns, os.stat(source.with_suffix('.css.gz')).st_mtime_ns + 1))
+    fresh = client.get('/static/css/site.css', headers=GZIP)
+    assert 'Content-Encoding' not in fresh.headers
+    assert fresh.get_data() == source.read_bytes()
+    fresh.close()
@@ -0,0 +1,70 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import versioning
+from conftest import login
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """版本戳和 Last-Modified 使用的时钟，now[0] 为当前纳秒时间；从整秒开始，晚于已有的版本戳"""
+    now = [(time.time_ns() // SECOND + 10) * SECOND]
+    monkeypatch.setattr(versioning, 'time', SimpleNamespace(time_ns=lambda: now[0]))
+    return now
+
+
+def _post_announcement(client, title):
+    response = client.post('/api/announcements', json={'title': title, 'content': '内容'})
+    assert response.status_code in (200, 201), response.get_json()
+
+
+def test_etag_revalidates_without_queries(seeded):
+    admin = login(seeded, 'admin')
+    first = admin.get('/api/announcements')
+    assert first.status_code == 200 and first.headers['ETag']
+
+    # 304 不执行任何查询
+    budget = seeded.view_functions['api_get_announcements']
+    budget.query_budget, saved = 0, budget.query_budget
+    try:
+        again = admin.get('/api/announcements', headers={'If-None-Match': first.headers['ETag']})
+    finally:
+        budget.query_budget = saved
+    assert again.status_code == 304 and again.get_data() == b''
+
+    _post_announcement(admin, '期末安排')
+    changed = admin.get('/api/announcements', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
+    assert any(item['title'] == '期末安排' for item in changed.get_json())
+
+
+def test_last_modified_is_withheld_within_the_changing_second(seeded, clock):
+    admin = login(seeded, 'admin')
+    clock[0] += SECOND // 5
+    _post_announcement(admin, '第一条')
+
+    # 版本戳所在的一秒还没过完，同一秒内还可能再修改，只能依靠 ETag
+    response = admin.get('/api/announcements')
+    assert 'Last-Modified' not in response.headers
+
+    clock[0] += SECOND // 2
+    _post_announcement(admin, '第二条')
+    clock[0] += 2 * SECOND
+    response = admin.get('/api/announcements')
+    last_modified = response.headers['Last-Modified']
+    assert admin.get('/api/announcements', headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    # 之后的修改落在更晚的秒内，If-Modified-Since 不再命中
+    _post_announcement(admin, '第三条')
+    clock[0] += SECOND
+    response = admin.get('/api/announcements', headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200 and response.headers['Last-Modified'] != last_modified
+
+    # 两种条件同时出现时以 ETag 为准
+    stale = admin.get('/api/announcements', headers={
+        'If-None-Match': '"announcements-0"', 'If-Modified-Since': response.headers['Last-Modified']})
+    assert stale.status_code == 200
@@ -0,0 +1,19 @@
+from conftest import YEARS, login
+from test_scoring_rules import _change_in_other_process
+
+
+def test_rule_change_in_other_process_changes_etag_and_totals(seeded):
+    student = login(seeded, 'student')
+    first = student.get('/api/dashboard')
+    etag = first.headers['ETag']
+    assert first.get_json()['scores']['totalScore'] > 0
+    assert student.get('/api/dashboard', headers={'If-None-Match': etag}).status_code == 304
+
+    # 另一个 worker 把当前学年所有主类别的上限改为 0
+    _change_in_other_process(
+        seeded, f"UPDATE scoring_rule SET max_score = 0 WHERE academic_year = '{YEARS[1]}'", 'scoring_rule')
+    second = student.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert second.headers['ETag'] != etag
+    # 新 ETag 下的分数按新规则计算
+    assert second.get_json()['scores']['totalScore'] == 0
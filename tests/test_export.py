@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+
+import app as dyf
+from conftest import YEARS, login
+
+
+def _expected(seeded, **filters):
+    with seeded.app_context():
+        return list(dyf.iter_ranked_export_rows(YEARS[1], **filters))
+
+
+def test_csv_export_streams_ranked_rows(seeded):
+    admin = login(seeded, 'admin')
+    response = admin.get('/api/scores/export', query_string={'academic_year': YEARS[1], 'format': 'csv'})
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    assert "filename*=UTF-8''" in response.headers['Content-Disposition']
+
+    text = response.get_data(as_text=True)
+    # 带 BOM，Excel 打开中文不乱码
+    assert text.startswith('\ufeff')
+    rows = list(csv.reader(io.StringIO(text[1:])))
+    assert rows[0] == dyf.EXPORT_COLUMNS
+    expected = _expected(seeded)
+    assert len(rows) == 31
+    assert rows[1:] == [[str(row[col]) for col in dyf.EXPORT_COLUMNS] for row in expected]
+    totals = [float(row[-1]) for row in rows[1:]]
+    assert totals == sorted(totals, reverse=True)
+
+
+def test_jsonl_export_matches_filters(seeded):
+    admin = login(seeded, 'admin')
+    response = admin.get('/api/scores/export', query_string={
+        'academic_year': YEARS[1], 'format': 'jsonl', 'college': 'A书院'})
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows == _expected(seeded, college='A书院')
+    assert rows and {row['书院'] for row in rows} == {'A书院'}
+    # 排名在筛选范围内重新计算
+    assert [row['排名'] for row in rows] == list(range(1, len(rows) + 1))
+
+
+def test_unknown_export_format_is_rejected(seeded):
+    response = login(seeded, 'admin').get('/api/scores/export', query_string={'format': 'pdf'})
+    assert response.status_code == 400
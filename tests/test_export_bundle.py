@@ -0,0 +1,33 @@
+import io
+import os
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import app as dyf
+from conftest import YEARS, login
+
+
+@pytest.fixture
+def export_pool():
+    yield dyf.export_pool()
+    dyf.discard_export_pool(dyf.export_pool())
+
+
+def _bundle_names(client):
+    response = client.get(f'/api/scores/export-bundle?academic_year={YEARS[1]}&by=college')
+    assert response.status_code == 200
+    return sorted(zipfile.ZipFile(io.BytesIO(response.get_data())).namelist())
+
+
+def test_broken_pool_is_replaced_and_export_retried(seeded, export_pool):
+    admin = login(seeded, 'admin')
+    expected = _bundle_names(admin)
+
+    # 模拟子进程被 OOM 终止：进程池失效，之后的提交都会失败
+    with pytest.raises(BrokenProcessPool):
+        export_pool.submit(os._exit, 1).result()
+
+    assert _bundle_names(admin) == expected
+    assert dyf.export_pool() is not export_pool
@@ -0,0 +1,65 @@
+import io
+
+import app as dyf
+from conftest import login
+
+
+def _submit(client, key, **form):
+    """带幂等键提交个人申请，默认表单完整"""
+    with client.application.app_context():
+        category_id = dyf.ScoreCategory.query.filter_by(name='工时').first().id
+    data = {'category_id': str(category_id), 'description': '志愿服务', 'score': '1',
+            'evidence': (io.BytesIO(b'%PDF-1.4'), 'proof.pdf')}
+    data.update(form)
+    return client.post('/api/applications', data=data, headers={'Idempotency-Key': key})
+
+
+def _application_count(app):
+    with app.app_context():
+        return dyf.ScoreApplication.query.count()
+
+
+def test_replay_returns_stored_response(seeded):
+    student = login(seeded, 'student')
+    before = _application_count(seeded)
+
+    first = _submit(student, 'key-1')
+    assert first.status_code == 200
+    replay = _submit(student, 'key-1')
+    assert replay.status_code == 200
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json() == first.get_json()
+    assert _application_count(seeded) == before + 1
+
+
+def test_duplicate_in_flight_is_rejected(seeded):
+    student = login(seeded, 'student')
+    with seeded.app_context():
+        user_id = dyf.User.query.filter_by(role='student').order_by(dyf.User.id).first().id
+        # 第一次请求已登记键但还没有记录响应
+        claimed, _ = dyf.claim_idempotency_key(user_id, 'application', 'key-2')
+        assert claimed
+
+    before = _application_count(seeded)
+    response = _submit(student, 'key-2')
+    assert response.status_code == 409
+    assert _application_count(seeded) == before
+
+
+def test_key_reused_on_other_endpoint_is_rejected(seeded):
+    student = login(seeded, 'student')
+    assert _submit(student, 'key-3').status_code == 200
+    response = student.post('/api/group-applications', data={}, headers={'Idempotency-Key': 'key-3'})
+    assert response.status_code == 422
+
+
+def test_client_error_is_not_stored(seeded):
+    student = login(seeded, 'student')
+    before = _application_count(seeded)
+
+    assert _submit(student, 'key-4', description='').status_code == 400
+    # 修正后用同一个键重新提交，按新请求处理
+    retry = _submit(student, 'key-4')
+    assert retry.status_code == 200
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert _application_count(seeded) == before + 1
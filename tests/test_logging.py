@@ -0,0 +1,66 @@
+import io
+import json
+import logging
+import queue
+
+import app as dyf
+from conftest import login
+from log_config import DebugSamplingFilter, JsonFormatter, NonBlockingQueueHandler
+
+
+def _captured_lines(app, action):
+    """把监听线程的输出临时换成内存流，执行 action 并等队列写完，返回解析后的记录"""
+    logging_ext = app.extensions['structured_logging']
+    listener = logging_ext.listener
+    stream = logging.StreamHandler(io.StringIO())
+    stream.setFormatter(JsonFormatter())
+    handlers, listener.handlers = listener.handlers, (stream,)
+    try:
+        action()
+        logging_ext.handler.queue.join()
+    finally:
+        listener.handlers = handlers
+    return [json.loads(line) for line in stream.stream.getvalue().splitlines()]
+
+
+def test_request_logs_are_json_with_request_context(seeded):
+    admin = login(seeded, 'admin')
+    with seeded.app_context():
+        application_id = dyf.ScoreApplication.query.first().id
+        admin_id = dyf.User.query.filter_by(role='admin').first().id
+    responses = []
+
+    # 缺少 review_comment，审核失败并记录异常
+    records = _captured_lines(seeded, lambda: responses.append(admin.put(
+        f'/api/applications/{application_id}/review', json={'status': 'rejected'},
+        headers={'X-Request-ID': 'req-42'})))
+    assert responses[0].status_code == 500
+    assert responses[0].headers['X-Request-ID'] == 'req-42'
+
+    record = next(r for r in records if r['logger'] == 'dyf.review')
+    assert record['level'] == 'ERROR' and record['msg'] == '审核个人申请失败'
+    assert record['request_id'] == 'req-42'
+    assert record['user_id'] == admin_id
+    assert record['route'] == 'api_review_application'
+    assert record['application_id'] == application_id
+    assert 'KeyError' in record['exc']
+
+
+def test_generated_request_id_is_echoed(seeded):
+    response = login(seeded, 'admin').get('/api/review-queue')
+    assert len(response.headers['X-Request-ID']) == 32
+
+
+def test_debug_records_are_sampled():
+    sampler = DebugSamplingFilter(every=3)
+    debug = [logging.makeLogRecord({'levelno': logging.DEBUG}) for _ in range(6)]
+    kept = [record for record in debug if sampler.filter(record)]
+    assert len(kept) == 2 and all(record.sample_rate == 3 for record in kept)
+    assert sampler.filter(logging.makeLogRecord({'levelno': logging.INFO}))
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    for i in range(3):
+        handler.emit(logging.makeLogRecord({'msg': f'记录 {i}', 'levelno': logging.INFO, 'levelname': 'INFO'}))
+    assert handler.queue.qsize() == 1 and handler.dropped == 2
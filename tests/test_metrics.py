@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+import app as dyf
+from metrics import ARCHIVE_FILENAME, Metrics
+
+
+def _worker_snapshot(directory, pid, requests, query_counts):
+    """模拟 pid 对应的 worker 写下的最后一份快照"""
+    worker = Metrics()
+    worker.directory = str(directory)
+    worker.inc('dyf_http_requests_total', requests, endpoint='index', status='200')
+    for count in query_counts:
+        worker.observe('dyf_sql_queries_per_request', count)
+    worker.flush(force=True)
+    os.replace(os.path.join(directory, f'metrics_{os.getpid()}.json'),
+               os.path.join(directory, f'metrics_{pid}.json'))
+
+
+def _totals(master):
+    counters, histograms = master.collect()
+    requests = sum(v for (name, _), v in counters.items() if name == 'dyf_http_requests_total')
+    histogram = next(v for (name, _), v in histograms.items() if name == 'dyf_sql_queries_per_request')
+    return requests, histogram[-1]
+
+
+def test_recycled_workers_are_folded_into_archive(tmp_path):
+    master = Metrics()
+    master.directory = str(tmp_path)
+
+    _worker_snapshot(tmp_path, 101, 3, [1, 2])
+    _worker_snapshot(tmp_path, 102, 4, [5])
+    master.archive_process(101)
+    master.archive_process(102)
+    assert _totals(master) == (7, 3)
+
+    # 新 worker 复用了已回收 worker 的 pid，总数不能倒退
+    _worker_snapshot(tmp_path, 101, 1, [1])
+    assert _totals(master) == (8, 4)
+    master.archive_process(101)
+    assert _totals(master) == (8, 4)
+
+    names = sorted(os.listdir(tmp_path))
+    assert names == sorted([ARCHIVE_FILENAME, f'metrics_{os.getpid()}.json'])
+
+    master.reset_directory()
+    assert os.listdir(tmp_path) == []
+
+
+def _request_count(route, status):
+    counters, _ = dyf.metrics.collect()
+    return sum(v for (name, labels), v in counters.items()
+               if name == 'dyf_http_requests_total' and ('route', route) in labels and ('status', status) in labels)
+
+
+def test_unhandled_errors_are_counted_as_500(seeded, monkeypatch):
+    def broken():
+        raise RuntimeError('模拟视图异常')
+
+    monkeypatch.setitem(seeded.view_functions, 'index', broken)
+    before = _request_count('index', '500')
+    with pytest.raises(RuntimeError):
+        seeded.test_client().get('/')
+    assert _request_count('index', '500') == before + 1
+
+    # 生产环境异常转成 500 响应后会经过 after_request，不能重复计数
+    monkeypatch.setitem(seeded.config, 'PROPAGATE_EXCEPTIONS', False)
+    assert seeded.test_client().get('/').status_code == 500
+    assert _request_count('index', '500') == before + 2
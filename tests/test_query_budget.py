@@ -0,0 +1,128 @@
+import pytest
+from sqlalchemy import event
+
+import app as dyf
+from conftest import login
+from query_budget import QueryBudgetExceeded
+
+
+@pytest.fixture
+def budget(app):
+    """临时修改路由的语句预算，测试结束后恢复"""
+    changed = {}
+
+    def set_budget(endpoint, value):
+        view = app.view_functions[endpoint]
+        changed.setdefault(endpoint, view.query_budget)
+        view.query_budget = value
+
+    yield set_budget
+    for endpoint, value in changed.items():
+        app.view_functions[endpoint].query_budget = value
+
+
+def test_streamed_response_counts_queries_in_body(seeded, budget):
+    admin = login(seeded, 'admin')
+    response = admin.get('/api/group-applications')
+    assert response.status_code == 200 and response.get_json()
+
+    # 列表在响应体发送时才查询，预算在响应体结束时校验
+    budget('api_get_all_group_applications', 0)
+    response = admin.get('/api/group-applications')
+    with pytest.raises(QueryBudgetExceeded):
+        response.get_data()
+
+
+def test_streamed_response_records_sql_metrics(seeded):
+    admin = login(seeded, 'admin')
+    admin.get('/api/group-applications').get_data()
+    counters, _ = dyf.metrics.collect()
+    queries = sum(value for (name, labels), value in counters.items()
+                  if name == 'dyf_sql_queries_total' and ('route', 'api_get_all_group_applications') in labels)
+    assert queries > 0
+
+
+class _StatementCounter:
+    """统计代码块内执行的 SQL 语句数"""
+
+    def __init__(self, app):
+        with app.app_context():
+            self.engine = dyf.db.engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def _first_group_id(app):
+    with app.app_context():
+        return dyf.GroupApplication.query.order_by(dyf.GroupApplication.id).first().id
+
+
+def _copy_group(app, gid):
+    """复制一份待审核的集体申请（含成员），返回新 id；使用新建的同级子类别，通过时不与已有记录冲突"""
+    with app.app_context():
+        source = dyf.db.session.get(dyf.GroupApplication, gid)
+        parent_id = dyf.db.session.get(dyf.ScoreCategory, source.category_id).parent_id
+        category = dyf.ScoreCategory(name=f'测试类别{dyf.ScoreCategory.query.count()}', parent_id=parent_id, max_score=10)
+        dyf.db.session.add(category)
+        dyf.db.session.flush()
+        copy = dyf.GroupApplication(
+            teacher_user_id=source.teacher_user_id, category_id=category.id, title=source.title,
+            description=source.description, evidence=source.evidence, academic_year=source.academic_year)
+        dyf.db.session.add(copy)
+        dyf.db.session.flush()
+        for member in dyf.GroupApplicationMember.query.filter_by(group_application_id=gid):
+            dyf.db.session.add(dyf.GroupApplicationMember(
+                group_application_id=copy.id, student_user_id=member.student_user_id, score=member.score))
+        dyf.db.session.commit()
+        return copy.id
+
+
+def _review_request(app):
+    return 'put', f'/api/group-applications/{_copy_group(app, _first_group_id(app))}/review', {'status': 'approved'}
+
+
+# (endpoint, 角色, 准备函数)：准备函数在计数之外执行，返回 (方法, 路径, JSON 请求体)
+ROUTES = [
+    ('api_get_my_scores', 'student', lambda app: ('get', '/api/scores/my', None)),
+    ('api_get_group_application_detail', 'admin',
+     lambda app: ('get', f'/api/group-applications/{_first_group_id(app)}', None)),
+    ('api_get_all_group_applications', 'admin', lambda app: ('get', '/api/group-applications', None)),
+    ('api_review_group_application', 'admin', _review_request),
+]
+
+
+@pytest.mark.parametrize('endpoint, role, prepare', ROUTES, ids=[route[0] for route in ROUTES])
+def test_route_within_budget_and_fails_one_below(seeded, budget, endpoint, role, prepare):
+    client = login(seeded, role)
+
+    def call():
+        method, path, body = prepare(seeded)
+        return getattr(client, method)(path, json=body)
+
+    # 先不校验预算请求一次，加载类别树、计分规则、归档学年等进程内缓存（每个进程只有一次）
+    seeded.config['QUERY_BUDGET_ENFORCE'] = False
+    try:
+        call().get_data()
+    finally:
+        del seeded.config['QUERY_BUDGET_ENFORCE']
+
+    method, path, body = prepare(seeded)
+    with _StatementCounter(seeded) as counter:
+        response = getattr(client, method)(path, json=body)
+        response.get_data()
+    assert response.status_code == 200
+    # 预算与实际语句数相符，逐行查询（N+1）回归时语句数会随行数增长
+    assert counter.count <= seeded.view_functions[endpoint].query_budget
+
+    budget(endpoint, counter.count - 1)
+    with pytest.raises(QueryBudgetExceeded):
+        call().get_data()
@@ -0,0 +1,68 @@
+import csv
+import io
+
+import app as dyf
+from conftest import YEARS, login
+
+
+def _year_id(app, year_name):
+    with app.app_context():
+        return dyf.AcademicYear.query.filter_by(year_name=year_name).one().id
+
+
+def _scores(client, **params):
+    response = client.get('/api/scores/all', query_string=dict(params, academic_year=YEARS[0]))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _expected_rank(rows, row, same_scope):
+    return 1 + sum(1 for other in rows if same_scope(other) and other['total_score'] > row['total_score'])
+
+
+def test_frozen_ranking_is_served_from_the_snapshot(seeded):
+    admin = login(seeded, 'admin')
+    assert admin.post(f'/api/admin/academic-years/{_year_id(seeded, YEARS[1])}/ranking-snapshot').status_code == 400
+    live = {row['student_id']: row['total_score'] for row in _scores(admin)}
+
+    frozen = admin.post(f'/api/admin/academic-years/{_year_id(seeded, YEARS[0])}/ranking-snapshot')
+    assert frozen.status_code == 200 and frozen.get_json()['student_count'] == 30
+    assert admin.post(f'/api/admin/academic-years/{_year_id(seeded, YEARS[0])}/ranking-snapshot').status_code == 400
+
+    rows = _scores(admin)
+    assert {row['student_id']: row['total_score'] for row in rows} == live
+    # 同分同名次，各范围内分别排名
+    for row in rows:
+        assert row['overall_rank'] == _expected_rank(rows, row, lambda other: True)
+        assert row['college_rank'] == _expected_rank(rows, row, lambda other: other['college'] == row['college'])
+        assert row['class_rank'] == _expected_rank(rows, row, lambda other: (
+            other['college'], other['grade'], other['class_name']) == (row['college'], row['grade'], row['class_name']))
+    college_rows = _scores(admin, college='A书院')
+    assert college_rows == [row for row in rows if row['college'] == 'A书院']
+
+    # 之后直接改动记录不影响已冻结的排名和导出
+    with seeded.app_context():
+        dyf.ScoreRecord.query.filter_by(academic_year=YEARS[0]).update({'score': 0})
+        dyf.db.session.commit()
+    assert _scores(admin) == rows
+    export = admin.get('/api/scores/export', query_string={'academic_year': YEARS[0], 'format': 'csv'})
+    exported = list(csv.DictReader(io.StringIO(export.get_data(as_text=True)[1:])))
+    assert {row['学号']: float(row['总分']) for row in exported} == live
+
+
+def test_frozen_year_refuses_approvals_and_deletion(seeded):
+    admin = login(seeded, 'admin')
+    year_id = _year_id(seeded, YEARS[0])
+    assert admin.post(f'/api/admin/academic-years/{year_id}/ranking-snapshot').status_code == 200
+
+    with seeded.app_context():
+        source = dyf.ScoreApplication.query.first()
+        late = dyf.ScoreApplication(user_id=source.user_id, category_id=source.category_id, title='补交',
+                                    description='补交材料', score=1, evidence='d.pdf', academic_year=YEARS[0])
+        dyf.db.session.add(late)
+        dyf.db.session.commit()
+        late_id = late.id
+
+    response = admin.put(f'/api/applications/{late_id}/review', json={'status': 'approved', 'review_comment': '同意'})
+    assert response.status_code == 400 and response.get_json()['message'] == '该学年排名已冻结，不能再写入德育分'
+    assert admin.delete(f'/api/admin/academic-years/{year_id}').get_json()['message'] == '该学年排名已冻结，无法删除'
@@ -0,0 +1,40 @@
+import app as dyf
+from conftest import YEARS, login
+
+
+def _add_uncategorized_records(app, count):
+    """给前 count 名学生各加一条类别为空的记录（如初始德育分），返回这些学生的 id"""
+    with app.app_context():
+        students = dyf.User.query.filter_by(role='student').order_by(dyf.User.id).limit(count).all()
+        for student in students:
+            dyf.db.session.add(dyf.ScoreRecord(
+                user_id=student.id, category_id=None, score=3, source='初始德育分', academic_year=YEARS[1]))
+        dyf.db.session.commit()
+        return [student.id for student in students]
+
+
+def _ranking_totals(app, academic_year):
+    with app.app_context():
+        return {student.id: total for student, _, total, _ in dyf.iter_student_scores(academic_year)}
+
+
+def test_rescore_totals_match_ranking_with_uncategorized_records(seeded):
+    _add_uncategorized_records(seeded, 5)
+
+    with seeded.app_context():
+        result = seeded.test_cli_runner().invoke(args=['rescore', '--year', YEARS[1], '--workers', '1'])
+        assert result.exit_code == 0, result.output
+        totals = {row.user_id: row.total_score for row in dyf.ScoreTotal.query.filter_by(academic_year=YEARS[1])}
+
+    assert len(totals) == 30
+    assert totals == _ranking_totals(seeded, YEARS[1])
+
+
+def test_transcript_counts_uncategorized_records(seeded):
+    user_id = _add_uncategorized_records(seeded, 1)[0]
+    ranking = _ranking_totals(seeded, YEARS[1])
+
+    years = login(seeded, 'student').get('/api/scores/transcript').get_json()['years']
+    current = next(year for year in years if year['academic_year'] == YEARS[1])
+    assert current['total_score'] == ranking[user_id]
+    assert current['record_count'] == 6
@@ -0,0 +1,47 @@
+import json
+
+import app as dyf
+from conftest import login
+
+
+def _read_event(chunks):
+    """读取下一条 SSE 消息（跳过心跳），返回 (序号, 事件名, 数据)"""
+    while True:
+        message = next(chunks).decode()
+        if message.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in message.strip().split('\n'))
+        return fields.get('id'), fields['event'], json.loads(fields['data'])
+
+
+def test_review_is_pushed_to_open_stream(seeded):
+    admin = login(seeded, 'admin')
+    with seeded.app_context():
+        application_id = dyf.ScoreApplication.query.filter_by(status='pending').first().id
+
+    response = admin.get('/api/review-events')
+    assert response.mimetype == 'text/event-stream'
+    chunks = response.iter_encoded()
+    try:
+        _, name, _ = _read_event(chunks)
+        assert name == 'ready'
+
+        reviewed = login(seeded, 'admin').put(f'/api/applications/{application_id}/review',
+                                              json={'status': 'approved', 'review_comment': '同意'})
+        assert reviewed.status_code == 200
+
+        event_id, name, data = _read_event(chunks)
+        assert name == 'application'
+        assert data['action'] == 'reviewed' and data['id'] == application_id
+        assert data['item']['status'] == 'approved'
+    finally:
+        response.close()
+
+    # 断线重连时带上次的序号，从之后继续
+    resumed = admin.get('/api/review-events', headers={'Last-Event-ID': str(int(event_id) - 1)})
+    chunks = resumed.iter_encoded()
+    try:
+        assert _read_event(chunks)[1] == 'ready'
+        assert _read_event(chunks)[0] == event_id
+    finally:
+        resumed.close()
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import app as dyf
+from conftest import login
+
+
+def _pages(client, limit, **params):
+    """沿 next_cursor 翻完整个队列，返回每页的 (kind, id)"""
+    pages, cursor = [], None
+    while True:
+        query = dict(params, limit=limit, **({'cursor': cursor} if cursor else {}))
+        response = client.get('/api/review-queue', query_string=query)
+        assert response.status_code == 200
+        data = response.get_json()
+        pages.append([(item['kind'], item['id']) for item in data['items']])
+        cursor = data['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_pages_do_not_overlap_or_skip_across_kinds(seeded):
+    # 提交时间成批相同，集体申请与其中一批同时提交，分页边界会落在同一时间的两类申请之间
+    base = datetime(2025, 10, 1, 8, 0)
+    with seeded.app_context():
+        applications = dyf.ScoreApplication.query.order_by(dyf.ScoreApplication.id).all()
+        for i, application in enumerate(applications):
+            application.created_at = base + timedelta(minutes=i // 4)
+        group = dyf.GroupApplication.query.one()
+        group.created_at = base + timedelta(minutes=3)
+        dyf.db.session.commit()
+        expected = sorted(
+            [(a.created_at, 'application', a.id) for a in applications]
+            + [(group.created_at, 'group_application', group.id)],
+            reverse=True)
+    expected = [(kind, id) for _, kind, id in expected]
+
+    admin = login(seeded, 'admin')
+    for limit in (1, 3, 4, 7):
+        pages = _pages(admin, limit)
+        assert all(len(page) == limit for page in pages[:-1])
+        assert [item for page in pages for item in page] == expected
+
+    # 审核后的申请离开待审核队列，全部状态下仍按同样的顺序出现
+    reviewed = admin.put(f'/api/applications/{expected[0][1]}/review', json={'status': 'rejected', 'review_comment': '材料不全'})
+    assert reviewed.status_code == 200
+    assert [item for page in _pages(admin, 5) for item in page] == expected[1:]
+    assert [item for page in _pages(admin, 5, status='all') for item in page] == expected
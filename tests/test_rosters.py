@@ -0,0 +1,87 @@
+import io
+
+import app as dyf
+from conftest import login
+
+
+def _student_id(i):
+    return f'2023{i:04d}'
+
+
+def _csv(*rows):
+    """(学号, 分值) 行组成的名单文件"""
+    lines = ['学号,姓名,分值'] + [f'{student_id},,{score}' for student_id, score in rows]
+    return io.BytesIO('\n'.join(lines).encode('utf-8')), 'members.csv'
+
+
+def _members(client, gid):
+    detail = client.get(f'/api/group-applications/{gid}').get_json()
+    return {member['student_id']: member['score'] for member in detail['members']}
+
+
+def _first_group_id(app):
+    with app.app_context():
+        return dyf.GroupApplication.query.order_by(dyf.GroupApplication.id).first().id
+
+
+def test_stage_validate_and_commit_roster(seeded):
+    teacher = login(seeded, 'teacher')
+    report = teacher.post('/api/group-applications/roster', data={'members': _csv(
+        (_student_id(0), 2),
+        (_student_id(1), 'abc'),   # 第一行分值无效，后面的有效行仍应保留
+        (_student_id(1), 3),
+        ('99999999', 1),
+        ('', 1),
+    )}).get_json()
+    assert (report['total'], report['valid']) == (5, 2)
+    assert [(error['row'], error['error']) for error in report['errors']] == [
+        (3, 'invalid_score'), (5, 'unknown_student'), (6, 'missing_student_id')]
+    assert teacher.get(f"/api/group-applications/roster/{report['token']}").get_json() == report
+
+    with seeded.app_context():
+        category_id = dyf.ScoreCategory.query.filter_by(name='集体活动分', parent_id=None).first().children[0].id
+    created = teacher.post('/api/group-applications', data={
+        'category_id': str(category_id), 'description': '志愿活动', 'roster_token': report['token'],
+        'evidence': (io.BytesIO(b'%PDF-1.4'), 'proof.pdf')})
+    assert created.status_code == 200, created.get_json()
+    assert _members(teacher, created.get_json()['id']) == {_student_id(0): 2, _student_id(1): 3}
+    # 提交后暂存名单即删除
+    assert teacher.get(f"/api/group-applications/roster/{report['token']}").status_code == 404
+
+
+def test_duplicate_rows_block_submission(seeded):
+    teacher = login(seeded, 'teacher')
+    report = teacher.post('/api/group-applications/roster', data={'members': _csv(
+        (_student_id(0), 2), (_student_id(0), 3))}).get_json()
+    assert [error['error'] for error in report['errors']] == ['duplicate']
+
+    response = teacher.put(f'/api/group-applications/{_first_group_id(seeded)}',
+                           data={'roster_token': report['token']})
+    assert response.status_code == 400
+
+
+def test_roster_diff_and_patch_round_trip(seeded):
+    teacher = login(seeded, 'teacher')
+    gid = _first_group_id(seeded)
+    assert _members(teacher, gid) == {_student_id(i): 2 for i in range(10)}
+
+    # 新名单：0-4 不变，5 改分，6-9 移出，20 新增
+    rows = [(_student_id(i), 2) for i in range(5)] + [(_student_id(5), 3), (_student_id(20), 1)]
+    response = teacher.put(f'/api/group-applications/{gid}', data={'members': _csv(*rows)})
+    assert response.status_code == 200
+    assert response.get_json()['members'] == {'added': 1, 'removed': 4, 'updated': 1}
+    expected = dict(rows)
+    assert _members(teacher, gid) == expected
+
+    response = teacher.patch(f'/api/group-applications/{gid}/members', json={
+        'upsert': [{'student_id': _student_id(5), 'score': 4}, {'student_id': _student_id(21), 'score': 1}],
+        'remove': [_student_id(0)]})
+    assert response.get_json() == {'message': '成员已更新', 'upserted': 2, 'removed': 1}
+    expected.update({_student_id(5): 4, _student_id(21): 1})
+    del expected[_student_id(0)]
+    assert _members(teacher, gid) == expected
+
+    response = teacher.patch(f'/api/group-applications/{gid}/members', json={
+        'upsert': [{'student_id': '99999999', 'score': 1}]})
+    assert response.status_code == 400
+    assert response.get_json()['unknown'] == ['99999999']
@@ -0,0 +1,29 @@
+from conftest import YEARS, login
+from test_scoring_rules import _change_in_other_process
+
+
+def test_cube_matches_ranking(seeded):
+    admin = login(seeded, 'admin')
+    ranking = admin.get(f'/api/scores/all?academic_year={YEARS[1]}').get_json()
+    cube = admin.get(f'/api/statistics/cube?academic_year={YEARS[1]}').get_json()
+    totals = sorted(row['total_score'] for row in ranking)
+    assert cube['summary']['student_count'] == len(totals)
+    assert cube['summary']['mean_total'] == round(sum(totals) / len(totals), 2)
+    assert sorted(cell['college'] for cell in cube['children']) == ['A书院', 'B书院']
+
+
+def test_rule_change_in_other_process_refreshes_cube(seeded):
+    admin = login(seeded, 'admin')
+    before = admin.get(f'/api/statistics/cube?academic_year={YEARS[1]}').get_json()['summary']
+    assert before['category_means']['奖励分'] > 1
+
+    _change_in_other_process(
+        seeded,
+        f"UPDATE scoring_rule SET max_score = 1 WHERE academic_year = '{YEARS[1]}' AND category_id = "
+        "(SELECT id FROM score_category WHERE name = '奖励分')",
+        'scoring_rule')
+    after = admin.get(f'/api/statistics/cube?academic_year={YEARS[1]}').get_json()['summary']
+    assert after['category_means']['奖励分'] <= 1
+    assert after['cap_shares']['奖励分'] > before['cap_shares']['奖励分']
+    # 重算后标记已清除，再次读取结果不变
+    assert admin.get(f'/api/statistics/cube?academic_year={YEARS[1]}').get_json()['summary'] == after
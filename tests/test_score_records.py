@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as dyf
+from conftest import YEARS, login
+
+
+def _records(app, **filters):
+    with app.app_context():
+        return dyf.ScoreRecord.query.filter_by(academic_year=YEARS[1], **filters).count()
+
+
+def _review(client, path, status='approved'):
+    return client.put(path, json={'status': status, 'review_comment': '审核'})
+
+
+def test_duplicate_records_are_rejected_by_the_index(seeded):
+    with seeded.app_context():
+        record = dyf.ScoreRecord.query.filter_by(academic_year=YEARS[1]).first()
+        dyf.db.session.add(dyf.ScoreRecord(
+            user_id=record.user_id, category_id=record.category_id, score=1, source='个人申请', academic_year=YEARS[1]))
+        with pytest.raises(IntegrityError, match='UNIQUE'):
+            dyf.db.session.commit()
+
+
+def test_second_approval_for_same_category_is_refused(seeded):
+    with seeded.app_context():
+        # 选一名该类别下还没有记录的学生，再给他补一条同类别的申请
+        category_id = dyf.ScoreApplication.query.first().category_id
+        taken = {r.user_id for r in dyf.ScoreRecord.query.filter_by(academic_year=YEARS[1], category_id=category_id)}
+        first = next(a for a in dyf.ScoreApplication.query.order_by(dyf.ScoreApplication.id) if a.user_id not in taken)
+        second = dyf.ScoreApplication(user_id=first.user_id, category_id=first.category_id, title='校运会接力',
+                                      description='4x100米接力', score=2, evidence='c.pdf', academic_year=YEARS[1])
+        dyf.db.session.add(second)
+        dyf.db.session.commit()
+        first_id, second_id, user_id = first.id, second.id, first.user_id
+
+    admin = login(seeded, 'admin')
+    assert _review(admin, f'/api/applications/{first_id}/review').status_code == 200
+    assert _records(seeded, user_id=user_id, application_id=first_id) == 1
+
+    response = _review(admin, f'/api/applications/{second_id}/review')
+    assert response.status_code == 400
+    assert response.get_json()['message'] == '同一学生在同一类别和学年已有记录，不能重复通过'
+    with seeded.app_context():
+        assert dyf.db.session.get(dyf.ScoreApplication, second_id).status == 'pending'
+    assert _records(seeded, application_id=second_id) == 0
+
+
+def _member_records(group):
+    return dyf.ScoreRecord.query.filter(
+        dyf.ScoreRecord.academic_year == YEARS[1],
+        dyf.ScoreRecord.category_id == group.category_id,
+        dyf.ScoreRecord.user_id.in_([m.student_user_id for m in group.members]))
+
+
+def test_group_approval_is_refused_as_a_whole_on_conflict(seeded):
+    with seeded.app_context():
+        # 只让第一名成员在该类别下已有记录
+        group = dyf.GroupApplication.query.one()
+        _member_records(group).delete()
+        member = group.members[0]
+        dyf.db.session.add(dyf.ScoreRecord(
+            user_id=member.student_user_id, category_id=group.category_id, score=1, source='个人申请', academic_year=YEARS[1]))
+        dyf.db.session.commit()
+        group_id, member_count = group.id, len(group.members)
+        conflicting_id = dyf.db.session.get(dyf.User, member.student_user_id).student_id
+    before = _records(seeded)
+
+    admin = login(seeded, 'admin')
+    response = _review(admin, f'/api/group-applications/{group_id}/review')
+    assert response.status_code == 400
+    assert [c['student_id'] for c in response.get_json()['conflicts']] == [conflicting_id]
+    # 整单回滚：没有成员被写入，申请仍待审核
+    assert _records(seeded) == before
+    with seeded.app_context():
+        assert dyf.db.session.get(dyf.GroupApplication, group_id).status == 'pending'
+
+    with seeded.app_context():
+        _member_records(dyf.GroupApplication.query.one()).delete()
+        dyf.db.session.commit()
+    assert _review(admin, f'/api/group-applications/{group_id}/review').status_code == 200
+    assert _records(seeded, group_application_id=group_id) == member_count
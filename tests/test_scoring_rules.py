@@ -0,0 +1,40 @@
+import app as dyf
+from conftest import YEARS
+
+
+def _change_in_other_process(app, statement, table):
+    """模拟另一个 worker 的修改：直接写库，提交后只更新共享的版本戳"""
+    with app.app_context():
+        with dyf.db.engine.begin() as connection:
+            connection.exec_driver_sql(statement)
+        dyf.table_versions.bump(table)
+
+
+def test_rule_change_in_other_process_is_picked_up(seeded):
+    with seeded.app_context():
+        rules = dyf.get_scoring_rules(YEARS[1])
+        index = rules.main_names.index('社会服务分')
+        assert rules.caps[index] != 1
+
+    _change_in_other_process(
+        seeded,
+        f"UPDATE scoring_rule SET max_score = 1 WHERE academic_year = '{YEARS[1]}' AND category_id = "
+        "(SELECT id FROM score_category WHERE name = '社会服务分')",
+        'scoring_rule')
+    with seeded.app_context():
+        assert dyf.get_scoring_rules(YEARS[1]).caps[index] == 1
+
+
+def test_category_added_in_other_process_is_not_uncategorized(seeded):
+    with seeded.app_context():
+        dyf.get_scoring_rules(YEARS[1])
+        parent_id = dyf.ScoreCategory.query.filter_by(name='社会服务分').first().id
+
+    _change_in_other_process(
+        seeded,
+        f"INSERT INTO score_category (name, parent_id, max_score) VALUES ('新子类别', {parent_id}, 10)",
+        'score_category')
+    with seeded.app_context():
+        category_id = dyf.ScoreCategory.query.filter_by(name='新子类别').first().id
+        rules = dyf.get_scoring_rules(YEARS[1])
+        assert rules.main_names[rules.main_of[category_id]] == '社会服务分'
@@ -0,0 +1,49 @@
+import app as dyf
+from conftest import login
+
+
+def _search(client, q, **params):
+    response = client.get('/api/applications/search', query_string=dict(params, q=q))
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_long_keywords_use_trigram_match(seeded):
+    admin = login(seeded, 'admin')
+
+    data = _search(admin, '程序设计')
+    assert [item['kind'] for item in data['items']] == ['group_application']
+    # MATCH 的结果按 bm25 排序，相关度不为 0
+    assert data['items'][0]['rank'] != 0
+
+    data = _search(admin, '校运会 100米', per_page=50)
+    assert len(data['items']) == 30 and not data['has_more']
+    assert {item['kind'] for item in data['items']} == {'application'}
+
+    # 索引由触发器维护，修改标题和说明后立即可以搜到
+    with seeded.app_context():
+        application = dyf.ScoreApplication.query.order_by(dyf.ScoreApplication.id).first()
+        application.title = '志愿者服务'
+        application.description = '社区志愿者'
+        dyf.db.session.commit()
+        application_id = application.id
+    assert [item['id'] for item in _search(admin, '志愿者')['items']] == [application_id]
+    assert len(_search(admin, '校运会', per_page=50)['items']) == 29
+
+
+def test_short_keywords_fall_back_to_substring_match(seeded):
+    admin = login(seeded, 'admin')
+
+    # 两个字的关键词达不到 trigram 的长度，改用子串匹配，相关度为 0
+    data = _search(admin, '竞赛')
+    assert [item['kind'] for item in data['items']] == ['group_application']
+    assert data['items'][0]['rank'] == 0
+
+    data = _search(admin, '10', per_page=20)
+    assert len(data['items']) == 20 and data['has_more']
+    assert len(_search(admin, '10', page=2)['items']) == 10
+
+    # 只要有一个关键词太短，全部关键词都按子串匹配；% 和 _ 按字面匹配
+    assert len(_search(admin, '校运会 米', per_page=50)['items']) == 30
+    assert _search(admin, '1_')['items'] == []
+    assert _search(admin, '%')['items'] == []
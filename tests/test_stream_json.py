@@ -0,0 +1,30 @@
+import json
+
+import app as dyf
+from conftest import YEARS, login
+
+
+def test_stream_json_matches_jsonify(seeded, monkeypatch):
+    monkeypatch.setattr(dyf, 'STREAM_JSON_BATCH', 3)
+    items = [{'id': i, 'name': f'学生{i}', 'score': i / 2} for i in range(10)]
+    with seeded.test_request_context():
+        streamed = dyf.stream_json(iter(items))
+        chunks = [chunk.decode() for chunk in streamed.iter_encoded()]
+        expected = dyf.jsonify(items).get_data(as_text=True)
+    # 数组开头单独先发出，之后每批一块
+    assert chunks[0] == '[' and len(chunks) == 1 + 4 + 1
+    assert json.loads(''.join(chunks)) == json.loads(expected)
+    with seeded.test_request_context():
+        assert b''.join(dyf.stream_json([]).iter_encoded()) == b'[]'
+
+
+def test_streamed_list_is_independent_of_batch_size(seeded, monkeypatch):
+    admin = login(seeded, 'admin')
+    response = admin.get('/api/scores/all', query_string={'academic_year': YEARS[1]})
+    assert response.is_streamed and response.mimetype == 'application/json'
+    whole = response.get_json()
+    assert len(whole) == 30
+
+    monkeypatch.setattr(dyf, 'STREAM_JSON_BATCH', 7)
+    assert admin.get('/api/scores/all', query_string={'academic_year': YEARS[1]}).get_json() == whole
+    assert admin.get('/api/scores/all', query_string={'academic_year': '2030-2031'}).get_json() == []
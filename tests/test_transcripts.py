@@ -0,0 +1,52 @@
+import app as dyf
+from conftest import YEARS, login
+
+
+def _year_totals(app):
+    """每学年排行榜中的总分：学年 -> 学号 -> 总分"""
+    with app.app_context():
+        return {
+            year: {student.student_id: total for student, _, total, _ in dyf.iter_student_scores(year)}
+            for year in YEARS
+        }
+
+
+def test_student_transcript_lists_years_with_deltas(seeded):
+    totals = _year_totals(seeded)
+    data = login(seeded, 'student').get('/api/scores/transcript').get_json()
+    student_id = data['student']['student_id']
+
+    years = data['years']
+    assert [year['academic_year'] for year in years] == list(YEARS)
+    assert [year['total_score'] for year in years] == [totals[year][student_id] for year in YEARS]
+    assert all(year['record_count'] == 5 for year in years)
+
+    first, second = years
+    assert first['delta'] is None
+    assert second['delta']['total_score'] == second['total_score'] - first['total_score']
+    for category, change in second['delta']['category_scores'].items():
+        assert change == second['category_scores'].get(category, 0) - first['category_scores'].get(category, 0)
+
+
+def test_admin_batch_transcripts_keep_request_order(seeded):
+    totals = _year_totals(seeded)
+    admin = login(seeded, 'admin')
+    requested = ['20230007', '20230002', '99999999', '20230007']
+    data = admin.post('/api/admin/scores/transcripts', json={'student_ids': requested}).get_json()
+
+    # 按请求顺序返回，重复学号只返回一次，不存在的学号单独列出
+    assert [t['student']['student_id'] for t in data['transcripts']] == ['20230007', '20230002']
+    assert data['not_found'] == ['99999999']
+    for transcript in data['transcripts']:
+        student_id = transcript['student']['student_id']
+        assert [year['total_score'] for year in transcript['years']] == [totals[year][student_id] for year in YEARS]
+
+
+def test_transcript_permissions_and_limits(seeded):
+    assert login(seeded, 'teacher').get('/api/scores/transcript').status_code == 403
+    assert login(seeded, 'student').post('/api/admin/scores/transcripts', json={'student_ids': ['1']}).status_code == 403
+
+    admin = login(seeded, 'admin')
+    assert admin.post('/api/admin/scores/transcripts', json={}).status_code == 400
+    too_many = [str(i) for i in range(dyf.TRANSCRIPT_BATCH_LIMIT + 1)]
+    assert admin.post('/api/admin/scores/transcripts', json={'student_ids': too_many}).status_code == 400
@@ -0,0 +1,132 @@
+"""按表的版本戳与条件 GET
+
+被关注的表每次提交修改后，把当前时间（纳秒）写入版本目录下以表名命名的文件。
+所有 worker 共享这些文件，读取版本戳只需一次小文件读取，不访问数据库。
+接口按所依赖表的版本戳生成强 ETag 和 Last-Modified（版本戳所在的一秒过完后才发送）：客户端缓存仍然有效时直接返回 304；
+否则优先使用进程内按版本缓存的 JSON，只有版本变化后才重新查询和序列化。
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app, json, request
+from sqlalchemy import event
+
+
+class TableVersions:
+    """按 Flask 扩展的方式挂载到应用上"""
+
+    def __init__(self, app=None, db=None, tables=()):
+        self.directory = None
+        self.tables = set()
+        self._cache = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db, tables)
+
+    def init_app(self, app, db, tables):
+        app.config.setdefault('TABLE_VERSIONS_DIR', os.environ.get(
+            'DYF_TABLE_VERSIONS_DIR', os.path.join(app.instance_path, 'versions')))
+        self.directory = app.config['TABLE_VERSIONS_DIR']
+        self.tables = set(tables)
+        os.makedirs(self.directory, exist_ok=True)
+
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'do_orm_execute', self._do_orm_execute)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['table_versions'] = self
+
+    # ---------- 记录本次事务修改过的表 ----------
+    @staticmethod
+    def _mark(session, table_name):
+        session.info.setdefault('changed_tables', set()).add(table_name)
+
+    def _after_flush(self, session, flush_context):
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, '__table__', None)
+            if table is not None:
+                self._mark(session, table.name)
+
+    def _do_orm_execute(self, orm_execute_state):
+        # 批量 UPDATE / DELETE / INSERT 不经过 flush
+        if orm_execute_state.is_select:
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            self._mark(orm_execute_state.session, mapper.local_table.name)
+
+    def _after_commit(self, session):
+        changed = session.info.pop('changed_tables', set()) & self.tables
+        if changed:
+            self.bump(*changed)
+
+    @staticmethod
+    def _after_rollback(session):
+        session.info.pop('changed_tables', None)
+
+    # ---------- 版本戳 ----------
+    def _path(self, table_name):
+        return os.path.join(self.directory, table_name)
+
+    def bump(self, *table_names):
+        """更新表的版本戳"""
+        stamp = str(time.time_ns())
+        for name in table_names:
+            tmp_path = f'{self._path(name)}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(stamp)
+            os.replace(tmp_path, self._path(name))
+
+    def version(self, table_name):
+        """表的版本戳（纳秒时间），尚未记录过的表此时写入"""
+        try:
+            with open(self._path(table_name)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            self.bump(table_name)
+            return self.version(table_name)
+
+    # ---------- 条件 GET ----------
+    def json_response(self, key, tables, build):
+        """按依赖表的版本戳返回 JSON，支持 If-None-Match / If-Modified-Since
+
+        Args:
+            key: 缓存键，同时作为 ETag 的前缀
+            tables: 响应所依赖的表名
+            build: 版本变化后生成响应数据的函数
+        """
+        versions = tuple(self.version(name) for name in tables)
+        etag = f'{key}-' + '-'.join(str(v) for v in versions)
+        # Last-Modified 只精确到秒：版本戳所在的这一秒还没过完时，同一秒内的下一次修改
+        # 会得到相同的 Last-Modified，此时不发送，客户端只能用 ETag 验证
+        modified_second = max(versions) // 1_000_000_000
+        last_modified = None
+        if time.time_ns() // 1_000_000_000 > modified_second:
+            last_modified = datetime.fromtimestamp(modified_second, timezone.utc)
+
+        # 同时带有两种条件时以 ETag 为准
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = (last_modified is not None and request.if_modified_since is not None
+                            and last_modified <= request.if_modified_since)
+
+        if not_modified:
+            response = current_app.response_class(status=304)
+        else:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == versions:
+                body = cached[1]
+            else:
+                body = json.dumps(build())
+                with self._lock:
+                    self._cache[key] = (versions, body)
+            response = current_app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        # 允许缓存，但每次使用前都要向服务器确认
+        response.cache_control.no_cache = True
+        return response
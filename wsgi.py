@@ -0,0 +1,10 @@
+"""生产环境 WSGI 入口
+
+gunicorn 以 preload_app 方式在主进程中导入本模块，应用、常量和预热的只读数据
+在 fork 之后以写时复制的方式被所有 worker 共享。启动命令：
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()